@@ -0,0 +1,88 @@
+"""
+Описание полей ресурсов API.
+
+Каждое поле ответа собирается из одного или нескольких столбцов
+values(), поэтому выдача строится без создания объектов моделей.
+"""
+from django.core.files.storage import default_storage
+
+
+class Field:
+    def __init__(self, *lookups, convert=None):
+        self.lookups = lookups
+        self.convert = convert
+
+    def __call__(self, row):
+        if self.convert is not None:
+            return self.convert(row)
+        return row[self.lookups[0]]
+
+
+def image_info(row):
+    if not row['image']:
+        return None
+    return {
+        'url': default_storage.url(row['image']),
+        'width': row['image_width'],
+        'height': row['image_height'],
+    }
+
+
+class InvalidFields(Exception):
+    """В ?fields= запрошены поля, которых у ресурса нет."""
+
+
+class Resource:
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def select(self, requested):
+        """Имена полей из параметра ?fields=; пустой параметр — все поля."""
+        if not requested:
+            return list(self.fields)
+        names = [name.strip() for name in requested.split(',') if name]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise InvalidFields(unknown)
+        return list(dict.fromkeys(names))
+
+    def values(self, queryset, names, ordering=()):
+        """
+        queryset.values() со столбцами выбранных полей.
+
+        Поля сортировки добавляются всегда: по ним строится курсор.
+        """
+        lookups = [
+            lookup for name in names for lookup in self.fields[name].lookups
+        ]
+        lookups += [name.lstrip('-') for name in ordering]
+        return queryset.values(*dict.fromkeys(lookups))
+
+    def serialize(self, row, names):
+        return {name: self.fields[name](row) for name in names}
+
+
+POST = Resource(
+    id=Field('id'),
+    text=Field('text'),
+    pub_date=Field('pub_date'),
+    author=Field('author__username'),
+    group=Field('group__slug'),
+    image=Field('image', 'image_width', 'image_height', convert=image_info),
+    comments_count=Field('comments_count'),
+)
+
+GROUP = Resource(
+    id=Field('id'),
+    slug=Field('slug'),
+    title=Field('title'),
+    description=Field('description'),
+)
+
+COMMENT = Resource(
+    id=Field('id'),
+    post=Field('post_id'),
+    author=Field('author__username'),
+    text=Field('text'),
+    created=Field('created'),
+)
@@ -0,0 +1,158 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='api_author')
+        cls.reader = User.objects.create(username='api_reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='api_group',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(15):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                group=cls.group if number % 2 else None,
+                text=f'Текст поста {number}',
+            )
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий',
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.auth_client = Client()
+        self.auth_client.force_login(ApiTests.reader)
+        cache.clear()
+
+    def get(self, url, client=None, **params):
+        response = (client or self.guest_client).get(url, params)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response.json()
+
+    def test_post_list_pages(self):
+        """Записи листаются курсором до конца и в обратную сторону"""
+        url = reverse('api:post_list')
+        first = self.get(url)
+        self.assertEqual(len(first['results']), 10)
+        self.assertIsNone(first['previous'])
+        self.assertEqual(first['results'][0], {
+            'id': self.post.id,
+            'text': 'Текст поста 14',
+            'pub_date': first['results'][0]['pub_date'],
+            'author': 'api_author',
+            'group': None,
+            'image': None,
+            'comments_count': 1,
+        })
+        second = self.guest_client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+        back = self.guest_client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+
+    def test_filters_and_fields(self):
+        """Фильтр по группе и выбор полей через ?fields="""
+        data = self.get(
+            reverse('api:post_list'), group='api_group', fields='id,group',
+        )
+        self.assertEqual(len(data['results']), 7)
+        self.assertEqual(
+            set(data['results'][0]), {'id', 'group'},
+        )
+        response = self.guest_client.get(
+            reverse('api:post_list'), {'fields': 'id,password'},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_detail_resources(self):
+        """Запись, её комментарии и группа отдаются по отдельности"""
+        post = self.get(
+            reverse('api:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        self.assertEqual(post['text'], 'Текст поста 14')
+        comments = self.get(
+            reverse('api:comment_list', kwargs={'post_id': self.post.id}),
+        )
+        self.assertEqual(
+            [comment['author'] for comment in comments['results']],
+            ['api_reader'],
+        )
+        group = self.get(
+            reverse('api:group_detail', kwargs={'slug': self.group.slug}),
+        )
+        self.assertEqual(group['title'], 'Тестовая группа')
+        groups = self.get(reverse('api:group_list'))
+        self.assertEqual(len(groups['results']), 1)
+        for url in (
+            reverse('api:post_detail', kwargs={'post_id': 0}),
+            reverse('api:comment_list', kwargs={'post_id': 0}),
+            reverse('api:group_detail', kwargs={'slug': 'missing'}),
+        ):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_feed(self):
+        """Лента доступна только вошедшему пользователю"""
+        url = reverse('api:feed')
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        data = self.get(url, client=self.auth_client, limit=20)
+        self.assertEqual(len(data['results']), 15)
+
+    def test_etag(self):
+        """Повторный запрос с ETag получает 304 без запросов к базе"""
+        url = reverse('api:post_list')
+        response = self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            repeat = self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'],
+            )
+        self.assertEqual(repeat.status_code, HTTPStatus.NOT_MODIFIED)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(author=self.author, text='Новая запись')
+        repeat = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(repeat.status_code, HTTPStatus.OK)
+
+    def test_list_etag_follows_comments(self):
+        """Новый комментарий меняет ETag списков, где видна запись"""
+        urls = [
+            reverse('api:post_list'),
+            reverse('api:post_list') + f'?author={self.author.username}',
+        ]
+        etags = {url: self.guest_client.get(url)['ETag'] for url in urls}
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                post=self.post, author=self.author, text='Ещё комментарий',
+            )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag,
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_feed_etag_by_content(self):
+        """У ленты ETag считается по содержимому ответа"""
+        url = reverse('api:feed')
+        response = self.auth_client.get(url)
+        repeat = self.auth_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(repeat.status_code, HTTPStatus.NOT_MODIFIED)
@@ -0,0 +1,161 @@
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, set_response_etag
+from django.views.decorators.http import require_GET
+
+from api import resources
+from core.page_cache import condition_by_generation
+from core.paginator import CursorPaginator
+from posts import page_scopes
+from posts.feed import feed_for
+from posts.models import Comment, Group, Post
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def error_response(status, message):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_view(scopes=None):
+    """
+    Представление API, которое возвращает данные ответа словарём.
+
+    Если у ресурса есть области кэша страниц, ETag строится по их
+    поколениям и повторный запрос получает 304 до обращения к базе.
+    Иначе ETag считается по телу ответа: клиенту не приходится снова
+    скачивать и разбирать неизменившуюся выдачу.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                data = view(request, *args, **kwargs)
+            except ApiError as error:
+                return error_response(error.status, error.message)
+            except resources.InvalidFields as error:
+                return error_response(
+                    HTTPStatus.BAD_REQUEST,
+                    f'Неизвестные поля: {", ".join(error.args[0])}',
+                )
+            except Http404:
+                return error_response(HTTPStatus.NOT_FOUND, 'Не найдено')
+            response = JsonResponse(
+                data, json_dumps_params={'ensure_ascii': False},
+            )
+            if scopes is not None:
+                return response
+            set_response_etag(response)
+            return get_conditional_response(
+                request, etag=response['ETag'], response=response,
+            )
+
+        wrapper = require_GET(wrapper)
+        if scopes is not None:
+            wrapper = condition_by_generation(scopes)(wrapper)
+        return wrapper
+    return decorator
+
+
+def page_size(request):
+    try:
+        limit = int(request.GET.get('limit', settings.POSTS_ON_PAGE))
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, 'limit должен быть числом')
+    return min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+
+def page_link(request, name, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    params[name] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def paginated(request, resource, queryset):
+    """Страница ресурса по курсору из ?after= или ?before=."""
+    names = resource.select(request.GET.get('fields'))
+    ordering = (
+        queryset.query.order_by or queryset.model._meta.ordering or ('pk',)
+    )
+    rows = resource.values(queryset.order_by(*ordering), names, ordering)
+    page = CursorPaginator(rows, page_size(request), ordering).get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return {
+        'results': [resource.serialize(row, names) for row in page],
+        'next': page_link(request, 'after', page.next_cursor),
+        'previous': page_link(request, 'before', page.previous_cursor),
+    }
+
+
+def single(request, resource, queryset, **lookup):
+    names = resource.select(request.GET.get('fields'))
+    return resource.serialize(
+        get_object_or_404(resource.values(queryset, names), **lookup), names,
+    )
+
+
+def post_list_scopes(request):
+    scopes = []
+    if request.GET.get('group'):
+        scopes.append(page_scopes.group_scope(request.GET['group']))
+    if request.GET.get('author'):
+        scopes.append(page_scopes.author_scope(request.GET['author']))
+    scopes = scopes or [page_scopes.INDEX_SCOPE]
+    # В каждом элементе списка есть comments_count.
+    return scopes + [page_scopes.comments_scope(scope) for scope in scopes]
+
+
+@api_view(post_list_scopes)
+def post_list(request):
+    posts = Post.objects.all()
+    if request.GET.get('group'):
+        posts = posts.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        posts = posts.filter(author__username=request.GET['author'])
+    return paginated(request, resources.POST, posts)
+
+
+@api_view(page_scopes.post_scopes)
+def post_detail(request, post_id):
+    return single(request, resources.POST, Post.objects.all(), id=post_id)
+
+
+@api_view(page_scopes.post_scopes)
+def comment_list(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    comments = Comment.objects.filter(post=post_id)
+    return paginated(request, resources.COMMENT, comments)
+
+
+@api_view(lambda request: [page_scopes.GROUPS_SCOPE])
+def group_list(request):
+    groups = Group.objects.order_by('id')
+    return paginated(request, resources.GROUP, groups)
+
+
+@api_view(lambda request, slug: [page_scopes.group_scope(slug)])
+def group_detail(request, slug):
+    return single(request, resources.GROUP, Group.objects.all(), slug=slug)
+
+
+@api_view()
+def feed(request):
+    if not request.user.is_authenticated:
+        raise ApiError(HTTPStatus.UNAUTHORIZED, 'Нужно войти на сайт')
+    return paginated(request, resources.POST, feed_for(request.user))
@@ -0,0 +1,82 @@
+"""
+Нагрузочные замеры проекта.
+
+Каждый модуль запускается из каталога с manage.py, например:
+
+    python -m benchmarks.pagination
+
+Замеры работают на отдельной тестовой базе и не трогают db.sqlite3.
+"""
+import math
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    """Настраивает Django и создаёт временную тестовую базу."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    return lambda: connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def django_environment():
+    teardown = setup_django()
+    try:
+        yield
+    finally:
+        teardown()
+
+
+@contextmanager
+def scratch_storage():
+    """
+    Кэш, медиафайлы и метрики во временном каталоге на время замера:
+    рабочие кэш, media/ и метрики замер не трогает.
+    """
+    from django.test import override_settings
+
+    directory = tempfile.mkdtemp(prefix='yatube-bench-')
+    try:
+        with override_settings(
+            MEDIA_ROOT=directory,
+            CACHES={'default': {
+                'BACKEND': 'core.cache_backends.SQLiteCache',
+                'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+            }},
+            METRICS_PATH=os.path.join(directory, 'metrics.sqlite3'),
+            POST_THUMBNAIL_WORKERS=0,
+        ):
+            yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def percentiles(timings, points=(50, 95, 99)):
+    """Перцентили по ближайшему рангу: {50: ..., 95: ..., 99: ...}."""
+    timings = sorted(timings)
+    return {
+        point: timings[max(math.ceil(len(timings) * point / 100) - 1, 0)]
+        for point in points
+    }
+
+
+def timeit(func, repeat):
+    """Возвращает медиану времени выполнения func в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
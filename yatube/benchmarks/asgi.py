@@ -0,0 +1,210 @@
+"""
+Одновременные запросы через WSGI и через ASGI.
+
+    python -m benchmarks.asgi --concurrency 1 8 32 --requests 400
+
+Главная, страницы группы, автора, записи и лента подписок запрашиваются
+по кругу с заданным числом одновременных запросов двумя способами, без
+сети и сокетов:
+
+* wsgi — как у многопоточного WSGI-сервера: пул из concurrency потоков,
+  каждый вызывает yatube.wsgi.application;
+* asgi — как у uvicorn: один цикл событий, в котором одновременно
+  выполняются concurrency вызовов yatube.asgi.application.
+
+Для каждого способа и уровня печатаются запросы в секунду, p50/p95/p99
+времени ответа и число ответов с кодом не 200. Кэш страниц работает как
+обычно; --cold очищает его перед каждым прогоном.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks import django_environment, percentiles, scratch_storage
+
+HOST = '127.0.0.1'
+
+
+def prepare():
+    """Заполняет базу и возвращает адреса страниц и cookie читателя."""
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db.models import Count
+    from django.test import Client
+    from django.urls import reverse
+
+    from posts.models import Group
+
+    call_command(
+        'seed_yatube', users=200, groups=10, posts=2000, comments=4000,
+        follows=2000, images=0, seed=1, stdout=sys.stderr,
+    )
+    users = get_user_model().objects.annotate(
+        posts_total=Count('posts', distinct=True),
+        following_total=Count('follower', distinct=True),
+    )
+    author = users.order_by('-posts_total').first()
+    reader = users.order_by('-following_total').first()
+    group = Group.objects.annotate(
+        size=Count('posts'),
+    ).order_by('-size').first()
+    post = author.posts.first()
+
+    client = Client()
+    client.force_login(reader)
+    cookie = (
+        f'{settings.SESSION_COOKIE_NAME}='
+        f'{client.cookies[settings.SESSION_COOKIE_NAME].value}'
+    )
+    urls = [
+        reverse('posts:index'),
+        reverse('posts:group_list', kwargs={'slug': group.slug}),
+        reverse('posts:profile', kwargs={'username': author.username}),
+        reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        reverse('posts:follow_index'),
+    ]
+    return urls, cookie
+
+
+def wsgi_get(application, path, cookie):
+    environ = {}
+    setup_testing_defaults(environ)
+    environ.update(
+        PATH_INFO=path, HTTP_HOST=HOST, SERVER_NAME=HOST, HTTP_COOKIE=cookie,
+    )
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(int(status.split()[0]))
+
+    result = application(environ, start_response)
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return statuses[0]
+
+
+async def asgi_get(application, path, cookie):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', HOST.encode()), (b'cookie', cookie.encode())],
+        'client': (HOST, 50000),
+        'server': (HOST, 80),
+    }
+    statuses = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await application(scope, receive, send)
+    return statuses[0]
+
+
+def timed(get, *args):
+    start = time.perf_counter()
+    status = get(*args)
+    return status, (time.perf_counter() - start) * 1000
+
+
+async def atimed(get, *args):
+    start = time.perf_counter()
+    status = await get(*args)
+    return status, (time.perf_counter() - start) * 1000
+
+
+def run_wsgi(application, paths, cookie, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(
+            lambda path: timed(wsgi_get, application, path, cookie), paths,
+        ))
+
+
+def run_asgi(application, paths, cookie, concurrency):
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(path):
+            async with semaphore:
+                return await atimed(asgi_get, application, path, cookie)
+
+        return await asyncio.gather(*(one(path) for path in paths))
+
+    return asyncio.run(main())
+
+
+def summarize(results, elapsed):
+    timings = [elapsed_ms for _, elapsed_ms in results]
+    report = {
+        'requests_per_second': round(len(results) / elapsed, 1),
+        'errors': sum(status != 200 for status, _ in results),
+    }
+    report.update(
+        (f'p{point}_ms', round(value, 3))
+        for point, value in percentiles(timings).items()
+    )
+    return report
+
+
+def run(levels, total, cold):
+    from django.core.asgi import get_asgi_application
+    from django.core.cache import cache
+    from django.core.wsgi import get_wsgi_application
+
+    urls, cookie = prepare()
+    paths = list(islice(cycle(urls), total))
+    servers = {
+        'wsgi': (get_wsgi_application(), run_wsgi),
+        'asgi': (get_asgi_application(), run_asgi),
+    }
+    report = {}
+    for name, (application, runner) in servers.items():
+        # Прогрев: первая отрисовка каждой страницы и кэш поколений.
+        runner(application, urls, cookie, 1)
+        for concurrency in levels:
+            if cold:
+                cache.clear()
+            start = time.perf_counter()
+            results = runner(application, paths, cookie, concurrency)
+            report.setdefault(name, {})[str(concurrency)] = summarize(
+                results, time.perf_counter() - start,
+            )
+            print(f'{name} x{concurrency}: готово', file=sys.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--concurrency', type=int, nargs='+', default=[1, 8, 32],
+    )
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--cold', action='store_true')
+    options = parser.parse_args()
+    with django_environment(), scratch_storage():
+        report = run(options.concurrency, options.requests, options.cold)
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Сравнение бэкендов кэша: LocMemCache, DatabaseCache и SQLiteCache.
+
+    python -m benchmarks.cache_backends --repeat 200
+
+Для каждого бэкенда замеряются одиночные get/set и пачки get_many/set_many
+размером с ленту. Отдельно проверяется, видит ли второй процесс запись
+первого: у LocMemCache каждый воркер живёт со своей копией кэша.
+DatabaseCache здесь работает на тестовой базе в памяти и поэтому тоже
+не общий; на файле базы он общий, но платит за каждый запрос ORM.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+
+from benchmarks import django_environment, timeit
+
+DB_CACHE_TABLE = 'benchmark_cache'
+
+
+def backends(directory):
+    from django.core.cache.backends.db import DatabaseCache
+    from django.core.cache.backends.locmem import LocMemCache
+
+    from core.cache_backends import SQLiteCache
+
+    return {
+        'locmem': LocMemCache('benchmark', {}),
+        'database': DatabaseCache(DB_CACHE_TABLE, {}),
+        'sqlite': SQLiteCache(os.path.join(directory, 'cache.sqlite3'), {}),
+    }
+
+
+def create_cache_table():
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+
+    caches = {'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': DB_CACHE_TABLE,
+    }}
+    with override_settings(CACHES=caches):
+        call_command('createcachetable', verbosity=0)
+
+
+def read_in_child(backend, key, written, queue):
+    written.wait()
+    queue.put(backend.get(key))
+
+
+def shared(backend):
+    """Видит ли воркер, запущенный через fork, записи родителя."""
+    context = multiprocessing.get_context('fork')
+    written = context.Event()
+    queue = context.Queue()
+    backend.set('shared', 'before fork')
+    process = context.Process(
+        target=read_in_child, args=(backend, 'shared', written, queue),
+    )
+    process.start()
+    backend.set('shared', 'after fork')
+    written.set()
+    result = queue.get()
+    process.join()
+    return result == 'after fork'
+
+
+def run(repeat, batch, value_size):
+    create_cache_table()
+    value = 'x' * value_size
+    many = {f'key{number}': value for number in range(batch)}
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, backend in backends(directory).items():
+            backend.set_many(many)
+            cases = {
+                'set_ms': lambda: backend.set('key', value),
+                'get_ms': lambda: backend.get('key0'),
+                f'set_many_{batch}_ms': lambda: backend.set_many(many),
+                f'get_many_{batch}_ms': lambda: backend.get_many(many),
+            }
+            report[name] = {
+                case: round(timeit(func, repeat), 4)
+                for case, func in cases.items()
+            }
+            report[name]['shared_between_processes'] = shared(backend)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=10)
+    parser.add_argument('--value-size', type=int, default=4096)
+    options = parser.parse_args()
+    with django_environment():
+        report = run(options.repeat, options.batch, options.value_size)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
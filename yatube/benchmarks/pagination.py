@@ -0,0 +1,90 @@
+"""
+Сравнение пагинации по номеру страницы и курсорной пагинации.
+
+    python -m benchmarks.pagination --pages 10000
+
+Для первой и последней страницы замеряется время выборки и число
+запросов. У курсорной пагинации оба значения не зависят от глубины.
+"""
+import argparse
+import json
+
+from benchmarks import django_environment, timeit
+
+
+def fill(posts_count, batch_size=5000):
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+
+    from posts.models import Post
+
+    author = get_user_model().objects.create(username='bench')
+    for start in range(0, posts_count, batch_size):
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {number}')
+            for number in range(start, min(start + batch_size, posts_count))
+        )
+    # auto_now_add проставил всем одно время, разводим посты по секундам,
+    # чтобы сортировка по pub_date была реалистичной.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {Post._meta.db_table} "
+            f"SET pub_date = datetime('now', '-' || id || ' seconds')"
+        )
+
+
+def run(pages, per_page, repeat):
+    from django.core.paginator import Paginator
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+
+    from core.paginator import CursorPaginator
+    from posts.models import Post
+
+    fill(pages * per_page)
+    queryset = Post.objects.all()
+    cursor_paginator = CursorPaginator(queryset, per_page)
+
+    # Курсор на последнюю страницу получаем заранее, как его получил бы
+    # клиент, листающий выдачу ссылками «Следующая».
+    offset = (pages - 1) * per_page - 1
+    deep_post = queryset.order_by(*cursor_paginator.ordering)[offset]
+    deep_cursor = cursor_paginator.cursor_for(deep_post)
+
+    cases = {
+        'offset_page_1': lambda: list(
+            Paginator(queryset, per_page).get_page(1)
+        ),
+        f'offset_page_{pages}': lambda: list(
+            Paginator(queryset, per_page).get_page(pages)
+        ),
+        'cursor_page_1': lambda: list(cursor_paginator.get_page()),
+        f'cursor_page_{pages}': lambda: list(
+            cursor_paginator.get_page(after=deep_cursor)
+        ),
+    }
+    report = {}
+    for name, case in cases.items():
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            case()
+        report[name] = {
+            'median_ms': round(timeit(case, repeat), 3),
+            'queries': len(queries),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=10000)
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    options = parser.parse_args()
+    with django_environment():
+        report = run(options.pages, options.per_page, options.repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
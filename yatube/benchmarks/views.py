@@ -0,0 +1,167 @@
+"""
+Сквозной замер всех именованных страниц posts и users.
+
+    python -m benchmarks.views --posts 20000 --repeat 100 > after.json
+
+База заполняется командой seed_yatube, после чего каждый адрес из
+posts/urls.py и users/urls.py запрашивается тестовым клиентом Django
+от гостя и от вошедшего пользователя. Для каждой пары печатаются код
+ответа, p50/p95/p99 времени ответа, число запросов к базе и размер тела.
+Ключи JSON отсортированы, так что отчёты двух коммитов удобно сравнивать
+обычным diff.
+
+Кэш и медиафайлы на время замера переносятся во временный каталог.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from functools import partial
+
+from benchmarks import django_environment, percentiles, scratch_storage
+
+SEED_OPTIONS = {
+    'users': 500,
+    'groups': 20,
+    'posts': 5000,
+    'comments': 10000,
+    'follows': 5000,
+    'images': 10,
+}
+# Выход разлогинивает клиента: после каждого такого запроса входим снова.
+LOGOUT_VIEWS = {'users:logout'}
+
+
+def url_names():
+    from posts.urls import app_name as posts_app, urlpatterns as posts_urls
+    from users.urls import app_name as users_app, urlpatterns as users_urls
+
+    for app_name, urlpatterns in (
+        (posts_app, posts_urls), (users_app, users_urls),
+    ):
+        for pattern in urlpatterns:
+            if pattern.name:
+                yield f'{app_name}:{pattern.name}', pattern
+
+
+def url_arguments(viewer):
+    """
+    Значения для параметров адресов.
+
+    Берутся самые «тяжёлые» объекты: автор с наибольшим числом записей,
+    самая большая группа и самая обсуждаемая запись этого автора, чтобы
+    он же мог открыть её редактирование.
+    """
+    from django.db.models import Count
+
+    from posts.models import Group
+
+    group = Group.objects.annotate(
+        size=Count('posts'),
+    ).order_by('-size').first()
+    post = viewer.posts.annotate(
+        size=Count('comments'),
+    ).order_by('-size').first()
+    return {
+        'username': viewer.username,
+        'slug': group.slug,
+        'post_id': post.pk,
+    }
+
+
+def body_size(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def measure(client, url, repeat, cold, after=None):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings, queries = [], []
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = client.get(url)
+            size = body_size(response)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+        if after is not None:
+            after()
+    result = {
+        'status': response.status_code,
+        'bytes': size,
+        'queries': statistics.median_low(queries),
+    }
+    result.update(
+        (f'p{point}_ms', round(value, 3))
+        for point, value in percentiles(timings).items()
+    )
+    return result
+
+
+def run(seed_options, repeat, cold):
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db.models import Count
+    from django.test import Client
+    from django.urls import reverse
+
+    call_command('seed_yatube', stdout=sys.stderr, **seed_options)
+    viewer = get_user_model().objects.annotate(
+        size=Count('posts'),
+    ).order_by('-size').first()
+    arguments = url_arguments(viewer)
+
+    guest, user = Client(), Client()
+    user.force_login(viewer)
+    report = {}
+    for name, pattern in url_names():
+        url = reverse(name, kwargs={
+            key: arguments[key] for key in pattern.pattern.converters
+        })
+        report[name] = {'url': url}
+        for role, client in (('guest', guest), ('user', user)):
+            after = None
+            if role == 'user' and name in LOGOUT_VIEWS:
+                after = partial(user.force_login, viewer)
+            report[name][role] = measure(client, url, repeat, cold, after)
+        print(f'{name}: готово', file=sys.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    for option, default in SEED_OPTIONS.items():
+        parser.add_argument(f'--{option}', type=int, default=default)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument(
+        '--cold', action='store_true',
+        help='Очищать кэш перед каждым запросом.',
+    )
+    options = vars(parser.parse_args())
+    seed_options = {
+        option: options[option] for option in (*SEED_OPTIONS, 'seed')
+    }
+
+    with django_environment(), scratch_storage():
+        views = run(seed_options, options['repeat'], options['cold'])
+    report = {
+        'options': {
+            **seed_options,
+            'repeat': options['repeat'],
+            'cold': options['cold'],
+        },
+        'views': views,
+    }
+    print(json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""
+Кэш в файле SQLite, общий для всех процессов на машине.
+
+LocMemCache у каждого воркера свой: копии страниц дублируются, а сброс
+поколения в одном процессе не виден остальным. Этот бэкенд хранит записи
+в одном файле SQLite в режиме WAL: читатели не блокируют писателя, а
+страницы файла разделяются процессами через mmap.
+
+Настройки:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube/cache.sqlite3',
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+                'MAX_BYTES': 256 * 1024 * 1024,
+            },
+        },
+    }
+
+Когда записей больше MAX_ENTRIES или они занимают больше MAX_BYTES,
+вытесняются давно не читавшиеся (приблизительный LRU: время чтения
+обновляется не чаще раза в TOUCH_INTERVAL секунд, чтобы чтения не
+превращались в записи).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core import metrics
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, '
+    'value BLOB NOT NULL, '
+    'expires REAL, '
+    'accessed REAL NOT NULL, '
+    'size INTEGER NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+ALIVE = '(expires IS NULL OR expires > ?)'
+# Ограничение SQLite на число параметров в одном запросе.
+MAX_VARIABLES = 900
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_bytes = options.get('MAX_BYTES')
+        self._touch_interval = options.get('TOUCH_INTERVAL', 1)
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._mmap_size = options.get('MMAP_SIZE', 64 * 1024 * 1024)
+        self._local = threading.local()
+
+    def _connection(self):
+        """
+        Соединение текущего потока.
+
+        После fork соединение родителя использовать нельзя, поэтому
+        вместе с ним запоминается pid процесса.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self._path,
+            timeout=self._busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(f'PRAGMA mmap_size={int(self._mmap_size)}')
+        for statement in SCHEMA:
+            connection.execute(statement)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _dumps(value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _fetch(self, keys):
+        """Живые записи по ключам: {ключ: (значение, время чтения)}."""
+        connection = self._connection()
+        now = time.time()
+        found = {}
+        for start in range(0, len(keys), MAX_VARIABLES):
+            chunk = keys[start:start + MAX_VARIABLES]
+            placeholders = ', '.join('?' * len(chunk))
+            rows = connection.execute(
+                f'SELECT key, value, accessed FROM cache '
+                f'WHERE key IN ({placeholders}) AND {ALIVE}',
+                (*chunk, now),
+            )
+            for key, value, accessed in rows:
+                found[key] = (value, accessed)
+        stale = [
+            key for key, (_, accessed) in found.items()
+            if now - accessed > self._touch_interval
+        ]
+        if stale:
+            connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                ((now, key) for key in stale),
+            )
+        metrics.record_cache(len(found), len(keys) - len(found))
+        return {key: pickle.loads(value) for key, (value, _) in found.items()}
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {
+            self.make_and_validate_key(key, version=version): key
+            for key in keys
+        }
+        found = self._fetch(list(keys))
+        return {keys[key]: value for key, value in found.items()}
+
+    def _write(self, rows):
+        """Записывает строки (ключ, значение, срок) одной транзакцией."""
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for key, value, expires in rows:
+                data = self._dumps(value)
+                connection.execute(
+                    'INSERT OR REPLACE INTO cache '
+                    '(key, value, expires, accessed, size) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (key, data, expires, now, len(data)),
+                )
+            self._cull(connection, now)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write([(key, value, self.get_backend_timeout(timeout))])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        self._write([
+            (self.make_and_validate_key(key, version=version), value, expires)
+            for key, value in data.items()
+        ])
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Записывает значение, только если ключа нет или он истёк.
+
+        Проверка и запись делаются одним UPSERT, поэтому add годится
+        для блокировок между процессами.
+        """
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        now = time.time()
+        data = self._dumps(value)
+        cursor = connection.execute(
+            'INSERT INTO cache (key, value, expires, accessed, size) '
+            'VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires, '
+            'accessed = excluded.accessed, size = excluded.size '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, data, self.get_backend_timeout(timeout), now, len(data),
+             now),
+        )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {ALIVE}',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {ALIVE}',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            data = self._dumps(value)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (data, len(data), key),
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'DELETE FROM cache WHERE key = ?', (key,),
+        )
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        self._connection().executemany(
+            'DELETE FROM cache WHERE key = ?',
+            ((self.make_and_validate_key(key, version=version),)
+             for key in keys),
+        )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт весь срок потока: открывать файл и проверять
+        # схему на каждый запрос дороже, чем держать его открытым.
+        pass
+
+    def _cull(self, connection, now):
+        """Удаляет истёкшие записи и вытесняет давно не читавшиеся."""
+        count, size = connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+        ).fetchone()
+        over_entries = count > self._max_entries
+        over_bytes = self._max_bytes is not None and size > self._max_bytes
+        if not over_entries and not over_bytes:
+            return
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        count, size = connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+        ).fetchone()
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (max(count // self._cull_frequency, 1),),
+            )
+        if self._max_bytes is not None and size > self._max_bytes:
+            # Освобождаем с запасом, чтобы не вытеснять на каждой записи.
+            excess = size - self._max_bytes * (1 - 1 / self._cull_frequency)
+            victims = []
+            for key, entry_size in connection.execute(
+                'SELECT key, size FROM cache ORDER BY accessed'
+            ):
+                victims.append((key,))
+                excess -= entry_size
+                if excess <= 0:
+                    break
+            connection.executemany('DELETE FROM cache WHERE key = ?', victims)
@@ -0,0 +1,355 @@
+"""
+Сжатие ответов: gzip, brotli и zstd.
+
+gzip есть всегда, brotli и zstd — если установлены модули brotli и
+zstandard. CompressionMiddleware выбирает кодировку по Accept-Encoding
+в порядке COMPRESSION_ENCODINGS и сжимает текстовые ответы; потоковые
+ответы сжимаются по кускам, и каждый кусок уходит клиенту сразу.
+
+Кэш страниц перед сохранением ответа вызывает precompress: сжатые во
+всех кодировках тела ложатся в кэш вместе с ответом, и при попадании в
+кэш слой только выбирает готовое тело, ничего не сжимая. Ответы, которые
+в кэш не попадут, сжимаются один раз в выбранной кодировке.
+
+Ответы с секретами пользователя (CSRF-токен, страница зависит от cookie)
+открыты атаке BREACH, поэтому, как и GZipMiddleware из Django, они
+сжимаются только gzip со случайным по длине именем файла в заголовке.
+
+Сэкономленные байты и процессорное время сжатия видны в /metrics.
+"""
+import re
+import secrets
+import time
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import has_vary_header, patch_vary_headers
+
+from core import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Короткие ответы сжатием только увеличиваются.
+MIN_LENGTH = 200
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|javascript|xml|.*\+json|.*\+xml)'
+    r'|image/svg\+xml)'
+)
+# Уровни сжатия для ответов на лету; статику сжимают на максимуме.
+LEVELS = {'br': 4, 'zstd': 3, 'gzip': 6}
+MAX_LEVELS = {'br': 11, 'zstd': 19, 'gzip': 9}
+# Как GZipMiddleware.max_random_bytes в Django.
+MAX_RANDOM_BYTES = 100
+CSRF_FIELD = b'csrfmiddlewaretoken'
+GZIP_HEADER_SIZE = 10
+GZIP_FNAME = 0x08
+
+
+def random_filename():
+    """Имя файла для заголовка gzip случайной длины от 1 до 100 байт."""
+    length = secrets.randbelow(MAX_RANDOM_BYTES) + 1
+    return secrets.token_hex(MAX_RANDOM_BYTES)[:length].encode() + b'\0'
+
+
+class GzipStream:
+    def __init__(self, level, padded=False):
+        # wbits=31: заголовок gzip с нулевым mtime.
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        self._padded = padded
+
+    def _pad(self, output):
+        # Заголовок zlib приходит целиком с первым непустым куском; в него
+        # ставится флаг FNAME и дописывается имя файла.
+        if not self._padded or not output:
+            return output
+        self._padded = False
+        header = bytearray(output[:GZIP_HEADER_SIZE])
+        header[3] |= GZIP_FNAME
+        return bytes(header) + random_filename() + output[GZIP_HEADER_SIZE:]
+
+    def compress(self, data, flush=False):
+        output = self._compressor.compress(data)
+        if flush:
+            output += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return self._pad(output)
+
+    def finish(self):
+        return self._pad(self._compressor.flush())
+
+
+class BrotliStream:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data, flush=False):
+        output = self._compressor.process(data)
+        if flush:
+            output += self._compressor.flush()
+        return output
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data, flush=False):
+        output = self._compressor.compress(data)
+        if flush:
+            output += self._compressor.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK,
+            )
+        return output
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+STREAMS = {'gzip': GzipStream}
+if brotli is not None:
+    STREAMS['br'] = BrotliStream
+if zstandard is not None:
+    STREAMS['zstd'] = ZstdStream
+
+
+def available(encodings):
+    """Те из encodings, для которых есть модуль, в том же порядке."""
+    return [encoding for encoding in encodings if encoding in STREAMS]
+
+
+def make_stream(encoding, level=None, padded=False):
+    level = level or LEVELS[encoding]
+    if padded:
+        return GzipStream(level, padded=True)
+    return STREAMS[encoding](level)
+
+
+def compress(encoding, data, level=None, padded=False):
+    stream = make_stream(encoding, level, padded)
+    return stream.compress(data) + stream.finish()
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме запрещённых через q=0."""
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def negotiate(header, encodings):
+    """Первая из encodings, которую принимает клиент, или None."""
+    accepted = accepted_encodings(header)
+    for encoding in encodings:
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def is_compressible(response):
+    if response.has_header('Content-Encoding'):
+        return False
+    if 'no-transform' in response.get('Cache-Control', ''):
+        return False
+    return bool(COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')))
+
+
+def is_sensitive(request, response):
+    """
+    Есть ли в ответе секреты пользователя, которые выдаст BREACH.
+
+    Vary: Cookie ставит SessionMiddleware уже после кэша страниц, поэтому
+    заодно проверяется, читали ли сессию.
+    """
+    if has_vary_header(response, 'Cookie'):
+        return True
+    session = getattr(request, 'session', None)
+    if session is not None and session.accessed:
+        return True
+    return not response.streaming and CSRF_FIELD in response.content
+
+
+def encodings_for(sensitive):
+    """Кодировки, доступные ответу: с секретами — только gzip."""
+    if sensitive:
+        return ['gzip']
+    return available(settings.COMPRESSION_ENCODINGS)
+
+
+def record(encoding, size, compressed_size, cpu_time):
+    labels = metrics.format_labels(encoding=encoding)
+    metrics.registry.inc(
+        'yatube_compression_saved_bytes_total',
+        labels,
+        size - compressed_size,
+    )
+    metrics.registry.inc(
+        'yatube_compression_cpu_seconds_total', labels, cpu_time * 10 ** 6,
+    )
+
+
+def timed_compress(encoding, data, padded=False):
+    start = time.thread_time()
+    compressed = compress(encoding, data, padded=padded)
+    record(encoding, len(data), len(compressed), time.thread_time() - start)
+    return compressed
+
+
+def precompress(request, response):
+    """
+    Сжимает тело ответа во всех доступных ему кодировках заранее.
+
+    Вызывается только для ответов, которые попадут в кэш страниц:
+    результат хранится в самом ответе и ложится в кэш вместе с ним.
+    """
+    if response.streaming or not is_compressible(response):
+        return response
+    content = response.content
+    if len(content) < MIN_LENGTH:
+        return response
+    sensitive = is_sensitive(request, response)
+    response.precompressed = (len(content), sensitive, {
+        encoding: timed_compress(encoding, content, padded=sensitive)
+        for encoding in encodings_for(sensitive)
+    })
+    return response
+
+
+class StreamStats:
+    """Байты и время сжатия одного потокового ответа."""
+
+    def __init__(self, encoding, padded=False):
+        self.encoding = encoding
+        self.stream = make_stream(encoding, padded=padded)
+        self.size = self.compressed_size = 0
+        self.cpu_time = 0.0
+
+    def compress(self, chunk):
+        start = time.thread_time()
+        output = self.stream.compress(chunk, flush=True)
+        self.cpu_time += time.thread_time() - start
+        self.size += len(chunk)
+        self.compressed_size += len(output)
+        return output
+
+    def finish(self):
+        start = time.thread_time()
+        output = self.stream.finish()
+        self.cpu_time += time.thread_time() - start
+        self.compressed_size += len(output)
+        record(self.encoding, self.size, self.compressed_size, self.cpu_time)
+        return output
+
+
+def compress_stream(content, encoding, padded=False):
+    stats = StreamStats(encoding, padded)
+    for chunk in content:
+        output = stats.compress(chunk)
+        if output:
+            yield output
+    yield stats.finish()
+
+
+async def acompress_stream(content, encoding, padded=False):
+    stats = StreamStats(encoding, padded)
+    async for chunk in content:
+        output = stats.compress(chunk)
+        if output:
+            yield output
+    yield stats.finish()
+
+
+class CompressionMiddleware:
+    """
+    Сжимает текстовые ответы в кодировке, которую принимает клиент.
+
+    Заменяет GZipMiddleware из Django и так же, как он, ослабляет ETag:
+    сжатое тело побайтно отличается от исходного.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if not is_compressible(response):
+            return response
+        if not response.streaming and len(response.content) < MIN_LENGTH:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        sensitive = is_sensitive(request, response)
+        encoding = negotiate(
+            request.headers.get('Accept-Encoding', ''),
+            encodings_for(sensitive),
+        )
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(
+                    response.streaming_content, encoding, sensitive,
+                )
+            else:
+                response.streaming_content = compress_stream(
+                    response.streaming_content, encoding, sensitive,
+                )
+            del response.headers['Content-Length']
+        else:
+            size, padded, bodies = getattr(
+                response, 'precompressed', (None, False, {}),
+            )
+            if (
+                size == len(response.content) and encoding in bodies
+                and padded >= sensitive
+            ):
+                metrics.registry.inc(
+                    'yatube_compression_reused_total',
+                    metrics.format_labels(encoding=encoding),
+                )
+                response.content = bodies[encoding]
+            else:
+                response.content = timed_compress(
+                    encoding, response.content, padded=sensitive,
+                )
+            response.headers['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
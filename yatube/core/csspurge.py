@@ -0,0 +1,154 @@
+"""
+Удаление из CSS правил, которые не нужны ни одному шаблону.
+
+Из шаблонов и скриптов собираются все слова, похожие на имена классов и
+id. Селектор остаётся, если каждый класс и id в нём есть среди этих
+слов; правило удаляется, когда у него не осталось селекторов. Селекторы
+без классов и id (html, body, [hidden]) остаются всегда, как и
+@font-face и @keyframes; внутри @media и @supports правила чистятся так
+же, а опустевший блок удаляется целиком.
+
+Разбор упрощённый, но его хватает для минифицированного Bootstrap:
+строки и вложенные скобки учитываются, комментарии /*! с лицензией
+сохраняются, остальные выбрасываются.
+"""
+import os
+import re
+
+CONTENT_EXTENSIONS = ('.html', '.txt', '.js', '.py')
+# At-правила, внутри которых лежат обычные правила со селекторами.
+NESTED_AT_RULES = ('@media', '@supports', '@container', '@layer')
+
+WORD = re.compile(r'[\w-]+')
+CLASS_OR_ID = re.compile(r'[.#](-?[_a-zA-Z][\w-]*)')
+# Классы внутри :not() не обязаны встречаться в разметке.
+NOT = re.compile(r':not\([^()]*\)')
+
+
+def used_names(directories):
+    """Слова из файлов разметки и скриптов в каталогах directories."""
+    names = set()
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if not name.endswith(CONTENT_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                with open(path, encoding='utf-8', errors='ignore') as file:
+                    names.update(WORD.findall(file.read()))
+    return names
+
+
+def _string_end(css, index):
+    quote = css[index]
+    index += 1
+    while index < len(css):
+        if css[index] == '\\':
+            index += 2
+            continue
+        if css[index] == quote:
+            return index + 1
+        index += 1
+    return len(css)
+
+
+def _find(css, index, chars):
+    """Первый из chars вне строк, начиная с index, или len(css)."""
+    while index < len(css):
+        char = css[index]
+        if char in '"\'':
+            index = _string_end(css, index)
+            continue
+        if char in chars:
+            return index
+        index += 1
+    return len(css)
+
+
+def _block_end(css, index):
+    """Закрывающая скобка блока, который открылся перед index."""
+    depth = 1
+    while index < len(css):
+        index = _find(css, index, '{}')
+        if index == len(css):
+            break
+        depth += 1 if css[index] == '{' else -1
+        if not depth:
+            return index
+        index += 1
+    return len(css)
+
+
+def split_selectors(prelude):
+    """Селекторы списка через запятую; запятые в скобках не делят."""
+    selectors = []
+    depth = 0
+    start = index = 0
+    while index < len(prelude):
+        char = prelude[index]
+        if char in '"\'':
+            index = _string_end(prelude, index)
+            continue
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and not depth:
+            selectors.append(prelude[start:index].strip())
+            start = index + 1
+        index += 1
+    selectors.append(prelude[start:].strip())
+    return [selector for selector in selectors if selector]
+
+
+def is_used(selector, names):
+    if '\\' in selector:
+        # Экранированные имена (.\31 0) не разбираем: оставляем как есть.
+        return True
+    return all(
+        name in names for name in CLASS_OR_ID.findall(NOT.sub('', selector))
+    )
+
+
+def purge(css, names):
+    """CSS без правил, селекторы которых не встречаются в names."""
+    result = []
+    index = 0
+    while index < len(css):
+        while index < len(css) and css[index].isspace():
+            index += 1
+        if css.startswith('/*', index):
+            end = css.find('*/', index + 2)
+            end = len(css) if end == -1 else end + 2
+            if css.startswith('/*!', index):
+                result.append(css[index:end])
+            index = end
+            continue
+        brace = _find(css, index, '{;')
+        if brace == len(css):
+            result.append(css[index:])
+            break
+        prelude = css[index:brace].strip()
+        if css[brace] == ';':
+            # @charset и @import.
+            result.append(css[index:brace + 1])
+            index = brace + 1
+            continue
+        end = _block_end(css, brace + 1)
+        body = css[brace + 1:end]
+        if prelude.startswith('@'):
+            if prelude.lower().startswith(NESTED_AT_RULES):
+                inner = purge(body, names)
+                if inner.strip():
+                    result.append(f'{prelude}{{{inner}}}')
+            else:
+                result.append(f'{prelude}{{{body}}}')
+        else:
+            selectors = [
+                selector for selector in split_selectors(prelude)
+                if is_used(selector, names)
+            ]
+            if selectors:
+                result.append(f'{",".join(selectors)}{{{body}}}')
+        index = end + 1
+    return ''.join(result)
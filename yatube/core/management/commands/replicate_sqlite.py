@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from core.replication import copy_sqlite
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик из DATABASE_REPLICAS; '
+        'с --interval делает это в цикле, изображая потоковую репликацию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'replicas',
+            nargs='*',
+            help='Какие реплики обновить. По умолчанию все.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Пауза между копиями в секундах; 0 — скопировать один раз.',
+        )
+
+    def handle(self, *args, **options):
+        source = self.sqlite_path(DEFAULT_DB_ALIAS)
+        replicas = options['replicas'] or settings.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError('В DATABASE_REPLICAS нет ни одной реплики.')
+        targets = [self.sqlite_path(alias) for alias in replicas]
+        while True:
+            started = time.monotonic()
+            for target in targets:
+                copy_sqlite(source, target)
+            self.stdout.write(
+                f'Реплики обновлены: {", ".join(replicas)} '
+                f'за {time.monotonic() - started:.2f} с'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def sqlite_path(alias):
+        database = settings.DATABASES.get(alias)
+        if database is None:
+            raise CommandError(f'Нет базы «{alias}» в DATABASES.')
+        if database['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError(f'База «{alias}» не SQLite.')
+        return database['NAME']
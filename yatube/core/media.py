@@ -0,0 +1,155 @@
+"""
+Раздача загруженных файлов (MEDIA_ROOT) без отдельного веб-сервера.
+
+Файл отдаётся потоком через FileResponse, с ETag и Last-Modified; на
+условный запрос отвечает 304, на Range — 206 с запрошенным куском.
+Копии картинок (MEDIA_IMMUTABLE_PATHS) под своим именем никогда не
+меняются, поэтому кэшируются на год; остальное — на MEDIA_MAX_AGE.
+
+За nginx или Apache чтение файла можно отдать им: MEDIA_SENDFILE =
+'x-accel-redirect' (внутренний location MEDIA_SENDFILE_PREFIX) или
+'x-sendfile'. Заголовки кэша и ответ 304 по-прежнему ставит Django,
+Range обрабатывает прокси.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    """Запрошенный кусок целиком за концом файла."""
+
+
+class FileRange:
+    """Кусок открытого файла: FileResponse читает его как обычный файл."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def media_path(path):
+    """Путь к файлу внутри MEDIA_ROOT или Http404."""
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    return path, full_path
+
+
+def cache_control(path):
+    if any(re.search(pattern, path)
+           for pattern in settings.MEDIA_IMMUTABLE_PATHS):
+        return IMMUTABLE
+    return f'public, max-age={settings.MEDIA_MAX_AGE}'
+
+
+def requested_range(request, size, etag, last_modified):
+    """
+    (начало, длина) из заголовка Range или None, если отдавать весь файл.
+
+    Поддерживается один диапазон; несколько диапазонов, как и Range с
+    устаревшим If-Range, получают файл целиком — это разрешено RFC 9110.
+    """
+    match = RANGE.match(request.headers.get('Range', '').replace(' ', ''))
+    if match is None or match.groups() == ('', ''):
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range is not None and if_range != etag and (
+        parse_http_date_safe(if_range) != int(last_modified)
+    ):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = min(int(last), size)
+        if not length:
+            raise RangeNotSatisfiable
+        return size - length, length
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiable
+    end = min(int(last), size - 1) if last else size - 1
+    if end < start:
+        return None
+    return start, end - start + 1
+
+
+def sendfile_response(path, full_path):
+    response = HttpResponse(
+        content_type=mimetypes.guess_type(full_path)[0]
+        or 'application/octet-stream',
+    )
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response.headers['X-Accel-Redirect'] = (
+            settings.MEDIA_SENDFILE_PREFIX + path
+        )
+    else:
+        response.headers['X-Sendfile'] = full_path
+    return response
+
+
+def file_response(request, full_path, size, etag, last_modified):
+    try:
+        part = requested_range(request, size, etag, last_modified)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f'bytes */{size}'
+        return response
+    file = open(full_path, 'rb')
+    if part is None:
+        return FileResponse(file)
+    start, length = part
+    response = FileResponse(FileRange(file, start, length), status=206)
+    response.headers['Content-Length'] = length
+    response.headers['Content-Range'] = (
+        f'bytes {start}-{start + length - 1}/{size}'
+    )
+    return response
+
+
+def serve(request, path):
+    path, full_path = media_path(path)
+    stat = os.stat(full_path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    response = get_conditional_response(
+        request, etag=etag, last_modified=stat.st_mtime,
+    )
+    if response is None:
+        if settings.MEDIA_SENDFILE:
+            response = sendfile_response(path, full_path)
+        else:
+            response = file_response(
+                request, full_path, stat.st_size, etag, stat.st_mtime,
+            )
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    response.headers['Cache-Control'] = cache_control(path)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
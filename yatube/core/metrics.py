@@ -0,0 +1,389 @@
+"""
+Метрики запросов по представлениям в формате Prometheus.
+
+Промежуточный слой MetricsMiddleware для каждого ответа записывает время
+ответа, время и число запросов к базе, попадания и промахи кэша и размер
+тела с меткой представления (posts:index, api:post_list, ...).
+
+Распределения хранятся в гистограммах в духе HDR: каждая степень двойки
+делится на SUB_BUCKETS равных корзин, так что относительная ошибка любого
+значения не больше 1 / SUB_BUCKETS, а корзин на весь диапазон от
+микросекунд до минут — пара сотен, и заводятся только непустые.
+
+Каждый процесс копит метрики в памяти и раз в METRICS_FLUSH_INTERVAL
+секунд прибавляет накопленное к общему файлу SQLite (METRICS_PATH).
+Так /metrics в любом воркере отдаёт сумму по всем процессам, а счётчики
+не сбрасываются при перезапуске воркеров.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.db import connections
+
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Номер «корзины», в которой лежат значение счётчика и сумма гистограммы.
+TOTAL = -1
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNRESOLVED = '<unresolved>'
+
+# Имя -> (тип, описание, множитель из единиц хранения в единицы метрики).
+# Гистограммы хранят целые: микросекунды, штуки, байты; счётчики времени
+# тоже копятся в микросекундах.
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Обработанные запросы.', 1,
+    ),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа.', 1e-6,
+    ),
+    'yatube_db_duration_seconds': (
+        'histogram', 'Время запросов к базе за ответ.', 1e-6,
+    ),
+    'yatube_db_queries': (
+        'histogram', 'Число запросов к базе за ответ.', 1,
+    ),
+    'yatube_response_size_bytes': (
+        'histogram', 'Размер тела ответа.', 1,
+    ),
+    'yatube_cache_hits_total': (
+        'counter', 'Найденные в кэше ключи.', 1,
+    ),
+    'yatube_cache_misses_total': (
+        'counter', 'Не найденные в кэше ключи.', 1,
+    ),
+    'yatube_compression_saved_bytes_total': (
+        'counter', 'Байты, сэкономленные сжатием ответов.', 1,
+    ),
+    'yatube_compression_cpu_seconds_total': (
+        'counter', 'Процессорное время сжатия ответов.', 1e-6,
+    ),
+    'yatube_compression_reused_total': (
+        'counter', 'Ответы, отданные из сжатой копии в кэше страниц.', 1,
+    ),
+}
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS samples ('
+    'name TEXT NOT NULL, '
+    'labels TEXT NOT NULL, '
+    'bucket INTEGER NOT NULL, '
+    'value REAL NOT NULL, '
+    'PRIMARY KEY (name, labels, bucket)'
+    ') WITHOUT ROWID'
+)
+
+
+def bucket_index(value):
+    """Номер корзины для целого неотрицательного значения."""
+    if value < 2 * SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return shift * SUB_BUCKETS + (value >> shift)
+
+
+def bucket_upper(index):
+    """Наибольшее значение, которое попадает в корзину index."""
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    mantissa = index - shift * SUB_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+
+def format_labels(**labels):
+    def escape(value):
+        return (
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n')
+        )
+    return ','.join(
+        f'{name}="{escape(value)}"' for name, value in labels.items()
+    )
+
+
+class Registry:
+    """
+    Метрики процесса, ещё не добавленные в общий файл.
+
+    {(имя, метки): {корзина: значение}}. После fork дочерний процесс
+    начинает с пустого набора: накопленное родителем тот запишет сам.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._data = {}
+        self.flushed = time.monotonic()
+
+    def _series(self, name, labels):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._data = {}
+        return self._data.setdefault((name, labels), {})
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            series = self._series(name, labels)
+            series[TOTAL] = series.get(TOTAL, 0) + amount
+
+    def observe(self, name, labels, value):
+        value = max(int(value), 0)
+        index = bucket_index(value)
+        with self._lock:
+            series = self._series(name, labels)
+            series[index] = series.get(index, 0) + 1
+            series[TOTAL] = series.get(TOTAL, 0) + value
+
+    def take(self):
+        """Забирает накопленное и начинает копить заново."""
+        with self._lock:
+            data = self._data if self._pid == os.getpid() else {}
+            self._data = {}
+            self._pid = os.getpid()
+            self.flushed = time.monotonic()
+            return data
+
+
+class Store:
+    """Общий для процессов файл SQLite с суммами метрик."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _connection(self):
+        path = settings.METRICS_PATH
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.connections = {}
+            self._local.pid = os.getpid()
+        connection = self._local.connections.get(path)
+        if connection is None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                path, timeout=5, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(SCHEMA)
+            self._local.connections[path] = connection
+        return connection
+
+    def add(self, data):
+        if not data:
+            return
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO samples (name, labels, bucket, value) '
+                'VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (name, labels, bucket) '
+                'DO UPDATE SET value = value + excluded.value',
+                (
+                    (name, labels, bucket, value)
+                    for (name, labels), series in data.items()
+                    for bucket, value in series.items()
+                ),
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def read(self):
+        """{(имя, метки): {корзина: значение}} по всем процессам."""
+        data = {}
+        rows = self._connection().execute(
+            'SELECT name, labels, bucket, value FROM samples '
+            'ORDER BY name, labels, bucket'
+        )
+        for name, labels, bucket, value in rows:
+            data.setdefault((name, labels), {})[bucket] = value
+        return data
+
+
+registry = Registry()
+store = Store()
+
+
+def flush():
+    store.add(registry.take())
+
+
+def flush_due():
+    return (
+        time.monotonic() - registry.flushed >= settings.METRICS_FLUSH_INTERVAL
+    )
+
+
+def maybe_flush():
+    if flush_due():
+        flush()
+
+
+def _number(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return f'{value:.6g}'
+
+
+def render():
+    """Сумма метрик всех процессов в текстовом формате Prometheus."""
+    flush()
+    data = store.read()
+    lines = []
+    for name, (kind, description, scale) in METRICS.items():
+        series = [
+            (labels, buckets) for (metric, labels), buckets in data.items()
+            if metric == name
+        ]
+        if not series:
+            continue
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, buckets in series:
+            total = buckets.get(TOTAL, 0)
+            if kind == 'counter':
+                lines.append(f'{name}{{{labels}}} {_number(total * scale)}')
+                continue
+            count = 0
+            for index in sorted(buckets):
+                if index == TOTAL:
+                    continue
+                count += buckets[index]
+                upper = _number(bucket_upper(index) * scale)
+                lines.append(
+                    f'{name}_bucket{{{labels},le="{upper}"}} {_number(count)}'
+                )
+            lines.append(
+                f'{name}_bucket{{{labels},le="+Inf"}} {_number(count)}'
+            )
+            lines.append(f'{name}_sum{{{labels}}} {_number(total * scale)}')
+            lines.append(f'{name}_count{{{labels}}} {_number(count)}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestSample:
+    """Что успел сделать один запрос: запросы к базе и обращения к кэшу."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+_current = ContextVar('metrics_request', default=None)
+
+
+def record_cache(hits, misses):
+    """Вызывается бэкендом кэша после каждого чтения."""
+    sample = _current.get()
+    if sample is not None:
+        sample.cache_hits += hits
+        sample.cache_misses += misses
+
+
+def response_size(response):
+    if response.streaming:
+        length = response.headers.get('Content-Length')
+        return int(length) if length else None
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    """
+    Снимает метрики запроса; стоит в MIDDLEWARE первым после раздачи
+    статики.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def wrap_queries(stack, sample):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(sample))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sample = RequestSample()
+        token = _current.set(sample)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                self.wrap_queries(stack, sample)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, sample, time.perf_counter() - start)
+        maybe_flush()
+        return response
+
+    async def __acall__(self, request):
+        sample = RequestSample()
+        token = _current.set(sample)
+        start = time.perf_counter()
+        # Соединения с базой у каждого потока свои, а запросы асинхронных
+        # представлений идут через sync_to_async в поток запроса: обёртку
+        # ставим и снимаем там же.
+        stack = ExitStack()
+        await sync_to_async(self.wrap_queries)(stack, sample)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current.reset(token)
+        self.record(request, response, sample, time.perf_counter() - start)
+        if flush_due():
+            await sync_to_async(flush)()
+        return response
+
+    @staticmethod
+    def record(request, response, sample, duration):
+        match = request.resolver_match
+        view = match.view_name if match is not None else UNRESOLVED
+        labels = format_labels(view=view)
+        registry.inc('yatube_requests_total', format_labels(
+            view=view, method=request.method, status=response.status_code,
+        ))
+        registry.observe(
+            'yatube_request_duration_seconds', labels, duration * 10 ** 6,
+        )
+        registry.observe(
+            'yatube_db_duration_seconds', labels, sample.db_time * 10 ** 6,
+        )
+        registry.observe('yatube_db_queries', labels, sample.queries)
+        size = response_size(response)
+        if size is not None:
+            registry.observe('yatube_response_size_bytes', labels, size)
+        if sample.cache_hits:
+            registry.inc('yatube_cache_hits_total', labels, sample.cache_hits)
+        if sample.cache_misses:
+            registry.inc(
+                'yatube_cache_misses_total', labels, sample.cache_misses,
+            )
@@ -0,0 +1,375 @@
+"""
+Кэш страниц с инвалидацией по поколениям.
+
+У каждой области данных («все записи», «записи группы», «записи автора»)
+есть поколение — отметка времени последнего изменения, которая хранится
+в кэше. Поколения областей страницы входят в префикс её ключа, поэтому
+после записи в область старые копии просто перестают находиться, и
+страницы можно хранить часами вместо коротких TTL.
+"""
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from inspect import isawaitable
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.middleware.cache import CacheMiddleware
+from django.utils.cache import (get_conditional_response, has_vary_header,
+                                patch_cache_control)
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from core import compression, replication
+from core.shortcuts import aget_user
+
+GENERATION_KEY = 'generation:{}'
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _generation_keys(scopes):
+    return {scope: GENERATION_KEY.format(scope) for scope in scopes}
+
+
+def get_generations(scopes):
+    """
+    Текущие поколения областей одним запросом к кэшу.
+
+    Если поколение неизвестно (ещё не было записей или ключ вытеснен),
+    оно заводится заново; новое значение больше любого прежнего, так что
+    старые страницы не оживут.
+    """
+    keys = _generation_keys(scopes)
+    stored = cache.get_many(keys.values())
+    generations = {}
+    for scope, key in keys.items():
+        value = stored.get(key)
+        if value is None:
+            value = time.time_ns()
+            if not cache.add(key, value, None):
+                value = cache.get(key, value)
+        generations[scope] = value
+    return generations
+
+
+async def aget_generations(scopes):
+    """get_generations для асинхронных представлений."""
+    keys = _generation_keys(scopes)
+    stored = await cache.aget_many(keys.values())
+    generations = {}
+    for scope, key in keys.items():
+        value = stored.get(key)
+        if value is None:
+            value = time.time_ns()
+            if not await cache.aadd(key, value, None):
+                value = await cache.aget(key, value)
+        generations[scope] = value
+    return generations
+
+
+def _pin_if_fresh(generations):
+    """
+    Если какая-то из областей менялась не раньше DATABASE_PIN_SECONDS
+    назад, реплики могли ещё не получить изменение, и запрос читает из
+    основной базы: иначе устаревшая страница легла бы в кэш и получила
+    ETag под новым поколением.
+    """
+    pin_after = time.time_ns() - settings.DATABASE_PIN_SECONDS * 10 ** 9
+    if generations and max(generations.values()) > pin_after:
+        replication.pin_primary()
+
+
+def request_generations(request, scopes):
+    """
+    get_generations, запомненные на время запроса.
+
+    Валидаторы условного GET и ключ кэша страницы берут поколения одних
+    и тех же областей, и кэш не нужно спрашивать дважды.
+    """
+    memo = request.__dict__.setdefault('_page_generations', {})
+    key = tuple(scopes)
+    if key not in memo:
+        memo[key] = get_generations(key)
+        _pin_if_fresh(memo[key])
+    return memo[key]
+
+
+async def arequest_generations(request, scopes):
+    memo = request.__dict__.setdefault('_page_generations', {})
+    key = tuple(scopes)
+    if key not in memo:
+        memo[key] = await aget_generations(key)
+        _pin_if_fresh(memo[key])
+    return memo[key]
+
+
+def bump(*scopes):
+    """Начинает новое поколение у каждой из областей."""
+    value = time.time_ns()
+    cache.set_many(
+        {GENERATION_KEY.format(scope): value for scope in set(scopes)}, None,
+    )
+
+
+def bump_on_commit(*scopes):
+    """
+    bump после фиксации текущей транзакции.
+
+    Если начать поколение раньше, запрос, пришедший до фиксации, нарисует
+    старые данные и положит их в кэш уже под новым поколением.
+    """
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def _lock_key(key_prefix, request):
+    return f'{key_prefix}:lock:{request.get_full_path()}'
+
+
+def _wait_for_page(middleware, request, lock_key):
+    """
+    Ждёт, пока страницу отрисует другой процесс, и отдаёт её.
+
+    Блокировка общая для всех вариантов страницы (Vary: Cookie), а
+    готовым может оказаться только чужой вариант. Поэтому ожидание
+    кончается, как только блокировку сняли: дальше страницу надо
+    рисовать самому.
+    """
+    deadline = time.monotonic() + settings.PAGE_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        response = middleware.process_request(request)
+        if response is not None or not cache.has_key(lock_key):
+            return response
+    return None
+
+
+async def _await_page(middleware, request, lock_key):
+    """_wait_for_page, который не занимает поток на время ожидания."""
+    deadline = time.monotonic() + settings.PAGE_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        response = await sync_to_async(middleware.process_request)(request)
+        if response is not None or not await cache.ahas_key(lock_key):
+            return response
+    return None
+
+
+def _etag(request, user, generations):
+    viewer = user.pk if user.is_authenticated else ''
+    parts = [f'{scope}={value}' for scope, value in generations.items()]
+    parts.append(f'user={viewer}')
+    parts.append(
+        f'csrf={request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")}'
+    )
+    return hashlib.md5(
+        '&'.join(parts).encode(), usedforsecurity=False,
+    ).hexdigest()
+
+
+def _last_modified(generations):
+    if not generations:
+        return None
+    return datetime.fromtimestamp(
+        max(generations.values()) / 10 ** 9, tz=timezone.utc,
+    )
+
+
+def condition_by_generation(scopes):
+    """
+    Условный GET (ETag и Last-Modified) по поколениям областей страницы.
+
+    Пока ни одна из областей не менялась, клиент с сохранённой копией
+    получает 304 без обращения к представлению. В ETag, кроме поколений,
+    входят пользователь и CSRF-cookie: от них зависят шапка и формы.
+    Last-Modified — время самого свежего поколения. Если scopes вернул
+    None, валидаторов нет и запрос обрабатывается как обычно.
+
+    Для асинхронного представления scopes может быть корутиной.
+    """
+    def generations(request, *args, **kwargs):
+        # Обе функции-валидатора спрашивают одно и то же: области
+        # вычисляются один раз за запрос.
+        memo = request.__dict__.setdefault('_condition_scopes', {})
+        if scopes not in memo:
+            memo[scopes] = scopes(request, *args, **kwargs)
+        if memo[scopes] is None:
+            return None
+        return request_generations(request, memo[scopes])
+
+    def etag(request, *args, **kwargs):
+        values = generations(request, *args, **kwargs)
+        if values is None:
+            return None
+        return _etag(request, request.user, values)
+
+    def last_modified(request, *args, **kwargs):
+        return _last_modified(generations(request, *args, **kwargs))
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return _acondition(view, scopes)
+        return condition(
+            etag_func=etag, last_modified_func=last_modified,
+        )(view)
+    return decorator
+
+
+def _acondition(view, scopes):
+    """То же, что condition из Django, для асинхронного представления."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        found = scopes(request, *args, **kwargs)
+        if isawaitable(found):
+            found = await found
+        if found is None:
+            return await view(request, *args, **kwargs)
+        values = await arequest_generations(request, found)
+        user = await aget_user(request)
+        etag = quote_etag(_etag(request, user, values))
+        modified = _last_modified(values)
+        modified = int(modified.timestamp()) if modified else None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=modified,
+        )
+        if response is None:
+            response = await view(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            if modified and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(modified)
+            response.headers.setdefault('ETag', etag)
+        return response
+    return wrapper
+
+
+def _key_prefix(generations):
+    return 'page:' + ':'.join(
+        f'{scope}={value}' for scope, value in generations.items()
+    )
+
+
+def _revalidate(response):
+    patch_cache_control(response, max_age=0)
+    response.headers.setdefault('Expires', http_date())
+    return response
+
+
+def _will_store(request, response):
+    """
+    Сохранит ли CacheMiddleware.process_response этот ответ.
+
+    Повторяет его проверки, чтобы не сжимать заранее ответы, которые в
+    кэш не попадут.
+    """
+    if response.streaming or response.status_code != 200:
+        return False
+    if (
+        not request.COOKIES and response.cookies
+        and has_vary_header(response, 'Cookie')
+    ):
+        return False
+    return 'private' not in response.get('Cache-Control', '')
+
+
+def _precompress(request, response):
+    if _will_store(request, response):
+        compression.precompress(request, response)
+    return response
+
+
+def cache_page_by_generation(scopes, timeout=None):
+    """
+    Аналог cache_page, у которого ключ зависит от поколений областей.
+
+    scopes получает аргументы представления и возвращает список
+    областей, от которых зависит страница. Когда ключ устарел, страницу
+    рисует только один процесс: он берёт блокировку через cache.add, а
+    остальные недолго ждут готовую копию и лишь потом рисуют сами.
+
+    Браузеру страница отдаётся как требующая перепроверки: хранить её
+    у клиента столько же, сколько в серверном кэше, нельзя. Вместе со
+    страницей в кэш ложатся её сжатые копии (compression.precompress);
+    ответы, которые в кэш не попадут, заранее не сжимаются.
+    """
+    def make_middleware(key_prefix):
+        return CacheMiddleware(
+            lambda request: None,
+            page_timeout=timeout or settings.CACHES_TIME,
+            key_prefix=key_prefix,
+        )
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return _acache_page(view, scopes, make_middleware)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            generations = request_generations(
+                request, scopes(request, *args, **kwargs),
+            )
+            key_prefix = _key_prefix(generations)
+            middleware = make_middleware(key_prefix)
+            response = middleware.process_request(request)
+            if response is not None:
+                return response
+            if not request._cache_update_cache:
+                return _revalidate(view(request, *args, **kwargs))
+
+            lock_key = _lock_key(key_prefix, request)
+            locked = cache.add(lock_key, 1, settings.PAGE_CACHE_LOCK_TIMEOUT)
+            if not locked:
+                response = _wait_for_page(middleware, request, lock_key)
+                if response is not None:
+                    return response
+            try:
+                response = _revalidate(view(request, *args, **kwargs))
+                _precompress(request, response)
+                return middleware.process_response(request, response)
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+        return wrapper
+    return decorator
+
+
+def _acache_page(view, scopes, make_middleware):
+    """
+    cache_page_by_generation для асинхронного представления.
+
+    Поколения и блокировка берутся асинхронными методами кэша, а пока
+    страницу рисует другой процесс, запрос ждёт, не занимая поток.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        generations = await arequest_generations(
+            request, scopes(request, *args, **kwargs),
+        )
+        key_prefix = _key_prefix(generations)
+        middleware = make_middleware(key_prefix)
+        response = await sync_to_async(middleware.process_request)(request)
+        if response is not None:
+            return response
+        if not request._cache_update_cache:
+            return _revalidate(await view(request, *args, **kwargs))
+
+        lock_key = _lock_key(key_prefix, request)
+        locked = await cache.aadd(
+            lock_key, 1, settings.PAGE_CACHE_LOCK_TIMEOUT,
+        )
+        if not locked:
+            response = await _await_page(middleware, request, lock_key)
+            if response is not None:
+                return response
+        try:
+            response = _revalidate(await view(request, *args, **kwargs))
+            _precompress(request, response)
+            return await sync_to_async(middleware.process_response)(
+                request, response,
+            )
+        finally:
+            if locked:
+                await cache.adelete(lock_key)
+    return wrapper
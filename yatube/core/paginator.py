@@ -0,0 +1,394 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Q
+
+COUNT_KEY = 'count:{}'
+
+
+class InvalidCursor(Exception):
+    """Курсор не удалось разобрать."""
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа сортировки в непрозрачную строку."""
+    raw = json.dumps(values, default=str, separators=(',', ':'))
+    token = base64.urlsafe_b64encode(raw.encode())
+    return token.decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает строку, полученную из encode_cursor."""
+    padding = '=' * (-len(token) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(token + padding)
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidCursor(token)
+    if not isinstance(values, list):
+        raise InvalidCursor(token)
+    return values
+
+
+class CursorPage(Sequence):
+    """
+    Страница курсорной пагинации.
+
+    Повторяет интерфейс django.core.paginator.Page в той части, которую
+    используют шаблоны, но не знает ни номера страницы, ни их количества.
+    """
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[0])
+
+
+class CursorPaginator:
+    """
+    Пагинация по ключу сортировки (keyset pagination).
+
+    Вместо OFFSET и COUNT(*) страница выбирается условием «строго после»
+    или «строго перед» последней увиденной записью, поэтому стоимость
+    запроса не зависит от глубины страницы. Сортировка должна однозначно
+    упорядочивать записи, поэтому последним полем обычно идёт id.
+    """
+
+    def __init__(self, object_list, per_page, ordering=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(
+            ordering
+            or object_list.query.order_by
+            or object_list.model._meta.ordering
+        )
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+
+    def cursor_for(self, obj):
+        """Курсор, указывающий на позицию объекта в выдаче."""
+        return encode_cursor([self._value(obj, name) for name in self.fields])
+
+    def get_page(self, after=None, before=None):
+        """
+        Возвращает страницу после курсора after или перед курсором before.
+
+        Некорректный курсор, как и отсутствие курсора, даёт первую страницу.
+        """
+        try:
+            if before:
+                return self._page_before(self._decode(before))
+            if after:
+                return self._page_after(self._decode(after))
+        except InvalidCursor:
+            pass
+        return self._page_after(None)
+
+    async def aget_page(self, after=None, before=None):
+        """get_page для асинхронных представлений."""
+        try:
+            if before:
+                return await self._apage_before(self._decode(before))
+            if after:
+                return await self._apage_after(self._decode(after))
+        except InvalidCursor:
+            pass
+        return await self._apage_after(None)
+
+    def _query_after(self, values):
+        queryset = self.object_list.order_by(*self.ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward=True))
+        return queryset[:self.per_page + 1]
+
+    def _make_page_after(self, values, rows):
+        return CursorPage(
+            rows[:self.per_page],
+            self,
+            has_next=len(rows) > self.per_page,
+            has_previous=values is not None,
+        )
+
+    def _page_after(self, values):
+        return self._make_page_after(values, list(self._query_after(values)))
+
+    async def _apage_after(self, values):
+        rows = [row async for row in self._query_after(values)]
+        return self._make_page_after(values, rows)
+
+    def _query_before(self, values):
+        reverse = [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+        queryset = self.object_list.order_by(*reverse).filter(
+            self._seek(values, forward=False)
+        )
+        return queryset[:self.per_page + 1]
+
+    def _make_page_before(self, rows):
+        return CursorPage(
+            rows[:self.per_page][::-1],
+            self,
+            has_next=True,
+            has_previous=True,
+        )
+
+    def _page_before(self, values):
+        rows = list(self._query_before(values))
+        if len(rows) <= self.per_page:
+            # Дошли до начала выдачи: отдаём полную первую страницу.
+            return self._page_after(None)
+        return self._make_page_before(rows)
+
+    async def _apage_before(self, values):
+        rows = [row async for row in self._query_before(values)]
+        if len(rows) <= self.per_page:
+            return await self._apage_after(None)
+        return self._make_page_before(rows)
+
+    def _seek(self, values, forward):
+        """
+        Условие «кортеж ключа строго после (или перед) values».
+
+        Нестрогое ограничение по первому полю вынесено отдельно: без него
+        SQLite не видит диапазон в условии с OR и читает индекс с начала.
+        """
+        condition = Q()
+        for index, name in enumerate(self.fields):
+            lookup = self._lookup(name, index, forward)
+            step = Q(**{lookup: values[index]})
+            for prev_name, prev_value in zip(self.fields, values[:index]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        bound = self._lookup(self.fields[0], 0, forward, inclusive=True)
+        return Q(**{bound: values[0]}) & condition
+
+    def _lookup(self, name, index, forward, inclusive=False):
+        go_down = self.descending[index] == forward
+        lookup = f'{name}__lt' if go_down else f'{name}__gt'
+        return f'{lookup}e' if inclusive else lookup
+
+    def _decode(self, token):
+        values = decode_cursor(token)
+        if len(values) != len(self.fields):
+            raise InvalidCursor(token)
+        try:
+            return [
+                self._field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except ValidationError:
+            raise InvalidCursor(token)
+
+    def _field(self, name):
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        try:
+            return self.object_list.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise InvalidCursor(name)
+
+    @staticmethod
+    def _value(obj, name):
+        if isinstance(obj, dict):
+            value = obj[name]
+        else:
+            value = getattr(obj, name)
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+
+def attach_cursors(page, paginator):
+    """
+    Добавляет курсоры к обычной странице Paginator.
+
+    Так ссылки «вперёд» и «назад» со страницы, открытой по номеру,
+    сразу ведут на курсорную пагинацию без OFFSET.
+    """
+    page.next_cursor = None
+    page.previous_cursor = None
+    page.object_list = list(page.object_list)
+    if page.object_list and page.has_next():
+        page.next_cursor = paginator.cursor_for(page.object_list[-1])
+    if page.object_list and page.has_previous():
+        page.previous_cursor = paginator.cursor_for(page.object_list[0])
+    return page
+
+
+class CountedPage(Page):
+    """Страница CountedPaginator с окном номеров для шаблона."""
+
+    def has_next(self):
+        # При приблизительном числе записей за последней известной
+        # страницей могут быть ещё записи.
+        return super().has_next() or (
+            self.paginator.approximate
+            and len(self) == self.paginator.per_page
+        )
+
+    @property
+    def page_range(self):
+        return self.paginator.get_elided_page_range(
+            self.number,
+            on_each_side=self.paginator.on_each_side,
+            on_ends=self.paginator.on_ends,
+        )
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginator, которому число записей передаётся готовым.
+
+    Число берётся из счётчика (scope_count, UserStats), а не из COUNT(*)
+    при каждом открытии страницы. Номера страниц отдаются окном вокруг
+    текущей с многоточиями (page_obj.page_range), так что разметка не
+    растёт с числом страниц. Если число приблизительное, конец выдачи
+    неизвестен: номеров последних страниц нет, а «дальше» ведёт курсор.
+    """
+
+    on_each_side = 2
+    on_ends = 1
+
+    def __init__(self, object_list, per_page, count, approximate=False,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = max(count, 0)
+        self.approximate = approximate
+
+    def get_elided_page_range(self, number=1, *, on_each_side=3, on_ends=2):
+        pages = super().get_elided_page_range(
+            number, on_each_side=on_each_side, on_ends=on_ends,
+        )
+        if not self.approximate:
+            return pages
+        number = self.validate_number(number)
+        pages = [
+            page for page in pages
+            if page == self.ELLIPSIS or page <= number + on_each_side
+        ]
+        if pages[-1] != self.ELLIPSIS:
+            pages.append(self.ELLIPSIS)
+        return pages
+
+    def _get_page(self, *args, **kwargs):
+        return CountedPage(*args, **kwargs)
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк по плану запроса или None.
+
+    Оценку даёт только PostgreSQL; у SQLite статистики по условию нет.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _bounded(queryset, count):
+    limit = settings.PAGINATOR_COUNT_LIMIT
+    if count < limit:
+        return count, False
+    return max(count, estimate_count(queryset) or 0), True
+
+
+def bounded_count(queryset):
+    """
+    Число записей, но не дороже PAGINATOR_COUNT_LIMIT строк.
+
+    Возвращает (число, приблизительное ли оно). В большой выдаче COUNT(*)
+    читает весь индекс; здесь счёт останавливается на пределе, а дальше
+    берётся оценка базы, если она есть.
+    """
+    limit = settings.PAGINATOR_COUNT_LIMIT
+    return _bounded(queryset, queryset.order_by()[:limit].count())
+
+
+async def abounded_count(queryset):
+    limit = settings.PAGINATOR_COUNT_LIMIT
+    count = await queryset.order_by()[:limit].acount()
+    if count < limit:
+        return count, False
+    return await sync_to_async(_bounded)(queryset, count)
+
+
+def scope_count(scope, queryset):
+    """
+    bounded_count, запомненное в кэше под именем области.
+
+    Записи в области сдвигают число через change_counts, поэтому
+    пересчёт нужен только после вытеснения ключа или по истечении
+    PAGINATOR_COUNT_TIMEOUT, который исправляет накопившийся дрейф.
+    """
+    key = COUNT_KEY.format(scope)
+    count = cache.get(key)
+    if count is None:
+        count, _ = bounded_count(queryset)
+        cache.add(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+    return count, count >= settings.PAGINATOR_COUNT_LIMIT
+
+
+async def ascope_count(scope, queryset):
+    key = COUNT_KEY.format(scope)
+    count = await cache.aget(key)
+    if count is None:
+        count, _ = await abounded_count(queryset)
+        await cache.aadd(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+    return count, count >= settings.PAGINATOR_COUNT_LIMIT
+
+
+def change_counts(scopes, delta):
+    """Сдвигает запомненные числа областей; незапомненные не трогает."""
+    for scope in set(scopes):
+        try:
+            cache.incr(COUNT_KEY.format(scope), delta)
+        except ValueError:
+            pass
+
+
+def forget_counts(scopes):
+    """Следующее обращение к областям пересчитает их заново."""
+    cache.delete_many([COUNT_KEY.format(scope) for scope in set(scopes)])
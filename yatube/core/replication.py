@@ -0,0 +1,140 @@
+"""
+Чтение из реплик, запись в основную базу.
+
+Пока идёт запрос, PrimaryReplicaRouter отправляет чтения в случайную
+из DATABASE_REPLICAS, а запись — в default. Реплики отстают, поэтому
+чтения уходят в основную базу:
+
+* вне запросов — в командах и потоках пула, которые сразу читают то,
+  что только что записали;
+* внутри транзакции;
+* до конца запроса, в котором уже была запись;
+* DATABASE_PIN_SECONDS секунд после запроса с записью: ответ ставит
+  cookie, и следующие запросы того же клиента видят свои изменения,
+  даже если реплика их ещё не получила;
+* если страница зависит от недавно изменённых данных (pin_primary):
+  иначе копия из отстающей реплики попала бы в кэш страниц под новым
+  поколением.
+
+Локально репликой служит копия db.sqlite3, которую обновляет команда
+replicate_sqlite; в тестах реплики смотрят в default (TEST MIRROR).
+"""
+import os
+import random
+import sqlite3
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_pin'
+
+_routing = ContextVar('replica_routing', default=None)
+
+
+class Routing:
+    """Состояние маршрутизации одного запроса."""
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def pin_primary():
+    """До конца запроса читать только из основной базы."""
+    routing = _routing.get()
+    if routing is not None:
+        routing.pinned = True
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if (
+            routing is None
+            or routing.pinned
+            or routing.wrote
+            or not settings.DATABASE_REPLICAS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема приходит в реплики вместе с данными.
+        return db not in settings.DATABASE_REPLICAS
+
+
+class PinPrimaryMiddleware:
+    """Включает чтение из реплик на время запроса и ставит PIN_COOKIE."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = Routing(pinned=PIN_COOKIE in request.COOKIES)
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(routing, response)
+
+    async def __acall__(self, request):
+        routing = Routing(pinned=PIN_COOKIE in request.COOKIES)
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(routing, response)
+
+    @staticmethod
+    def pin(routing, response):
+        if routing.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.DATABASE_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+def copy_sqlite(source, target):
+    """
+    Согласованная копия файла SQLite через backup API.
+
+    Копия пишется во временный файл и подменяет target одним rename:
+    открытые соединения дочитывают старую копию, новые видят новую, и
+    читателям реплики не приходится ждать блокировки.
+    """
+    temporary = f'{target}.tmp'
+    source_connection = sqlite3.connect(source)
+    target_connection = sqlite3.connect(temporary)
+    try:
+        source_connection.backup(target_connection)
+    finally:
+        target_connection.close()
+        source_connection.close()
+    os.replace(temporary, target)
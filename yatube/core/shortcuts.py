@@ -0,0 +1,59 @@
+"""
+Помощники для асинхронных представлений.
+
+В Django 4.2 ещё нет request.auser() и aget_object_or_404, а
+login_required и шаблоны работают только синхронно. Здесь их
+асинхронные замены: всё, что может обратиться к базе, выполняется одним
+переходом в sync_to_async, а не по запросу на каждый атрибут.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+from django.shortcuts import render
+
+
+async def aget_user(request):
+    """
+    Пользователь запроса, загруженный вне цикла событий.
+
+    request.user — ленивый объект, который при первом обращении читает
+    сессию и пользователя из базы. После aget_user он уже вычислен, и
+    шаблоны и проверки в асинхронном коде базу не трогают.
+    """
+    def load():
+        user = request.user
+        bool(user.is_authenticated)
+        return user
+    return await sync_to_async(load)()
+
+
+async def aget_object_or_404(queryset, **lookups):
+    try:
+        return await queryset.aget(**lookups)
+    except queryset.model.DoesNotExist:
+        raise Http404(
+            f'No {queryset.model._meta.object_name} matches the given query.'
+        )
+
+
+async def arender(request, template_name, context=None, status=None):
+    """
+    render в потоке: теги шаблонов (карточки, миниатюры) ходят в кэш
+    и базу синхронно.
+    """
+    return await sync_to_async(render)(
+        request, template_name, context, status=status,
+    )
+
+
+def alogin_required(view):
+    """login_required для асинхронного представления."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,224 @@
+"""
+Сборка статики с хэшами в именах и её раздача из памяти.
+
+collectstatic с CompressedManifestStorage:
+
+* чистит CSS из STATIC_PURGE_CSS от правил, которые не встречаются в
+  каталогах STATIC_PURGE_CONTENT (core.csspurge);
+* дописывает к именам хэш содержимого (ManifestStaticFilesStorage);
+* кладёт рядом с текстовыми файлами сжатые копии .gz и, если установлены
+  модули brotli и zstandard, .br и .zst (core.compression).
+
+StaticFilesMiddleware при запуске процесса читает STATIC_ROOT в память и
+отдаёт файлы до остальных промежуточных слоёв: в нужном Content-Encoding,
+с ETag и, для имён с хэшем, с Cache-Control на год и immutable. Так
+отдельный веб-сервер для статики не нужен ни под WSGI, ни под ASGI.
+"""
+import hashlib
+import mimetypes
+import os
+from fnmatch import fnmatch
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import (ManifestStaticFilesStorage,
+                                                staticfiles_storage)
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from core import compression, csspurge
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.html', '.txt', '.json', '.xml',
+                '.map', '.ico')
+# Сжатая копия, которая экономит меньше 5%, не стоит лишнего файла.
+COMPRESSION_RATIO = 0.95
+# Content-Encoding -> расширение сжатой копии, по убыванию предпочтения.
+ENCODINGS = {'br': '.br', 'zstd': '.zst', 'gzip': '.gz'}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def compress(content):
+    """Сжатые версии content: {Content-Encoding: байты}."""
+    return {
+        encoding: compression.compress(
+            encoding, content, compression.MAX_LEVELS[encoding],
+        )
+        for encoding in compression.available(ENCODINGS)
+    }
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def stored_name(self, name):
+        # До первого collectstatic манифеста и файлов нет: шаблоны
+        # ссылаются на исходные имена, их отдаёт staticfiles при DEBUG.
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run, **options)
+            return
+        self.purge(paths)
+        yield from super().post_process(paths, dry_run, **options)
+        yield from self.compress({*paths, *self.hashed_files.values()})
+
+    def purge(self, paths):
+        """Заменяет CSS в STATIC_ROOT очищенным и хэширует уже его."""
+        targets = [
+            name for name in paths
+            if any(fnmatch(name, pattern)
+                   for pattern in settings.STATIC_PURGE_CSS)
+        ]
+        if not targets:
+            return
+        names = csspurge.used_names(settings.STATIC_PURGE_CONTENT)
+        names.update(settings.STATIC_PURGE_SAFELIST)
+        for name in targets:
+            storage, path = paths[name]
+            with storage.open(path) as file:
+                css = file.read().decode()
+            self.delete(name)
+            self._save(name, ContentFile(csspurge.purge(css, names).encode()))
+            paths[name] = (self, name)
+
+    def compress(self, names):
+        for name in sorted(names):
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            with self.open(name) as file:
+                content = file.read()
+            for encoding, data in compress(content).items():
+                if len(data) >= len(content) * COMPRESSION_RATIO:
+                    continue
+                compressed = name + ENCODINGS[encoding]
+                if self.exists(compressed):
+                    self.delete(compressed)
+                self._save(compressed, ContentFile(data))
+                yield name, compressed, True
+
+
+class StaticFile:
+    """Файл из STATIC_ROOT со всеми сжатыми версиями в памяти."""
+
+    def __init__(self, path, immutable):
+        with open(path, 'rb') as file:
+            self.versions = {'identity': file.read()}
+        for encoding, extension in ENCODINGS.items():
+            if os.path.exists(path + extension):
+                with open(path + extension, 'rb') as file:
+                    self.versions[encoding] = file.read()
+        digest = hashlib.md5(
+            self.versions['identity'], usedforsecurity=False,
+        ).hexdigest()[:16]
+        self.etags = {
+            encoding: f'"{digest}-{encoding}"' for encoding in self.versions
+        }
+        self.content_type = (
+            mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        )
+        self.last_modified = os.stat(path).st_mtime
+        self.cache_control = (
+            IMMUTABLE if immutable
+            else f'public, max-age={settings.STATIC_MAX_AGE}'
+        )
+
+    def encoding_for(self, accept_encoding):
+        encoding = compression.negotiate(
+            accept_encoding,
+            [encoding for encoding in ENCODINGS if encoding in self.versions],
+        )
+        return encoding or 'identity'
+
+
+def load_static_files():
+    """{путь URL: StaticFile} для всех файлов STATIC_ROOT."""
+    root = settings.STATIC_ROOT
+    if not root or not os.path.isdir(root):
+        return {}
+    prefix = urlsplit(settings.STATIC_URL).path
+    hashed = set(staticfiles_storage.hashed_files.values())
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(tuple(ENCODINGS.values())):
+                continue
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            if relative == staticfiles_storage.manifest_name:
+                continue
+            files[prefix + relative] = StaticFile(path, relative in hashed)
+    return files
+
+
+class StaticFilesMiddleware:
+    """
+    Отдаёт собранную статику из памяти; должен стоять первым в MIDDLEWARE.
+
+    Если collectstatic ещё не запускали, слой отключается.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.files = load_static_files()
+        if not self.files:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.serve(request)
+        if response is None:
+            response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request):
+        # Файлы уже в памяти: отдать их можно прямо в цикле событий.
+        response = self.serve(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        static_file = self.files.get(request.path_info)
+        if static_file is None:
+            return None
+        encoding = static_file.encoding_for(
+            request.headers.get('Accept-Encoding', ''),
+        )
+        etag = static_file.etags[encoding]
+        response = get_conditional_response(
+            request, etag=etag, last_modified=static_file.last_modified,
+        )
+        if response is None:
+            content = static_file.versions[encoding]
+            response = HttpResponse(
+                content if request.method == 'GET' else b'',
+                content_type=static_file.content_type,
+            )
+            response.headers['Content-Length'] = len(content)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(
+            static_file.last_modified,
+        )
+        response.headers['Cache-Control'] = static_file.cache_control
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        if len(static_file.versions) > 1:
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
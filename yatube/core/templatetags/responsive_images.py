@@ -0,0 +1,54 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, width, height, renditions=(), sizes='100vw',
+                     **attrs):
+    """
+    Картинка с srcset по заранее сохранённым уменьшенным копиям.
+
+    Размеры и копии берутся из полей модели, поэтому файл при отрисовке
+    не открывается. Копии — словари с ключами width, type и name; у
+    браузеров с WebP копии WebP идут отдельным <source>. Сама картинка
+    входит в набор как самая широкая. Без известных размеров выводится
+    обычный <img>, но тоже с отложенной загрузкой.
+    """
+    if not image:
+        return ''
+    attrs = {'loading': 'lazy', 'decoding': 'async', 'alt': '', **attrs}
+    if not width or not height:
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+
+    storage = image.storage
+    original = f'{image.url} {width}w'
+    sets = {}
+    for rendition in sorted(renditions, key=lambda item: item['width']):
+        sets.setdefault(rendition['type'], []).append(
+            f'{storage.url(rendition["name"])} {rendition["width"]}w'
+        )
+    fallback = sets.pop('image/jpeg', [])
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (content_type, ', '.join([*srcset, original]), sizes)
+            for content_type, srcset in sets.items()
+        ),
+    )
+    img = format_html(
+        '<img src="{}"{}>',
+        image.url,
+        flatatt({
+            'srcset': ', '.join([*fallback, original]),
+            'sizes': sizes,
+            'width': width,
+            'height': height,
+            **attrs,
+        }),
+    )
+    if not sources:
+        return img
+    return format_html('<picture>{}{}</picture>', sources, img)
@@ -0,0 +1,41 @@
+"""
+Запуск тестов с кэшем и метриками во временном каталоге.
+
+Кэш и метрики по умолчанию — файлы SQLite в cache/, общие с runserver:
+без подмены тесты читали бы чужие записи, каждый cache.clear() стирал
+бы рабочий кэш разработчика, а тестовые запросы попадали бы в /metrics.
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class ScratchStorageRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.scratch_directory = tempfile.mkdtemp(prefix='yatube-test-')
+        self.scratch_settings = override_settings(**self.scratch_overrides())
+        self.scratch_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.scratch_settings.disable()
+        shutil.rmtree(self.scratch_directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
+
+    def scratch_overrides(self):
+        """Те же настройки, но с файлами во временном каталоге."""
+        return {
+            'CACHES': {'default': {
+                **settings.CACHES['default'],
+                'LOCATION': os.path.join(
+                    self.scratch_directory, 'cache.sqlite3',
+                ),
+            }},
+            'METRICS_PATH': os.path.join(
+                self.scratch_directory, 'metrics.sqlite3',
+            ),
+        }
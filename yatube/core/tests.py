@@ -1,6 +1,28 @@
+import gzip
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
 from http import HTTPStatus
 
-from django.test import TestCase
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models.fields.files import FieldFile
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import Context, Template
+from django.templatetags.static import static
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+
+from core import compression, csspurge, metrics, page_cache
+from core.cache_backends import SQLiteCache
+from core.replication import (PIN_COOKIE, PinPrimaryMiddleware,
+                              PrimaryReplicaRouter, copy_sqlite)
+from posts.models import Post
 
 
 class ViewTestClass(TestCase):
@@ -10,3 +32,668 @@ class ViewTestClass(TestCase):
         # Проверьте, что используется шаблон core/404.html
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+def _set_in_child(location, key, value):
+    SQLiteCache(location, {}).set(key, value)
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    """Кэш в файле SQLite."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_get_set_delete(self):
+        """Значения записываются, читаются и удаляются"""
+        cache = self.make_cache()
+        self.assertIsNone(cache.get('missing'))
+        cache.set('key', {'value': [1, 2]})
+        self.assertEqual(cache.get('key'), {'value': [1, 2]})
+        self.assertTrue(cache.has_key('key'))
+        self.assertTrue(cache.delete('key'))
+        self.assertEqual(cache.get('key', 'default'), 'default')
+
+    def test_many(self):
+        """get_many и set_many работают пачкой"""
+        cache = self.make_cache()
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        cache.delete_many(['a'])
+        self.assertEqual(cache.get_many(['a', 'b']), {'b': 2})
+
+    def test_timeout(self):
+        """Истёкшие записи не читаются, а add их перезаписывает"""
+        cache = self.make_cache()
+        cache.set('key', 'old', 0.05)
+        self.assertFalse(cache.add('key', 'new'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'new'))
+        self.assertEqual(cache.get('key'), 'new')
+        cache.set('forever', 1, None)
+        self.assertTrue(cache.touch('forever', 0.05))
+        time.sleep(0.1)
+        self.assertFalse(cache.has_key('forever'))
+
+    def test_incr(self):
+        """incr меняет число и падает на отсутствующем ключе"""
+        cache = self.make_cache()
+        cache.set('counter', 1)
+        self.assertEqual(cache.incr('counter', 5), 6)
+        self.assertEqual(cache.decr('counter'), 5)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+    def test_evicts_least_recently_used(self):
+        """При переполнении вытесняются давно не читавшиеся записи"""
+        cache = self.make_cache(
+            MAX_ENTRIES=4, CULL_FREQUENCY=4, TOUCH_INTERVAL=0,
+        )
+        for number in range(4):
+            cache.set(f'key{number}', number)
+        cache.get('key0')
+        cache.set('key4', 4)
+        self.assertEqual(
+            sorted(cache.get_many([f'key{n}' for n in range(5)])),
+            ['key0', 'key2', 'key3', 'key4'],
+        )
+
+    def test_evicts_by_size(self):
+        """Суммарный размер записей не выходит за MAX_BYTES"""
+        cache = self.make_cache(MAX_BYTES=10000)
+        for number in range(10):
+            cache.set(f'key{number}', b'x' * 2000)
+        connection = cache._connection()
+        size, = connection.execute('SELECT SUM(size) FROM cache').fetchone()
+        self.assertLessEqual(size, 10000)
+        self.assertIn('key9', cache.get_many(['key9']))
+
+    def test_shared_between_processes(self):
+        """Запись из другого процесса видна без перезапуска"""
+        cache = self.make_cache()
+        cache.get('warm')
+        context = multiprocessing.get_context('fork')
+        process = context.Process(
+            target=_set_in_child,
+            args=(self.location, 'shared', 'from child'),
+        )
+        process.start()
+        process.join()
+        self.assertEqual(cache.get('shared'), 'from child')
+
+
+def _record_in_child():
+    metrics.registry.inc('yatube_requests_total', 'view="child"', 3)
+    metrics.flush()
+
+
+class MetricsTests(TestCase):
+    """Метрики запросов и /metrics."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = self.settings(
+            METRICS_PATH=os.path.join(directory.name, 'metrics.sqlite3'),
+        )
+        path.enable()
+        self.addCleanup(path.disable)
+        # Накопленное другими тестами сюда не относится.
+        metrics.registry.take()
+
+    def test_buckets(self):
+        """Значение попадает в корзину с ошибкой не больше 1/SUB_BUCKETS"""
+        previous = -1
+        for value in (*range(100), 1000, 123456, 10 ** 9):
+            index = metrics.bucket_index(value)
+            upper = metrics.bucket_upper(index)
+            self.assertGreaterEqual(upper, value)
+            self.assertLessEqual(upper - value, value / metrics.SUB_BUCKETS)
+            self.assertGreaterEqual(index, previous)
+            previous = index
+
+    def test_endpoint(self):
+        """Запросы учитываются по представлениям и отдаются Prometheus"""
+        for _ in range(2):
+            self.client.get('/')
+        self.client.get('/nonexist-page/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_requests_total{view="posts:index",method="GET",'
+            'status="200"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_requests_total{view="<unresolved>",method="GET",'
+            'status="404"} 1',
+            text,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket{view="posts:index",'
+            'le="+Inf"} 2',
+            text,
+        )
+        self.assertIn('yatube_db_queries_count{view="posts:index"} 2', text)
+        self.assertIn('yatube_cache_hits_total{view="posts:index"}', text)
+
+    async def test_async_request(self):
+        """Запросы к базе из асинхронных представлений тоже учитываются"""
+        await self.async_client.get('/')
+        data = metrics.registry.take()
+        queries = data[('yatube_db_queries', 'view="posts:index"')]
+        self.assertGreater(queries[metrics.TOTAL], 0)
+
+    @override_settings(METRICS_ALLOWED_IPS=())
+    def test_endpoint_hidden(self):
+        """С чужого адреса /metrics не видно"""
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_proxied_request_hidden(self):
+        """Через прокси адрес клиента берётся только из его заголовка"""
+        response = self.client.get(
+            '/metrics', headers={'X-Forwarded-For': '127.0.0.1'},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        with self.settings(METRICS_CLIENT_IP_HEADER='HTTP_X_REAL_IP'):
+            for address, status in (
+                ('203.0.113.5', HTTPStatus.NOT_FOUND),
+                ('127.0.0.1', HTTPStatus.OK),
+            ):
+                with self.subTest(address=address):
+                    response = self.client.get(
+                        '/metrics', headers={'X-Real-IP': address},
+                    )
+                    self.assertEqual(response.status_code, status)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        """С METRICS_TOKEN нужен заголовок Authorization с токеном"""
+        for authorization, status in (
+            (None, HTTPStatus.NOT_FOUND),
+            ('Bearer wrong', HTTPStatus.NOT_FOUND),
+            ('Bearer secret', HTTPStatus.OK),
+        ):
+            with self.subTest(authorization=authorization):
+                headers = (
+                    {'Authorization': authorization} if authorization else {}
+                )
+                response = self.client.get('/metrics', headers=headers)
+                self.assertEqual(response.status_code, status)
+
+    def test_shared_between_processes(self):
+        """Счётчики всех процессов складываются"""
+        metrics.registry.inc('yatube_requests_total', 'view="child"', 1)
+        context = multiprocessing.get_context('fork')
+        process = context.Process(target=_record_in_child)
+        process.start()
+        process.join()
+        self.assertIn(
+            'yatube_requests_total{view="child"} 4', metrics.render(),
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicationTests(SimpleTestCase):
+    """Чтение из реплик и копирование SQLite."""
+
+    router = PrimaryReplicaRouter()
+
+    def request(self, view, **cookies):
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies)
+        return PinPrimaryMiddleware(view)(request)
+
+    def read_db(self):
+        return self.router.db_for_read(Post)
+
+    def test_outside_request(self):
+        """Вне запроса всё читается из основной базы"""
+        self.assertEqual(self.read_db(), 'default')
+
+    def test_reads_go_to_replica(self):
+        """В запросе без записи чтения идут в реплику"""
+        routed = []
+
+        def view(request):
+            routed.append(self.read_db())
+            return HttpResponse()
+
+        response = self.request(view)
+        self.assertEqual(routed, ['replica'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_pinned_after_write(self):
+        """После записи клиент читает из основной базы"""
+        routed = []
+
+        def view(request):
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            routed.append(self.read_db())
+            return HttpResponse()
+
+        response = self.request(view)
+        self.assertEqual(routed, ['default'])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        def next_view(request):
+            routed.append(self.read_db())
+            return HttpResponse()
+
+        self.request(next_view, **{PIN_COOKIE: '1'})
+        self.assertEqual(routed, ['default', 'default'])
+
+    def test_pinned_by_fresh_generation(self):
+        """Страница со свежими изменениями читается из основной базы"""
+        routed = []
+
+        def view(request):
+            page_cache.request_generations(request, ['old'])
+            routed.append(self.read_db())
+            page_cache.bump('fresh')
+            page_cache.request_generations(request, ['fresh'])
+            routed.append(self.read_db())
+            return HttpResponse()
+
+        with patch('time.time_ns', return_value=0):
+            page_cache.bump('old')
+        self.request(view)
+        self.assertEqual(routed, ['replica', 'default'])
+
+    def test_no_migrations_on_replicas(self):
+        """Схема реплик не мигрирует отдельно"""
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+
+    def test_copy_sqlite(self):
+        """Копия согласована и подменяется, не мешая открытым читателям"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source = os.path.join(directory.name, 'primary.sqlite3')
+        target = os.path.join(directory.name, 'replica.sqlite3')
+        with sqlite3.connect(source) as connection:
+            connection.execute('CREATE TABLE item (value INTEGER)')
+            connection.execute('INSERT INTO item VALUES (1)')
+        copy_sqlite(source, target)
+        reader = sqlite3.connect(target)
+        self.addCleanup(reader.close)
+        reader.execute('BEGIN')
+        self.assertEqual(
+            reader.execute('SELECT COUNT(*) FROM item').fetchone(), (1,),
+        )
+        with sqlite3.connect(source) as connection:
+            connection.execute('INSERT INTO item VALUES (2)')
+        copy_sqlite(source, target)
+        with sqlite3.connect(target) as connection:
+            self.assertEqual(
+                connection.execute('SELECT COUNT(*) FROM item').fetchone(),
+                (2,),
+            )
+
+
+class ResponsiveImageTests(SimpleTestCase):
+    """Тег responsive_image."""
+
+    template = Template(
+        '{% load responsive_images %}'
+        '{% responsive_image post.image post.image_width post.image_height '
+        'post.image_renditions sizes="50vw" class="card-img" %}'
+    )
+
+    def render(self, post):
+        with patch.object(FieldFile, 'open') as file_open:
+            html = self.template.render(Context({'post': post}))
+        file_open.assert_not_called()
+        return html
+
+    def test_srcset_from_renditions(self):
+        """srcset собирается из копий, размеры берутся из модели"""
+        post = Post(
+            image='posts/photo.jpg',
+            image_width=1200,
+            image_height=600,
+            image_renditions=[
+                {'width': 480, 'height': 240, 'type': 'image/webp',
+                 'name': 'posts/photo-480w.webp'},
+                {'width': 480, 'height': 240, 'type': 'image/jpeg',
+                 'name': 'posts/photo-480w.jpg'},
+            ],
+        )
+        html = self.render(post)
+        self.assertInHTML(
+            '<source type="image/webp" sizes="50vw" '
+            'srcset="/media/posts/photo-480w.webp 480w, '
+            '/media/posts/photo.jpg 1200w">',
+            html,
+        )
+        self.assertInHTML(
+            '<img src="/media/posts/photo.jpg" '
+            'srcset="/media/posts/photo-480w.jpg 480w, '
+            '/media/posts/photo.jpg 1200w" sizes="50vw" '
+            'width="1200" height="600" loading="lazy" decoding="async" '
+            'alt="" class="card-img">',
+            html,
+        )
+
+    def test_without_dimensions(self):
+        """Без известных размеров выводится простая ленивая картинка"""
+        html = self.render(Post(image='posts/old.jpg'))
+        self.assertInHTML(
+            '<img src="/media/posts/old.jpg" loading="lazy" '
+            'decoding="async" alt="" class="card-img">',
+            html,
+        )
+        self.assertEqual(self.render(Post()), '')
+
+
+class StaticFilesTests(SimpleTestCase):
+    """Сборка статики и раздача её из памяти."""
+
+    def test_purge(self):
+        """Из CSS пропадают правила с классами, которых нет в разметке"""
+        css = (
+            '@charset "UTF-8";/*! лицензия */body{margin:0}'
+            '.used,.unused{color:red}.unused>.used{color:blue}'
+            '.used:not(.other){content:"}"}'
+            '@media (min-width:576px){.unused{top:0}}'
+            '@media print{.used{top:0}}'
+            '@keyframes spin{to{transform:rotate(1turn)}}'
+        )
+        self.assertEqual(
+            csspurge.purge(css, {'used'}),
+            '@charset "UTF-8";/*! лицензия */body{margin:0}'
+            '.used{color:red}.used:not(.other){content:"}"}'
+            '@media print{.used{top:0}}'
+            '@keyframes spin{to{transform:rotate(1turn)}}',
+        )
+
+    def test_collectstatic_and_serve(self):
+        """
+        collectstatic пишет хэшированные и сжатые файлы, а промежуточный
+        слой отдаёт их с долгим кэшем
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with self.settings(STATIC_ROOT=directory.name):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            url = static('css/bootstrap.min.css')
+            source = os.path.join(
+                settings.BASE_DIR, 'static', 'css', 'bootstrap.min.css',
+            )
+            client = Client()
+            response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+            plain = client.get('/static/css/bootstrap.min.css')
+            repeat = client.get(url, headers={
+                'Accept-Encoding': 'gzip',
+                'If-None-Match': response['ETag'],
+            })
+        self.assertRegex(url, r'bootstrap\.min\.[0-9a-f]{12}\.css$')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        css = gzip.decompress(response.content)
+        self.assertIn(b'.page-link', css)
+        self.assertNotIn(b'.carousel', css)
+        self.assertLess(len(css), os.path.getsize(source) / 2)
+        self.assertEqual(plain.content, css)
+        self.assertNotIn('immutable', plain['Cache-Control'])
+        self.assertEqual(repeat.status_code, HTTPStatus.NOT_MODIFIED)
+
+
+class MediaTests(SimpleTestCase):
+    """Раздача загруженных файлов."""
+
+    content = b'0123456789abcdef'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media_root = self.settings(MEDIA_ROOT=directory.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        for name in ('posts/photo.txt', 'cache/ab/thumb.jpg'):
+            path = os.path.join(directory.name, name)
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as file:
+                file.write(self.content)
+        self.url = f'{settings.MEDIA_URL}posts/photo.txt'
+
+    def get(self, url=None, **headers):
+        response = self.client.get(url or self.url, headers=headers)
+        if response.streaming:
+            response.body = b''.join(response.streaming_content)
+        return response
+
+    def test_whole_file(self):
+        """Файл отдаётся целиком с валидаторами и коротким кэшем"""
+        response = self.get()
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.body, self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertEqual(
+            response['Cache-Control'],
+            f'public, max-age={settings.MEDIA_MAX_AGE}',
+        )
+
+    def test_immutable_copies(self):
+        """Миниатюры кэшируются навсегда"""
+        response = self.get(f'{settings.MEDIA_URL}cache/ab/thumb.jpg')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_ranges(self):
+        """Range отдаёт запрошенный кусок"""
+        cases = {
+            'bytes=2-5': (b'2345', 'bytes 2-5/16'),
+            'bytes=10-': (b'abcdef', 'bytes 10-15/16'),
+            'bytes=-3': (b'def', 'bytes 13-15/16'),
+            'bytes=14-100': (b'ef', 'bytes 14-15/16'),
+        }
+        for header, (body, content_range) in cases.items():
+            with self.subTest(range=header):
+                response = self.get(Range=header)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.PARTIAL_CONTENT,
+                )
+                self.assertEqual(response.body, body)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+
+    def test_unsatisfiable_range(self):
+        """Кусок за концом файла — 416"""
+        response = self.get(Range='bytes=16-')
+        self.assertEqual(
+            response.status_code, HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+        )
+        self.assertEqual(response['Content-Range'], 'bytes */16')
+
+    def test_stale_if_range(self):
+        """При устаревшем If-Range файл отдаётся целиком"""
+        response = self.get(Range='bytes=2-5', **{'If-Range': '"old"'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.body, self.content)
+
+    def test_conditional_get(self):
+        """Повторный запрос с ETag получает 304"""
+        etag = self.get()['ETag']
+        response = self.get(**{'If-None-Match': etag})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_outside_media_root(self):
+        """Файлы вне MEDIA_ROOT и каталоги не отдаются"""
+        for path in ('../settings.py', 'posts/', 'missing.txt'):
+            with self.subTest(path=path):
+                response = self.get(f'{settings.MEDIA_URL}{path}')
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        """За nginx тело файла отдаёт прокси"""
+        response = self.get()
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            f'{settings.MEDIA_SENDFILE_PREFIX}posts/photo.txt',
+        )
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+
+
+class CompressionTests(TestCase):
+    """Сжатие ответов и сжатые копии страниц в кэше."""
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.take()
+
+    def test_negotiation(self):
+        """q=0 запрещает кодировку, порядок выбирает сервер"""
+        self.assertEqual(
+            compression.negotiate('gzip;q=0, br', ['gzip']), None,
+        )
+        self.assertEqual(
+            compression.negotiate('gzip, deflate, zstd;q=0.5',
+                                  ['zstd', 'gzip']),
+            'zstd',
+        )
+
+    def test_cached_page_is_not_recompressed(self):
+        """Страница из кэша отдаётся уже сжатой"""
+        plain = self.client.get('/')
+        self.assertNotIn('Content-Encoding', plain)
+        with patch.object(
+            compression, 'compress', wraps=compression.compress,
+        ) as compress:
+            response = self.client.get(
+                '/', headers={'Accept-Encoding': 'gzip'},
+            )
+        compress.assert_not_called()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content))
+        data = metrics.registry.take()
+        self.assertIn(
+            ('yatube_compression_reused_total', 'encoding="gzip"'), data,
+        )
+        self.assertGreater(
+            data[('yatube_compression_saved_bytes_total',
+                  'encoding="gzip"')][metrics.TOTAL],
+            0,
+        )
+
+    def test_streaming_response(self):
+        """Потоковый ответ сжимается по кускам"""
+        chunks = [b'a' * 1000, b'b' * 1000]
+        middleware = compression.CompressionMiddleware(
+            lambda request: StreamingHttpResponse(
+                iter(chunks), content_type='text/plain',
+            )
+        )
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = middleware(request)
+        parts = list(response.streaming_content)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertGreater(len(parts), len(chunks))
+        self.assertEqual(gzip.decompress(b''.join(parts)), b''.join(chunks))
+
+    def test_skips_binary_and_short(self):
+        """Картинки и короткие ответы не сжимаются"""
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        for response in (
+            HttpResponse(b'x' * 1000, content_type='image/png'),
+            HttpResponse(b'short', content_type='text/html'),
+        ):
+            with self.subTest(content_type=response['Content-Type']):
+                middleware = compression.CompressionMiddleware(
+                    lambda request: response,
+                )
+                self.assertNotIn('Content-Encoding', middleware(request))
+
+    def test_sensitive_response_is_padded(self):
+        """Ответы с CSRF-токеном или Vary: Cookie — только gzip с шумом"""
+        body = b'<input name="csrfmiddlewaretoken" value="secret">' * 10
+        request = RequestFactory().get(
+            '/', HTTP_ACCEPT_ENCODING='br, zstd, gzip',
+        )
+        for content, vary in ((body, None), (b'x' * 1000, 'Cookie')):
+            with self.subTest(vary=vary):
+                bodies = set()
+                for _ in range(3):
+                    response = HttpResponse(content, content_type='text/html')
+                    if vary:
+                        response['Vary'] = vary
+                    middleware = compression.CompressionMiddleware(
+                        lambda request: response,
+                    )
+                    response = middleware(request)
+                    self.assertEqual(response['Content-Encoding'], 'gzip')
+                    self.assertTrue(
+                        response.content[3] & compression.GZIP_FNAME,
+                    )
+                    self.assertEqual(
+                        gzip.decompress(response.content), content,
+                    )
+                    bodies.add(response.content)
+                self.assertEqual(len(bodies), 3)
+
+    def test_padded_stream(self):
+        """Потоковый ответ с секретом тоже получает шум в заголовке"""
+        chunks = [b'csrfmiddlewaretoken' * 50, b'b' * 1000]
+        middleware = compression.CompressionMiddleware(
+            lambda request: StreamingHttpResponse(
+                iter(chunks), content_type='text/plain', headers={
+                    'Vary': 'Cookie',
+                },
+            )
+        )
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        content = b''.join(middleware(request).streaming_content)
+        self.assertTrue(content[3] & compression.GZIP_FNAME)
+        self.assertEqual(gzip.decompress(content), b''.join(chunks))
+
+    def test_precompress_only_stored_pages(self):
+        """Заранее сжимаются только страницы, которые ляжут в кэш"""
+        def view(request):
+            response = HttpResponse(b'x' * 1000, content_type='text/html')
+            response['Cache-Control'] = cache_control
+            return response
+
+        cached_view = page_cache.cache_page_by_generation(
+            lambda request: ['compression-test'],
+        )(view)
+        for cache_control, stored in (('public', True), ('private', False)):
+            with self.subTest(cache_control=cache_control):
+                cache.clear()
+                with patch.object(
+                    compression, 'precompress',
+                    wraps=compression.precompress,
+                ) as precompress:
+                    response = cached_view(RequestFactory().get('/'))
+                self.assertEqual(precompress.called, stored)
+                self.assertEqual(
+                    hasattr(response, 'precompressed'), stored,
+                )
+
+
+class TestRunnerTests(SimpleTestCase):
+    def test_cache_is_scratch(self):
+        """Тесты не трогают рабочие кэш и метрики в cache/"""
+        for path in (
+            settings.CACHES['default']['LOCATION'], settings.METRICS_PATH,
+        ):
+            with self.subTest(path=path):
+                self.assertFalse(path.startswith(
+                    os.path.join(settings.BASE_DIR, 'cache'),
+                ))
+                self.assertTrue(path.startswith(tempfile.gettempdir()))
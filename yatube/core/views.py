@@ -1,4 +1,12 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from core import media, metrics
+
+# Заголовки, которые выставляют обратные прокси.
+PROXY_HEADERS = ('HTTP_X_FORWARDED_FOR', 'HTTP_X_REAL_IP', 'HTTP_FORWARDED')
 
 
 def page_not_found(request, exception):
@@ -15,3 +23,45 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def client_ip(request):
+    """
+    Адрес клиента или None, если его не узнать.
+
+    За прокси REMOTE_ADDR — адрес самого прокси, поэтому адрес клиента
+    берётся из METRICS_CLIENT_IP_HEADER: последнее значение в нём
+    дописал наш прокси, предыдущие мог подставить кто угодно. Если
+    заголовок не настроен, а запрос пришёл через прокси, адрес
+    неизвестен.
+    """
+    header = settings.METRICS_CLIENT_IP_HEADER
+    if header:
+        return request.META.get(header, '').split(',')[-1].strip() or None
+    if any(name in request.META for name in PROXY_HEADERS):
+        return None
+    return request.META.get('REMOTE_ADDR')
+
+
+def metrics_allowed(request):
+    """Токен METRICS_TOKEN, если он задан, иначе адрес из списка."""
+    if settings.METRICS_TOKEN:
+        scheme, _, token = request.headers.get(
+            'Authorization', '',
+        ).partition(' ')
+        return scheme.lower() == 'bearer' and constant_time_compare(
+            token.strip(), settings.METRICS_TOKEN,
+        )
+    return client_ip(request) in settings.METRICS_ALLOWED_IPS
+
+
+def export_metrics(request):
+    """Метрики всех процессов для Prometheus; только для metrics_allowed."""
+    if not metrics_allowed(request):
+        raise Http404
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def serve_media(request, path):
+    """Файл из MEDIA_ROOT: с Range, валидаторами и долгим кэшем копий."""
+    return media.serve(request, path)
@@ -0,0 +1,408 @@
+"""
+Потоковые выгрузка и загрузка записей, комментариев и подписок.
+
+Строки идут через цепочку генераторов: чтение файла, разбор, пачки по
+batch_size, вставка. В памяти одновременно лежит только одна пачка,
+сколько бы строк ни было в файле. Авторы и группы ссылаются по username
+и slug, записи — по id, который при загрузке сохраняется, чтобы
+комментарии из отдельного файла нашли свои записи. Строки с ошибками
+(нет автора, дата или id не разбираются) не прерывают загрузку, а
+считаются и пропускаются.
+
+bulk_create не отправляет сигналы, поэтому производные данные (счётчики,
+ленты подписок, поколения кэша страниц) обновляются здесь же. Счётчики
+сдвигаются на число действительно вставленных строк в той же
+транзакции, что и вставка; ленты читателей с новыми подписками
+пересобираются один раз в конце загрузки.
+"""
+import csv
+import json
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import page_cache
+from posts import counters, feed, page_scopes
+from posts.models import Comment, Follow, Group, Post, User
+
+FORMATS = ('jsonl', 'csv')
+# Сколько лент пересобирать одним запросом в конце загрузки подписок.
+FEED_REBUILD_USERS = 500
+
+# Поле выгрузки -> столбец values().
+EXPORT_FIELDS = {
+    'posts': (Post, {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+    }),
+    'comments': (Comment, {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follows': (Follow, {
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+KINDS = tuple(EXPORT_FIELDS)
+
+
+def export_rows(kind, chunk_size):
+    """Строки выгрузки; курсор базы читается кусками по chunk_size."""
+    model, fields = EXPORT_FIELDS[kind]
+    rows = model.objects.order_by('pk').values(*fields.values())
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield {name: row[lookup] for name, lookup in fields.items()}
+
+
+def _json_default(value):
+    # В отличие от DjangoJSONEncoder, даты выгружаются с микросекундами.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def write_jsonl(rows, stream):
+    for row in rows:
+        stream.write(
+            json.dumps(row, ensure_ascii=False, default=_json_default) + '\n'
+        )
+        yield row
+
+
+def write_csv(rows, stream, kind):
+    writer = csv.DictWriter(stream, fieldnames=list(EXPORT_FIELDS[kind][1]))
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            name: '' if value is None else value
+            for name, value in row.items()
+        })
+        yield row
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Битая строка отбрасывается при разборе, как и любая
+                # другая строка с ошибкой.
+                yield None
+
+
+def read_csv(stream):
+    # Пустые ячейки CSV — это отсутствующие значения, как null в JSONL.
+    for row in csv.DictReader(stream):
+        yield {name: value or None for name, value in row.items()}
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def _required(row, name):
+    value = row.get(name)
+    if not value or not isinstance(value, str):
+        raise InvalidRow(name)
+    return value
+
+
+def _optional(row, name):
+    value = row.get(name)
+    if value is not None and not isinstance(value, str):
+        raise InvalidRow(name)
+    return value or None
+
+
+def _id(row, name, required=False):
+    value = row.get(name)
+    if value is None and not required:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidRow(name)
+
+
+def _date(row, name):
+    """Дата из файла; без даты — текущее время."""
+    value = row.get(name)
+    if not value:
+        return timezone.now()
+    try:
+        parsed = parse_datetime(value)
+    except (TypeError, ValueError):
+        parsed = None
+    if parsed is None:
+        raise InvalidRow(name)
+    return parsed
+
+
+def clean_posts(row):
+    return {
+        'id': _id(row, 'id'),
+        'text': _optional(row, 'text') or '',
+        'pub_date': _date(row, 'pub_date'),
+        'author': _required(row, 'author'),
+        'group': _optional(row, 'group'),
+        'image': _optional(row, 'image') or '',
+    }
+
+
+def clean_comments(row):
+    return {
+        'id': _id(row, 'id'),
+        'post': _id(row, 'post', required=True),
+        'author': _required(row, 'author'),
+        'text': _optional(row, 'text') or '',
+        'created': _date(row, 'created'),
+    }
+
+
+def clean_follows(row):
+    return {
+        'user': _required(row, 'user'),
+        'author': _required(row, 'author'),
+    }
+
+
+CLEANERS = {
+    'posts': clean_posts,
+    'comments': clean_comments,
+    'follows': clean_follows,
+}
+
+
+class Importer:
+    """
+    Загрузка одной пачки строк.
+
+    Неизвестные авторы и группы создаются при create_missing, иначе
+    строка с ними пропускается. Уже существующие строки (тот же id или
+    та же подписка) пропускаются, поэтому прерванную загрузку можно
+    просто запустить снова. Строки с ошибками считаются в invalid.
+    """
+
+    def __init__(self, kind, create_missing=False):
+        self.kind = kind
+        self.create_missing = create_missing
+        self.scopes = set()
+        self.readers = set()
+        self.skipped = 0
+        self.invalid = 0
+
+    def load(self, batch):
+        """Вставляет пачку в одной транзакции, возвращает число строк."""
+        batch = self.clean(batch)
+        with transaction.atomic():
+            return getattr(self, f'load_{self.kind}')(batch)
+
+    def clean(self, batch):
+        """Проверяет и приводит строки, отбрасывая строки с ошибками."""
+        clean_row = CLEANERS[self.kind]
+        rows = []
+        for row in batch:
+            if not isinstance(row, dict):
+                self.invalid += 1
+                continue
+            try:
+                rows.append(clean_row(row))
+            except InvalidRow:
+                self.invalid += 1
+        return rows
+
+    def finish(self):
+        """
+        Пересобирает ленты новых подписчиков, сбрасывает кэш страниц и
+        счётчики последовательностей id.
+        """
+        readers = sorted(self.readers)
+        for start in range(0, len(readers), FEED_REBUILD_USERS):
+            feed.rebuild(readers[start:start + FEED_REBUILD_USERS])
+        page_cache.bump(*self.scopes)
+        model = EXPORT_FIELDS[self.kind][0]
+        statements = connection.ops.sequence_reset_sql(no_style(), [model])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def users(self, usernames):
+        return self._resolve(
+            User, 'username', usernames,
+            lambda name: User(username=name, password=make_password(None)),
+        )
+
+    def groups(self, slugs):
+        return self._resolve(
+            Group, 'slug', slugs,
+            lambda slug: Group(title=slug, slug=slug, description=''),
+        )
+
+    def _resolve(self, model, field, values, build):
+        values = set(values) - {None}
+        found = dict(
+            model.objects.filter(**{f'{field}__in': values}).values_list(
+                field, 'pk'
+            )
+        )
+        missing = values - set(found)
+        if missing and self.create_missing:
+            model.objects.bulk_create(
+                [build(value) for value in missing], ignore_conflicts=True,
+            )
+            found.update(
+                model.objects.filter(
+                    **{f'{field}__in': missing}
+                ).values_list(field, 'pk')
+            )
+        return found
+
+    def insert(self, model, objects):
+        """
+        Вставляет строки и возвращает те, что действительно добавились.
+
+        Строки с id, который уже есть в базе или встретился раньше в
+        пачке, пропускаются. Строкам без id база выдаёт новые: для них
+        пропуск конфликтов не нужен, а без него bulk_create узнаёт
+        выданные id.
+        """
+        existing = set(model.objects.filter(
+            pk__in={obj.pk for obj in objects if obj.pk is not None},
+        ).values_list('pk', flat=True))
+        fresh = []
+        for obj in objects:
+            if obj.pk is not None:
+                if obj.pk in existing:
+                    continue
+                existing.add(obj.pk)
+            fresh.append(obj)
+        self.skipped += len(objects) - len(fresh)
+        model.objects.bulk_create(
+            [obj for obj in fresh if obj.pk is not None],
+            ignore_conflicts=True,
+        )
+        model.objects.bulk_create([obj for obj in fresh if obj.pk is None])
+        return fresh
+
+    def load_posts(self, batch):
+        authors = self.users(row['author'] for row in batch)
+        groups = self.groups(row['group'] for row in batch)
+        posts = []
+        for row in batch:
+            group = row['group']
+            if row['author'] not in authors or (group and group not in groups):
+                self.skipped += 1
+                continue
+            posts.append(Post(
+                id=row['id'],
+                text=row['text'],
+                pub_date=row['pub_date'],
+                author_id=authors[row['author']],
+                group_id=groups.get(group),
+                image=row['image'],
+            ))
+        posts = self.insert(Post, posts)
+        for author_id, count in Counter(
+            post.author_id for post in posts
+        ).items():
+            counters.change_user_counter(author_id, 'posts_count', count)
+        counters.forget_post_totals({post.group_id for post in posts})
+        feed.fan_out_many(posts)
+        self.scopes.add(page_scopes.INDEX_SCOPE)
+        self.scopes.update(page_scopes.author_scope(name) for name in authors)
+        self.scopes.update(page_scopes.group_scope(slug) for slug in groups)
+        return len(posts)
+
+    def load_comments(self, batch):
+        authors = self.users(row['author'] for row in batch)
+        post_ids = set(Post.objects.filter(
+            pk__in={row['post'] for row in batch}
+        ).values_list('pk', flat=True))
+        comments = []
+        for row in batch:
+            post_id = row['post']
+            if row['author'] not in authors or post_id not in post_ids:
+                self.skipped += 1
+                continue
+            comments.append(Comment(
+                id=row['id'],
+                post_id=post_id,
+                author_id=authors[row['author']],
+                text=row['text'],
+                created=row['created'],
+            ))
+        comments = self.insert(Comment, comments)
+        for post_id, count in Counter(
+            comment.post_id for comment in comments
+        ).items():
+            counters.change_comments_count(post_id, count)
+        page_cache.bump_on_commit(
+            *(page_scopes.post_scope(pk) for pk in post_ids)
+        )
+        self.scopes.add(page_scopes.comments_scope(page_scopes.INDEX_SCOPE))
+        for username, slug in Post.objects.filter(
+            pk__in=post_ids,
+        ).values_list('author__username', 'group__slug').distinct():
+            self.scopes.add(page_scopes.comments_scope(
+                page_scopes.author_scope(username),
+            ))
+            if slug is not None:
+                self.scopes.add(page_scopes.comments_scope(
+                    page_scopes.group_scope(slug),
+                ))
+        return len(comments)
+
+    def load_follows(self, batch):
+        users = self.users(
+            name for row in batch for name in (row['user'], row['author'])
+        )
+        follows = []
+        for row in batch:
+            user, author = users.get(row['user']), users.get(row['author'])
+            if user is None or author is None or user == author:
+                self.skipped += 1
+                continue
+            follows.append(Follow(user_id=user, author_id=author))
+        pairs = {(follow.user_id, follow.author_id) for follow in follows}
+        existing = set(Follow.objects.filter(
+            user__in={user for user, _ in pairs},
+            author__in={author for _, author in pairs},
+        ).values_list('user', 'author'))
+        fresh = []
+        for follow in follows:
+            pair = (follow.user_id, follow.author_id)
+            if pair in existing:
+                continue
+            existing.add(pair)
+            fresh.append(follow)
+        self.skipped += len(follows) - len(fresh)
+        Follow.objects.bulk_create(fresh, ignore_conflicts=True)
+        deltas = defaultdict(Counter)
+        for follow in fresh:
+            deltas[follow.author_id]['followers_count'] += 1
+            deltas[follow.user_id]['following_count'] += 1
+        for user_id, changes in deltas.items():
+            counters.change_user_counters(user_id, changes)
+        self.readers.update(follow.user_id for follow in fresh)
+        self.scopes.update(page_scopes.author_scope(name) for name in users)
+        return len(fresh)
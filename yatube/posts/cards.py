@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.template.loader import render_to_string
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def card_key(post_id, version):
+    return f'post_card:{post_id}:{version}'
+
+
+def render_cards(posts):
+    """
+    Отрисованные карточки записей в том же порядке.
+
+    Все карточки страницы берутся из кэша одним get_many; недостающие
+    рисуются и складываются обратно одним set_many. Версия записи входит
+    в ключ, поэтому после изменения старая карточка просто не находится.
+    """
+    keys = [card_key(post.pk, post.card_version) for post in posts]
+    cached = cache.get_many(keys)
+    missing = {}
+    cards = []
+    for key, post in zip(keys, posts):
+        card = cached.get(key)
+        if card is None:
+            card = render_to_string(CARD_TEMPLATE, {'post': post})
+            missing[key] = card
+        cards.append(card)
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIME)
+    return cards
+
+
+def bump_versions(posts):
+    """Делает недействительными карточки записей из queryset."""
+    posts.update(card_version=F('card_version') + 1)
+
+
+def forget(post):
+    cache.delete(card_key(post.pk, post.card_version))
@@ -0,0 +1,186 @@
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from core.paginator import change_counts, forget_counts
+from posts.models import Comment, Follow, Post, User, UserStats
+
+# Области, в которых число записей для пагинатора хранится в кэше.
+# У автора и ленты свои счётчики в UserStats.
+INDEX_TOTAL = 'posts'
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _count(model, field):
+    """Подзапрос с количеством строк model, ссылающихся на внешний объект."""
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+        field
+    ).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows), 0)
+
+
+def _real_counts(user_id):
+    return {
+        name: model.objects.filter(**{field: user_id}).count()
+        for name, (model, field) in USER_COUNTERS.items()
+    }
+
+
+def get_stats(user):
+    """
+    Счётчики пользователя; при первом обращении считаются честно.
+
+    Если счётчики уже выбраны через select_related('stats'), повторного
+    запроса не будет.
+    """
+    if User.stats.related.is_cached(user):
+        stats = getattr(user, 'stats', None)
+    else:
+        stats = UserStats.objects.filter(user=user).first()
+    if stats is not None:
+        return stats
+    try:
+        with transaction.atomic():
+            return UserStats.objects.create(
+                user_id=user.pk, **_real_counts(user.pk)
+            )
+    except IntegrityError:
+        return UserStats.objects.get(user=user)
+
+
+async def aget_stats(user):
+    """get_stats для асинхронных представлений."""
+    if User.stats.related.is_cached(user):
+        stats = getattr(user, 'stats', None)
+    else:
+        stats = await UserStats.objects.filter(user=user).afirst()
+    if stats is not None:
+        return stats
+    # Первый подсчёт идёт в транзакции, а у асинхронного ORM их нет.
+    return await sync_to_async(get_stats)(user)
+
+
+def group_total(group_id):
+    return f'group:{group_id}'
+
+
+def _group_totals(group_ids):
+    return [group_total(pk) for pk in group_ids if pk is not None]
+
+
+def change_post_totals(group_ids, delta):
+    """Сдвигает число записей на главной и в группах."""
+    change_counts([INDEX_TOTAL, *_group_totals(group_ids)], delta)
+
+
+def move_post_total(old_group_id, new_group_id):
+    """Запись перенесли в другую группу: на главной число то же."""
+    change_counts(_group_totals([old_group_id]), -1)
+    change_counts(_group_totals([new_group_id]), 1)
+
+
+def forget_post_totals(group_ids):
+    forget_counts([INDEX_TOTAL, *_group_totals(group_ids)])
+
+
+def _feed_total():
+    return Coalesce(Sum('author__stats__posts_count'), 0)
+
+
+def feed_total(user):
+    """
+    Число записей в ленте — сумма счётчиков записей её авторов.
+
+    В ленте лежат все записи авторов, на которых подписан пользователь,
+    поэтому строки ленты считать не нужно: хватает подписок и UserStats.
+    """
+    return Follow.objects.filter(user=user).aggregate(
+        total=_feed_total(),
+    )['total']
+
+
+async def afeed_total(user):
+    totals = await Follow.objects.filter(user=user).aaggregate(
+        total=_feed_total(),
+    )
+    return totals['total']
+
+
+def change_user_counter(user_id, name, delta):
+    """
+    Сдвигает счётчик пользователя на delta одним UPDATE с F().
+
+    Если строки счётчиков ещё нет, при увеличении она создаётся по
+    реальным данным, в которые уже входит только что записанный объект.
+    При уменьшении отсутствующая строка не создаётся: так каскадное
+    удаление пользователя не пытается завести ему новые счётчики.
+    """
+    change_user_counters(user_id, {name: delta})
+
+
+def change_user_counters(user_id, deltas):
+    """
+    change_user_counter для нескольких счётчиков сразу.
+
+    Сдвигать их по одному нельзя: строка, созданная по реальным данным
+    ради первого счётчика, уже учитывает и остальные изменения.
+    """
+    with transaction.atomic():
+        updated = UserStats.objects.filter(user_id=user_id).update(**{
+            name: Greatest(F(name) + delta, 0)
+            for name, delta in deltas.items()
+        })
+        if not updated and any(delta > 0 for delta in deltas.values()):
+            UserStats.objects.get_or_create(
+                user_id=user_id, defaults=_real_counts(user_id),
+            )
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0)
+    )
+
+
+def recount_users(user_ids):
+    """Пересчитывает счётчики пользователей, возвращает число исправленных."""
+    actual = User.objects.filter(pk__in=user_ids).annotate(
+        **{
+            f'real_{name}': _count(model, field)
+            for name, (model, field) in USER_COUNTERS.items()
+        }
+    )
+    stored = UserStats.objects.in_bulk(user_ids)
+    repaired = []
+    for user in actual:
+        counts = {
+            name: getattr(user, f'real_{name}') for name in USER_COUNTERS
+        }
+        stats = stored.get(user.pk)
+        if stats is not None and all(
+            getattr(stats, name) == value for name, value in counts.items()
+        ):
+            continue
+        repaired.append(UserStats(user_id=user.pk, **counts))
+    UserStats.objects.bulk_create(
+        repaired,
+        update_conflicts=True,
+        unique_fields=('user',),
+        update_fields=tuple(USER_COUNTERS),
+    )
+    return len(repaired)
+
+
+def recount_posts(post_ids):
+    """Пересчитывает comments_count записей, возвращает число исправленных."""
+    return Post.objects.filter(pk__in=post_ids).annotate(
+        real_comments_count=_count(Comment, 'post'),
+    ).exclude(comments_count=F('real_comments_count')).update(
+        comments_count=_count(Comment, 'post'),
+    )
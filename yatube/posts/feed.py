@@ -0,0 +1,104 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from posts.models import FeedItem, Follow, Post
+
+FEED_ORDERING = ('-feed_date', '-feed_post')
+
+
+def feed_for(user):
+    """
+    Записи из материализованной ленты пользователя.
+
+    Сортировка идёт по полям самой ленты, поэтому страница читается
+    диапазоном индекса feed_user_pub_date_idx без сортировки в памяти.
+    """
+    return Post.objects.for_listing().filter(
+        feed_entries__user=user
+    ).annotate(
+        feed_date=F('feed_entries__pub_date'),
+        feed_post=F('feed_entries__post'),
+    ).order_by(*FEED_ORDERING)
+
+
+def fan_out(post):
+    """Раскладывает новую запись по лентам подписчиков автора."""
+    readers = Follow.objects.filter(author=post.author_id).values_list(
+        'user', flat=True
+    )
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=reader, post=post, pub_date=post.pub_date)
+            for reader in readers.iterator()
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_many(posts):
+    """fan_out для пачки записей: подписчики всех авторов одним запросом."""
+    readers = defaultdict(list)
+    follows = Follow.objects.filter(
+        author__in={post.author_id for post in posts}
+    ).values_list('author', 'user')
+    for author_id, user_id in follows.iterator():
+        readers[author_id].append(user_id)
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=reader, post=post, pub_date=post.pub_date)
+            for post in posts
+            for reader in readers[post.author_id]
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя уже опубликованные записи автора."""
+    posts = Post.objects.filter(author=author_id).values_list(
+        'id', 'pub_date'
+    )
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts.iterator()
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def purge(user_id, author_id):
+    """Убирает из ленты пользователя записи автора."""
+    FeedItem.objects.filter(user=user_id, post__author=author_id).delete()
+
+
+def rebuild(user_ids, batch_size=settings.FEED_BATCH_SIZE):
+    """
+    Пересобирает ленты указанных пользователей с нуля.
+
+    Возвращает количество записанных элементов ленты.
+    """
+    rows = Post.objects.filter(
+        author__following__user__in=user_ids
+    ).values_list('author__following__user', 'id', 'pub_date')
+    created = 0
+    with transaction.atomic():
+        FeedItem.objects.filter(user__in=user_ids).delete()
+        batch = []
+        for user_id, post_id, pub_date in rows.iterator(
+            chunk_size=batch_size
+        ):
+            batch.append(
+                FeedItem(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            )
+            if len(batch) >= batch_size:
+                created += len(FeedItem.objects.bulk_create(batch))
+                batch = []
+        created += len(FeedItem.objects.bulk_create(batch))
+    return created
@@ -1,5 +1,6 @@
 from django import forms
 
+from posts.images import PostImageField
 from posts.models import Comment, Post
 
 
@@ -7,6 +8,7 @@ class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
+        field_classes = {'image': PostImageField}
 
 
 class CommentForm(forms.ModelForm):
@@ -0,0 +1,144 @@
+"""
+Приём картинок записей.
+
+Загруженная картинка читается кусками с проверкой размера, затем
+проверяется число пикселей, исправляется ориентация по EXIF и слишком
+большие снимки уменьшаются до мастер-копии. Уже при сохранении записи
+рядом с мастер-копией складываются уменьшенные копии в WebP и JPEG,
+а размеры картинки записываются в модель, чтобы шаблонам не пришлось
+открывать файл.
+"""
+import os
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Поворот, который предписывает тег EXIF Orientation.
+ORIENTATION_TAG = 0x0112
+RENDITION_FORMATS = (
+    ('WEBP', 'webp', 'image/webp'),
+    ('JPEG', 'jpg', 'image/jpeg'),
+)
+RENDITION_QUALITY = 80
+MASTER_QUALITY = 85
+
+
+def read_limited(upload, limit):
+    """Читает файл кусками и бросает ошибку, как только он превысил limit."""
+    buffer = BytesIO()
+    for chunk in upload.chunks():
+        buffer.write(chunk)
+        if buffer.tell() > limit:
+            raise ValidationError(
+                'Картинка больше %(limit)s.',
+                code='file_too_large',
+                params={'limit': filesizeformat(limit)},
+            )
+    upload.seek(0)
+    buffer.seek(0)
+    return buffer
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def normalize(upload, data):
+    """
+    Мастер-копия загруженной картинки; data — её уже прочитанное содержимое.
+
+    Картинка, которая уже в пределах POST_IMAGE_MASTER_SIDE и не требует
+    поворота, остаётся как есть. Остальные поворачиваются, уменьшаются и
+    пересохраняются в JPEG (или PNG, если есть прозрачность).
+    """
+    with Image.open(data) as image:
+        # Размеры известны из заголовка: проверяем их до декодирования.
+        if image.width * image.height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка больше %(limit)s мегапикселей.',
+                code='too_many_pixels',
+                params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+            )
+        side = settings.POST_IMAGE_MASTER_SIDE
+        rotated = image.getexif().get(ORIENTATION_TAG, 1) != 1
+        if not rotated and max(image.size) <= side:
+            upload.seek(0)
+            return upload
+        master = ImageOps.exif_transpose(image)
+        master.thumbnail((side, side), Image.LANCZOS)
+        buffer = BytesIO()
+        if has_alpha(master):
+            master.save(buffer, 'PNG', optimize=True)
+            extension, content_type = 'png', 'image/png'
+        else:
+            master.convert('RGB').save(
+                buffer, 'JPEG', quality=MASTER_QUALITY, optimize=True,
+            )
+            extension, content_type = 'jpg', 'image/jpeg'
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        f'{stem}.{extension}', buffer.getvalue(), content_type,
+    )
+
+
+class PostImageField(forms.ImageField):
+    """Поле картинки, которое отдаёт форме уже нормализованный файл."""
+
+    def to_python(self, data):
+        if data in self.empty_values:
+            return None
+        # Проверка размера идёт до того, как ImageField прочитает весь
+        # файл в память для проверки формата.
+        content = read_limited(data, settings.POST_IMAGE_MAX_BYTES)
+        return normalize(super().to_python(data), content)
+
+
+def describe(field_file):
+    """
+    Размеры сохранённой картинки и её уменьшенные копии.
+
+    Возвращает (ширина, высота, копии), где копии — список словарей
+    с шириной, высотой, MIME-типом и именем файла в хранилище. Копии
+    делаются только для ширин из POST_IMAGE_WIDTHS меньше исходной.
+    """
+    storage = field_file.storage
+    stem = os.path.splitext(field_file.name)[0]
+    field_file.open('rb')
+    try:
+        with Image.open(field_file) as image:
+            image = ImageOps.exif_transpose(image)
+            width, height = image.size
+            targets = [
+                target for target in sorted(settings.POST_IMAGE_WIDTHS)
+                if target < width
+            ]
+            source = image.convert('RGB') if targets else None
+    finally:
+        field_file.close()
+
+    renditions = []
+    for target in targets:
+        size = (target, max(round(height * target / width), 1))
+        resized = source.resize(size, Image.LANCZOS)
+        for image_format, extension, content_type in RENDITION_FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, image_format, quality=RENDITION_QUALITY)
+            name = storage.save(
+                f'{stem}-{target}w.{extension}',
+                ContentFile(buffer.getvalue()),
+            )
+            renditions.append({
+                'width': size[0],
+                'height': size[1],
+                'type': content_type,
+                'name': name,
+            })
+    return width, height, renditions
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает записи, комментарии или подписки в JSONL или CSV '
+        'потоком, не загружая таблицу в память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', choices=bulk.KINDS, default='posts',
+            help='Что выгружать.',
+        )
+        parser.add_argument(
+            '--format', choices=bulk.FORMATS, default=None,
+            help='Формат файла. По умолчанию по расширению или JSONL.',
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для выгрузки; «-» — стандартный вывод.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз.',
+        )
+
+    def handle(self, *args, **options):
+        kind = options['model']
+        path = options['output']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        stream = (
+            self.stdout if path == '-'
+            else open(path, 'w', encoding='utf-8', newline='')
+        )
+        # Отчёт идёт в stderr: stdout может быть занят самой выгрузкой.
+        report = self.stderr if path == '-' else self.stdout
+        rows = bulk.export_rows(kind, options['chunk_size'])
+        if file_format == 'csv':
+            rows = bulk.write_csv(rows, stream, kind)
+        else:
+            rows = bulk.write_jsonl(rows, stream)
+
+        started = time.monotonic()
+        count = 0
+        try:
+            for count, _ in enumerate(rows, start=1):
+                if count % 100000 == 0:
+                    report.write(f'Выгружено строк: {count}')
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+        elapsed = time.monotonic() - started
+        report.write(self.style.SUCCESS(
+            f'Готово: {count} строк за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
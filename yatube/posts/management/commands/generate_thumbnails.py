@@ -0,0 +1,58 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Дописывает старым записям размеры картинок и уменьшенные копии '
+        'в несколько потоков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help=(
+                'Сколько картинок готовить одновременно; при 1 всё '
+                'делается в текущем потоке.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        post_ids = list(
+            Post.objects.exclude(image='').filter(
+                image_width__isnull=True,
+            ).order_by('pk').values_list(
+                'pk', flat=True
+            )
+        )
+        started = time.monotonic()
+        workers = options['workers']
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                created = self.report(
+                    pool.map(thumbnails.run_task, post_ids), len(post_ids),
+                )
+        else:
+            created = self.report(
+                map(thumbnails.generate_by_id, post_ids), len(post_ids),
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: картинки подготовлены для {created} записей из '
+            f'{len(post_ids)} за {time.monotonic() - started:.1f} с'
+        ))
+
+    def report(self, results, total):
+        created = 0
+        for done, result in enumerate(results, start=1):
+            created += result
+            if done % 100 == 0:
+                self.stdout.write(f'Проверено записей: {done} из {total}')
+        return created
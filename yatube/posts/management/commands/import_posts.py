@@ -0,0 +1,71 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает записи, комментарии или подписки из JSONL или CSV '
+        'пачками через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для загрузки; «-» — стандартный ввод.',
+        )
+        parser.add_argument(
+            '--model', choices=bulk.KINDS, default='posts',
+            help='Что загружать.',
+        )
+        parser.add_argument(
+            '--format', choices=bulk.FORMATS, default=None,
+            help='Формат файла. По умолчанию по расширению или JSONL.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк вставлять одной транзакцией.',
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help=(
+                'Создавать неизвестных авторов и группы вместо пропуска '
+                'строк с ними.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        stream = (
+            sys.stdin if path == '-'
+            else open(path, encoding='utf-8', newline='')
+        )
+        read = bulk.read_csv if file_format == 'csv' else bulk.read_jsonl
+        importer = bulk.Importer(options['model'], options['create_missing'])
+
+        started = time.monotonic()
+        loaded = 0
+        try:
+            for batch in bulk.batched(read(stream), options['batch_size']):
+                loaded += importer.load(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Загружено строк: {loaded} '
+                    f'({loaded / max(elapsed, 1e-9):.0f} строк/с)'
+                )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        importer.finish()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: загружено {loaded}, пропущено {importer.skipped}, '
+            f'с ошибками {importer.invalid} за {elapsed:.1f} с '
+            f'({loaded / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
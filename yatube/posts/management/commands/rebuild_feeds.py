@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames',
+            nargs='*',
+            help='Чьи ленты пересобрать. По умолчанию всех пользователей.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.FEED_BATCH_SIZE,
+            help='Сколько пользователей и записей ленты писать за раз.',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        batch_size = options['batch_size']
+        user_ids = list(users.values_list('pk', flat=True))
+
+        started = time.monotonic()
+        created = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            created += feed.rebuild(batch, batch_size=batch_size)
+            self.stdout.write(
+                f'Пересобрано лент: {start + len(batch)} из {len(user_ids)}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {created} записей в лентах '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
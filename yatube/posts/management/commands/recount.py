@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import counters
+from posts.models import Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики записей, комментариев '
+        'и подписок и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк пересчитывать за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        users = self.run_batches(
+            User.objects.order_by('pk'), counters.recount_users, batch_size,
+        )
+        posts = self.run_batches(
+            Post.objects.order_by('pk'), counters.recount_posts, batch_size,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: пользователей {users}, записей {posts} '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
+
+    def run_batches(self, queryset, recount, batch_size):
+        """Проходит таблицу пачками по первичному ключу."""
+        repaired = 0
+        last_pk = None
+        while True:
+            batch = queryset
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            pks = list(batch.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return repaired
+            repaired += recount(pks)
+            last_pk = pks[-1]
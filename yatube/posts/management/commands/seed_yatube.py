@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.seed import Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, записями, '
+        'комментариями, подписками и картинками для нагрузочных замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--follows', type=int, default=20000,
+            help='Сколько подписок сгенерировать; повторы отбрасываются.',
+        )
+        parser.add_argument(
+            '--images', type=int, default=20,
+            help='Сколько записей получат картинку.',
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.2,
+            help=(
+                'Показатель степенного закона популярности авторов: чем '
+                'больше, тем сильнее подписки и записи сосредоточены у '
+                'немногих.'
+            ),
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до сегодняшнего раскидать даты записей.',
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имён пользователей и адресов групп.',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='Зерно генератора для воспроизводимых данных.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        seeder = Seeder(
+            options['users'],
+            options['groups'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+            exponent=options['exponent'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+        )
+        started = time.monotonic()
+        steps = (
+            ('пользователей', seeder.create_users),
+            ('групп', seeder.create_groups),
+            ('записей', lambda: seeder.load(
+                'posts', seeder.post_rows(options['posts'], options['images']),
+            )),
+            ('комментариев', lambda: seeder.load(
+                'comments', seeder.comment_rows(options['comments']),
+            )),
+            ('подписок', lambda: seeder.load(
+                'follows', seeder.follow_rows(options['follows']),
+            )),
+            ('картинок', seeder.describe_images),
+        )
+        for name, step in steps:
+            step_started = time.monotonic()
+            count = step()
+            self.stdout.write(
+                f'Создано {name}: {count} '
+                f'за {time.monotonic() - step_started:.1f} с'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с'
+        ))
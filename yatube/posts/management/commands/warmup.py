@@ -0,0 +1,244 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.template.loader import get_template
+from django.urls import reverse
+
+from posts import thumbnails
+from posts.models import Group, Post, User
+
+
+class Part:
+    """Одна часть прогрева: что сделано, что нет и сколько это заняло."""
+
+    def __init__(self, name):
+        self.name = name
+        self.done = []
+        self.failed = []
+        self.skipped = 0
+        self.started = self.finished = None
+        self._lock = threading.Lock()
+
+    def run(self, deadline, function, item):
+        """Выполняет function(item), если бюджет времени не исчерпан."""
+        if time.monotonic() > deadline:
+            with self._lock:
+                self.skipped += 1
+            return
+        started = time.monotonic()
+        try:
+            result = function(item)
+        except Exception as error:
+            outcome = self.failed, (item, f'{type(error).__name__}: {error}')
+        else:
+            outcome = self.done, (item, result)
+        finally:
+            connections.close_all()
+        finished = time.monotonic()
+        with self._lock:
+            outcome[0].append(outcome[1])
+            if self.started is None or started < self.started:
+                self.started = started
+            if self.finished is None or finished > self.finished:
+                self.finished = finished
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return self.finished - self.started
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает кэши после выкладки: компилирует шаблоны, готовит '
+        'картинки записей и рисует первые страницы главной, самых больших '
+        'групп и авторов, укладываясь в бюджет времени.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=3,
+            help='Сколько первых страниц каждой ленты нарисовать.',
+        )
+        parser.add_argument(
+            '--groups',
+            type=int,
+            default=10,
+            help='Сколько групп с наибольшим числом записей прогреть.',
+        )
+        parser.add_argument(
+            '--profiles',
+            type=int,
+            default=20,
+            help='Сколько авторов с наибольшим числом записей прогреть.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Сколько задач выполнять одновременно.',
+        )
+        parser.add_argument(
+            '--budget',
+            type=float,
+            default=60,
+            help=(
+                'Бюджет времени в секундах: задачи, до которых не дошла '
+                'очередь, пропускаются.'
+            ),
+        )
+        parser.add_argument(
+            '--base-url',
+            default=f'http://{settings.ALLOWED_HOSTS[0]}',
+            help=(
+                'Адрес сайта, как его видят посетители: схема и хост '
+                'входят в ключ кэша страниц.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        base_url = urlsplit(options['base_url'])
+        if base_url.scheme not in ('http', 'https') or not base_url.netloc:
+            raise CommandError(f'Неверный адрес сайта: {base_url.geturl()}')
+        self.scheme, self.host = base_url.scheme, base_url.netloc
+        self.hostname = base_url.hostname
+        self.handler = WSGIHandler()
+
+        started = time.monotonic()
+        deadline = started + options['budget']
+        paths, post_ids = self.listings(
+            options['pages'], options['groups'], options['profiles'],
+        )
+        parts = {
+            'templates': Part('Шаблоны'),
+            'thumbnails': Part('Картинки'),
+            'pages': Part('Страницы'),
+        }
+        workers = options['workers']
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Как и в generate_thumbnails, при одном потоке всё делается
+            # в текущем.
+            execute = pool.map if workers > 1 else map
+
+            def run(tasks):
+                list(execute(
+                    lambda task: task[0].run(deadline, *task[1:]), tasks,
+                ))
+
+            # Подготовленная картинка сбрасывает кэш страниц с записью,
+            # поэтому страницы рисуются, только когда картинки готовы.
+            run([
+                *((parts['templates'], get_template, name)
+                  for name in self.template_names()),
+                *((parts['thumbnails'], thumbnails.generate_by_id, post_id)
+                  for post_id in post_ids),
+            ])
+            run([(parts['pages'], self.get, path) for path in paths])
+
+        for part in parts.values():
+            self.report(part, options['verbosity'])
+        created = sum(result for _, result in parts['thumbnails'].done)
+        self.stdout.write(f'Подготовлено картинок: {created}')
+        message = f'Прогрев занял {time.monotonic() - started:.1f} с'
+        if any(part.failed or part.skipped for part in parts.values()):
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def template_names(self):
+        """Имена всех шаблонов из каталогов templates движков Django."""
+        names = set()
+        for engine in engines.all():
+            if not isinstance(engine, DjangoTemplates):
+                continue
+            for directory in engine.template_dirs:
+                for root, _, files in os.walk(directory):
+                    names.update(
+                        os.path.relpath(
+                            os.path.join(root, name), directory,
+                        ).replace(os.sep, '/')
+                        for name in files
+                    )
+        return sorted(names)
+
+    def listings(self, pages, groups, profiles):
+        """Адреса первых страниц лент и записи с неготовыми картинками."""
+        per_page = settings.POSTS_ON_PAGE
+        feeds = [(reverse('posts:index'), Post.objects.all())]
+        top_groups = Group.objects.annotate(
+            size=Count('posts'),
+        ).filter(size__gt=0).order_by('-size', 'pk')[:groups]
+        feeds.extend(
+            (reverse('posts:group_list', kwargs={'slug': group.slug}),
+             group.posts.all())
+            for group in top_groups
+        )
+        top_authors = User.objects.filter(
+            stats__posts_count__gt=0,
+        ).order_by('-stats__posts_count', 'pk')[:profiles]
+        feeds.extend(
+            (reverse('posts:profile', kwargs={'username': author.username}),
+             author.posts.all())
+            for author in top_authors
+        )
+
+        paths = []
+        post_ids = set()
+        for path, queryset in feeds:
+            posts = list(queryset.values_list('pk', 'image', 'image_width')[
+                :pages * per_page
+            ])
+            post_ids.update(
+                pk for pk, image, width in posts if image and width is None
+            )
+            paths.append(path)
+            paths.extend(
+                f'{path}?page={number}'
+                for number in range(2, ceil(len(posts) / per_page) + 1)
+            )
+        return paths, sorted(post_ids)
+
+    def get(self, path):
+        """Запрашивает страницу через всю цепочку промежуточных слоёв."""
+        path, _, query = path.partition('?')
+        environ = {}
+        setup_testing_defaults(environ)
+        environ.update({
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'HTTP_HOST': self.host,
+            'SERVER_NAME': self.hostname,
+            'wsgi.url_scheme': self.scheme,
+        })
+        response = self.handler(environ, lambda status, headers: None)
+        try:
+            if response.status_code != 200:
+                raise ValueError(f'ответ {response.status_code}')
+        finally:
+            response.close()
+
+    def report(self, part, verbosity):
+        self.stdout.write(
+            f'{part.name}: {len(part.done)}, ошибок {len(part.failed)}, '
+            f'пропущено {part.skipped} за {part.elapsed:.1f} с'
+        )
+        if verbosity > 1:
+            for item, _ in part.done:
+                self.stdout.write(f'  {item}')
+        for item, error in part.failed:
+            self.stderr.write(f'  {item}: {error}')
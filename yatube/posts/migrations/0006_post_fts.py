@@ -0,0 +1,31 @@
+from django.db import migrations
+
+from posts import search
+
+
+def create_index(apps, schema_editor):
+    if not search.fts_available(schema_editor.connection):
+        return
+    schema_editor.execute(search.CREATE_TABLE)
+    with schema_editor.connection.cursor() as cursor:
+        search.install_triggers(cursor)
+    schema_editor.execute(search.REBUILD)
+
+
+def drop_index(apps, schema_editor):
+    if not search.fts_available(schema_editor.connection):
+        return
+    with schema_editor.connection.cursor() as cursor:
+        search.drop_triggers(cursor)
+    schema_editor.execute(search.DROP_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='card_version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Растёт при изменении записи, её группы или автора и входит в ключ кэша отрисованной карточки', verbose_name='Версия карточки'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    """
+    auto_now_add заменён на default: загрузка из файла передаёт свои даты
+    прямо в bulk_create. Значения по умолчанию Django в базе не хранит,
+    поэтому меняется только состояние моделей, и SQLite не пересоздаёт
+    таблицы записей и комментариев.
+    """
+
+    dependencies = [
+        ('posts', '0008_post_image_renditions'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='comment',
+                name='created',
+                field=models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='Указывает на время создания комментария. Автоматически проставляется текущее время, если не указана другая дата', verbose_name='Дата создания комментария'),
+            ),
+            migrations.AlterField(
+                model_name='post',
+                name='pub_date',
+                field=models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='Указывает на время создания записи. Автоматически проставляется текущее время, если не указана другая дата', verbose_name='Дата создания записи'),
+            ),
+        ]),
+    ]
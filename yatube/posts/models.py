@@ -1,6 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.db.models import CheckConstraint, F, Q, UniqueConstraint
+from django.utils import timezone
+
+from posts import images
 
 User = get_user_model()
 
@@ -35,13 +38,24 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Записи для лент: автор и группа выбираются одним запросом."""
+        return self.select_related('author', 'group')
+
+    def for_detail(self):
+        """Запись для отдельной страницы вместе со счётчиками автора."""
+        return self.select_related('author', 'author__stats', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст записи',
         help_text='Напиши о чем угодно, но не обижай других пользователей',
     )
     pub_date = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         verbose_name='Дата создания записи',
         help_text=(
             'Указывает на время создания записи. Автоматически '
@@ -76,13 +90,117 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True,
     )
+    # Не width_field/height_field: ImageField заполняет их, открывая файл
+    # при загрузке каждой записи, у которой размеры ещё не записаны.
+    image_width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Ширина картинки',
+    )
+    image_height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Высота картинки',
+    )
+    image_renditions = models.JSONField(
+        default=list,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии картинки',
+        help_text='Ширина, высота, MIME-тип и имя файла каждой копии.',
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+        help_text='Обновляется при добавлении и удалении комментариев.',
+    )
+    card_version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name='Версия карточки',
+        help_text=(
+            'Растёт при изменении записи, её группы или автора и входит '
+            'в ключ кэша отрисованной карточки'
+        ),
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Группа на момент загрузки: при переносе записи нужно сбросить
+        # кэш страниц и старой, и новой группы.
+        instance.loaded_group_id = instance.__dict__.get('group_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        bump = not self._state.adding
+        if bump:
+            # Версию сдвигает сама база: копия записи в памяти могла
+            # устареть, пока cards.bump_versions менял группу или автора.
+            self.card_version = F('card_version') + 1
+            if update_fields is not None:
+                update_fields = {*update_fields, 'card_version'}
+        if update_fields is None or 'image' in update_fields:
+            self.store_image()
+            if update_fields is not None:
+                update_fields |= set(IMAGE_FIELDS)
+        if update_fields is not None:
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        if bump:
+            self.refresh_from_db(fields=['card_version'])
+
+    def store_image(self):
+        """
+        Сохраняет новую картинку и записывает её размеры и копии.
+
+        Файл сохраняется здесь, а не в pre_save поля, потому что копии
+        строятся уже по сохранённому файлу.
+        """
+        if not self.image:
+            self.image_width = self.image_height = None
+            self.image_renditions = []
+        elif not self.image._committed:
+            self.image.save(self.image.name, self.image.file, save=False)
+            (
+                self.image_width, self.image_height, self.image_renditions,
+            ) = images.describe(self.image)
+
+
+IMAGE_FIELDS = ('image_width', 'image_height', 'image_renditions')
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Комментарии вместе с авторами."""
+        return self.select_related('author')
+
 
 class Comment(models.Model):
     text = models.TextField(
@@ -91,7 +209,8 @@ class Comment(models.Model):
         blank=True,
     )
     created = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         verbose_name='Дата создания комментария',
         help_text=(
             'Указывает на время создания комментария. Автоматически '
@@ -113,6 +232,17 @@ class Comment(models.Model):
         help_text='Указывает на автора, который создал комментарий.',
     )
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('created', 'id')
+        indexes = (
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_created_idx',
+            ),
+        )
+
     def __str__(self):
         return self.text[:15]
 
@@ -144,6 +274,82 @@ class Follow(models.Model):
                 name='check_follow',
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user_idx',
+            ),
+        )
 
     def __str__(self):
         return f'{self.user.username} подписался на {self.author.username}'
+
+
+class FeedItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        related_name='feed',
+        on_delete=models.CASCADE,
+        verbose_name='Читатель',
+        help_text='Пользователь, в ленту которого попала запись.',
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+        verbose_name='Запись',
+        help_text='Запись автора, на которого подписан пользователь.',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата создания записи',
+        help_text=(
+            'Копия даты создания записи: лента сортируется по ней '
+            'без обращения к таблице записей'
+        ),
+    )
+
+    class Meta:
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_feed_item',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='feed_user_pub_date_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.post_id} в ленте {self.user_id}'
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        help_text='Пользователь, к которому относятся счётчики.',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Записей',
+        help_text='Количество записей пользователя.',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков',
+        help_text='Количество пользователей, подписанных на автора.',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок',
+        help_text='Количество авторов, на которых подписан пользователь.',
+    )
+
+    def __str__(self):
+        return f'Счётчики {self.user_id}'
@@ -0,0 +1,153 @@
+"""
+Области кэша страниц записей и их инвалидация.
+
+Области для сброса вычисляются сразу, а новые поколения начинаются
+после фиксации транзакции записи.
+"""
+from core import page_cache
+from posts.models import Comment, Group, Post
+
+INDEX_SCOPE = 'posts'
+GROUPS_SCOPE = 'groups'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def comments_scope(scope):
+    """
+    Число комментариев записей из области scope.
+
+    Его показывают только списки записей в API, поэтому новый
+    комментарий не сбрасывает HTML-страницы лент.
+    """
+    return f'comments:{scope}'
+
+
+def index_scopes(request):
+    return [INDEX_SCOPE]
+
+
+def group_scopes(request, slug):
+    return [group_scope(slug)]
+
+
+def profile_scopes(request, username):
+    return [author_scope(username)]
+
+
+def post_scopes(request, post_id):
+    """
+    Страница записи зависит от самой записи, автора и группы.
+
+    Имена автора и группы достаются одним запросом по первичному ключу;
+    для несуществующей записи областей нет, и представление отдаст 404.
+    """
+    try:
+        username, slug = Post.objects.values_list(
+            'author__username', 'group__slug',
+        ).get(pk=post_id)
+    except Post.DoesNotExist:
+        return None
+    return _post_scopes(post_id, username, slug)
+
+
+async def apost_scopes(request, post_id):
+    """post_scopes для асинхронных представлений."""
+    try:
+        username, slug = await Post.objects.values_list(
+            'author__username', 'group__slug',
+        ).aget(pk=post_id)
+    except Post.DoesNotExist:
+        return None
+    return _post_scopes(post_id, username, slug)
+
+
+def _post_scopes(post_id, username, slug):
+    scopes = [post_scope(post_id), author_scope(username)]
+    if slug is not None:
+        scopes.append(group_scope(slug))
+    return scopes
+
+
+def bump_post(post):
+    """Запись видна на главной, на странице автора и своей группы."""
+    group_ids = {post.group_id, getattr(post, 'loaded_group_id', None)}
+    slugs = Group.objects.filter(pk__in=group_ids - {None}).values_list(
+        'slug', flat=True
+    )
+    page_cache.bump_on_commit(
+        INDEX_SCOPE,
+        post_scope(post.pk),
+        author_scope(post.author.username),
+        *(group_scope(slug) for slug in slugs),
+    )
+
+
+def bump_comment(comment):
+    """Комментарий меняет страницу записи и её счётчик во всех лентах."""
+    scopes = [post_scope(comment.post_id)]
+    # При удалении записи вместе с комментариями её может уже не быть.
+    names = Post.objects.filter(pk=comment.post_id).values_list(
+        'author__username', 'group__slug',
+    ).first()
+    if names is not None:
+        username, slug = names
+        scopes += [
+            comments_scope(INDEX_SCOPE),
+            comments_scope(author_scope(username)),
+        ]
+        if slug is not None:
+            scopes.append(comments_scope(group_scope(slug)))
+    page_cache.bump_on_commit(*scopes)
+
+
+def bump_group(group):
+    """Вместе с группой сбрасывается и её прежний адрес."""
+    slugs = {group.slug, getattr(group, 'previous_slug', None)} - {None}
+    page_cache.bump_on_commit(
+        INDEX_SCOPE, GROUPS_SCOPE, *(group_scope(slug) for slug in slugs),
+    )
+
+
+def bump_groups():
+    """Список групп меняется и при создании новой группы."""
+    page_cache.bump_on_commit(GROUPS_SCOPE)
+
+
+def bump_author(user):
+    """
+    Имя автора есть на всех страницах с его записями и под его
+    комментариями. Профиль по прежнему имени пользователя тоже
+    сбрасывается.
+    """
+    slugs = Group.objects.filter(posts__author=user).values_list(
+        'slug', flat=True
+    ).distinct()
+    commented = Comment.objects.filter(author=user).values_list(
+        'post_id', flat=True
+    ).distinct()
+    usernames = {user.username, getattr(user, 'previous_username', None)}
+    page_cache.bump_on_commit(
+        INDEX_SCOPE,
+        *(author_scope(name) for name in usernames - {None}),
+        *(group_scope(slug) for slug in slugs),
+        *(post_scope(post_id) for post_id in commented),
+    )
+
+
+def bump_follow(follow):
+    """Счётчики подписок видны на страницах обоих пользователей."""
+    page_cache.bump_on_commit(
+        author_scope(follow.author.username),
+        author_scope(follow.user.username),
+    )
@@ -0,0 +1,199 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from core.paginator import (CursorPage, CursorPaginator, InvalidCursor,
+                            decode_cursor, encode_cursor)
+from posts.models import Post
+
+FTS_TABLE = 'posts_post_fts'
+# Символы из области частного использования Unicode: в тексте записей
+# их не бывает, поэтому ими удобно отмечать совпадения до экранирования.
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+SNIPPET_TOKENS = 24
+
+CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+DROP_TABLE = f'DROP TABLE IF EXISTS {FTS_TABLE}'
+REBUILD = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+TRIGGERS = {
+    f'{FTS_TABLE}_insert': (
+        'AFTER INSERT ON posts_post BEGIN '
+        f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+        'END'
+    ),
+    f'{FTS_TABLE}_delete': (
+        'AFTER DELETE ON posts_post BEGIN '
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+        "VALUES ('delete', old.id, old.text); "
+        'END'
+    ),
+    f'{FTS_TABLE}_update': (
+        'AFTER UPDATE OF text ON posts_post BEGIN '
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+        "VALUES ('delete', old.id, old.text); "
+        f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+        'END'
+    ),
+}
+
+
+def fts_available(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def install_triggers(cursor):
+    """
+    Создаёт триггеры, которые держат индекс в соответствии с posts_post.
+
+    SQLite при изменении схемы пересоздаёт таблицу и теряет её триггеры,
+    поэтому вызов повторяется после каждой миграции.
+    """
+    for name, body in TRIGGERS.items():
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+
+def drop_triggers(cursor):
+    for name in TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def ensure_index(using=connection):
+    """Восстанавливает триггеры, если миграция пересоздала таблицу записей."""
+    if not fts_available(using):
+        return
+    with using.cursor() as cursor:
+        if FTS_TABLE in using.introspection.table_names(cursor):
+            install_triggers(cursor)
+
+
+def match_expression(query):
+    """
+    Превращает пользовательский запрос в безопасное выражение FTS5.
+
+    Каждое слово берётся в кавычки, поэтому операторы FTS5 во вводе
+    не действуют, а слова объединяются через неявное AND.
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"' for word in words)
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и заменяет метки совпадений на <mark>."""
+    html = escape(snippet)
+    html = html.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+def filter_by_text(queryset, query):
+    """Оставляет в queryset записи, найденные полнотекстовым индексом."""
+    match = match_expression(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match,),
+    ))
+
+
+class PostSearch:
+    """
+    Поиск записей по индексу FTS5 с ранжированием bm25.
+
+    Выдача упорядочена по (релевантность, id) и листается курсором по
+    этой паре, как и остальные ленты. На страницах приходят записи для
+    ленты с атрибутами search_rank и snippet.
+    """
+
+    def __init__(self, query, per_page):
+        self.match = match_expression(query)
+        self.per_page = int(per_page)
+
+    def cursor_for(self, post):
+        return encode_cursor([post.search_rank, post.id])
+
+    def get_page(self, after=None, before=None):
+        if not self.match:
+            return CursorPage([], self, has_next=False, has_previous=False)
+        try:
+            if before:
+                return self._page(self._decode(before), forward=False)
+            if after:
+                return self._page(self._decode(after), forward=True)
+        except InvalidCursor:
+            pass
+        return self._page(None, forward=True)
+
+    def _decode(self, token):
+        values = decode_cursor(token)
+        if len(values) != 2:
+            raise InvalidCursor(token)
+        try:
+            return float(values[0]), int(values[1])
+        except (TypeError, ValueError):
+            raise InvalidCursor(token)
+
+    def _page(self, position, forward):
+        rows = self._rows(position, forward)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            if not has_more:
+                return self._page(None, forward=True)
+            rows.reverse()
+
+        posts = Post.objects.for_listing().in_bulk(row[0] for row in rows)
+        results = []
+        for post_id, rank, snippet in rows:
+            post = posts.get(post_id)
+            if post is None:
+                continue
+            post.search_rank = rank
+            post.snippet = highlight(snippet)
+            results.append(post)
+        if forward:
+            return CursorPage(
+                results, self,
+                has_next=has_more, has_previous=position is not None,
+            )
+        return CursorPage(results, self, has_next=True, has_previous=True)
+
+    def _rows(self, position, forward):
+        rank = f'bm25({FTS_TABLE})'
+        sql = (
+            f'SELECT rowid, {rank}, snippet({FTS_TABLE}, 0, %s, %s, %s, %s) '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        )
+        params = [MARK_START, MARK_END, '…', SNIPPET_TOKENS, self.match]
+        if position is not None:
+            sign = '>' if forward else '<'
+            sql += (
+                f' AND ({rank} {sign} %s OR ({rank} = %s AND rowid {sign} %s))'
+            )
+            params += [position[0], position[0], position[1]]
+        direction = 'ASC' if forward else 'DESC'
+        sql += f' ORDER BY {rank} {direction}, rowid {direction} LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+def search_page(query, per_page, after=None, before=None):
+    """
+    Страница результатов поиска.
+
+    Без SQLite полнотекстового индекса нет, и поиск сводится к подстроке
+    с обычной сортировкой по дате.
+    """
+    if fts_available():
+        return PostSearch(query, per_page).get_page(after, before)
+    queryset = Post.objects.for_listing().filter(text__icontains=query)
+    return CursorPaginator(queryset, per_page).get_page(after, before)
@@ -0,0 +1,170 @@
+"""
+Синтетические данные для замеров на объёмах, близких к боевым.
+
+Строки собираются генераторами и загружаются через bulk.Importer, так
+что счётчики, ленты подписок и поколения кэша страниц обновляются так
+же, как при обычной загрузке. Популярность авторов подчиняется
+степенному закону: у первых авторов в списке большая часть подписчиков
+и записей, у остальных — длинный хвост, как в настоящих соцсетях.
+"""
+import random
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from posts import bulk, thumbnails
+from posts.models import Group, Post
+
+WORDS = (
+    'утро', 'город', 'дорога', 'книга', 'море', 'лес', 'письмо', 'окно',
+    'дождь', 'поезд', 'кофе', 'друг', 'музыка', 'вечер', 'снег', 'сад',
+    'река', 'история', 'фото', 'прогулка', 'работа', 'мечта', 'кот',
+    'небо', 'дом', 'лето', 'осень', 'зима', 'весна', 'ветер', 'свет',
+)
+IMAGE_SIZE = (1600, 1000)
+
+
+def popularity(count, exponent):
+    """Накопленные веса степенного закона для random.choices."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+class Seeder:
+    """
+    Генератор связанных между собой пользователей, групп и записей.
+
+    Имена начинаются с prefix, поэтому повторный запуск с тем же
+    префиксом дописывает данные к уже созданным, а с другим не
+    пересекается с ними. Одинаковый seed даёт одинаковые данные.
+    """
+
+    def __init__(self, users, groups, prefix='seed', seed=None, exponent=1.2,
+                 days=365, batch_size=1000):
+        self.random = random.Random(seed)
+        self.usernames = [f'{prefix}_user_{number}' for number in range(users)]
+        self.slugs = [f'{prefix}-group-{number}' for number in range(groups)]
+        self.prefix = prefix
+        self.weights = popularity(users, exponent)
+        self.days = days
+        self.batch_size = batch_size
+        self.now = timezone.now()
+
+    def load(self, kind, rows):
+        importer = bulk.Importer(kind, create_missing=True)
+        loaded = sum(
+            importer.load(batch)
+            for batch in bulk.batched(rows, self.batch_size)
+        )
+        importer.finish()
+        return loaded
+
+    def create_users(self):
+        importer = bulk.Importer('posts', create_missing=True)
+        for batch in bulk.batched(self.usernames, self.batch_size):
+            importer.users(batch)
+        return len(self.usernames)
+
+    def create_groups(self):
+        Group.objects.bulk_create(
+            [
+                Group(
+                    title=f'Группа {number}: {self.words(2)}',
+                    slug=slug,
+                    description=self.words(12),
+                )
+                for number, slug in enumerate(self.slugs)
+            ],
+            ignore_conflicts=True,
+        )
+        return len(self.slugs)
+
+    def words(self, count):
+        return ' '.join(self.random.choices(WORDS, k=count))
+
+    def date(self):
+        return (
+            self.now - timedelta(seconds=self.random.uniform(
+                0, self.days * 24 * 3600,
+            ))
+        ).isoformat()
+
+    def popular_user(self):
+        return self.random.choices(
+            self.usernames, cum_weights=self.weights,
+        )[0]
+
+    def post_rows(self, count, images):
+        with_image = set(self.random.sample(range(count), min(images, count)))
+        for number in range(count):
+            yield {
+                'text': self.words(self.random.randint(5, 60)).capitalize(),
+                'pub_date': self.date(),
+                'author': self.popular_user(),
+                'group': (
+                    self.random.choice(self.slugs)
+                    if self.slugs and self.random.random() < 0.7 else None
+                ),
+                'image': (
+                    self.make_image(number) if number in with_image else None
+                ),
+            }
+
+    def comment_rows(self, count):
+        post_ids = list(self.posts().values_list('pk', flat=True))
+        if not post_ids:
+            return
+        for _ in range(count):
+            yield {
+                'post': self.random.choice(post_ids),
+                'author': self.random.choice(self.usernames),
+                'text': self.words(self.random.randint(3, 25)).capitalize(),
+                'created': self.date(),
+            }
+
+    def follow_rows(self, count):
+        # Повторы и подписки на себя Importer пропускает, так что подписок
+        # получается немного меньше запрошенного.
+        for _ in range(count):
+            yield {
+                'user': self.random.choice(self.usernames),
+                'author': self.popular_user(),
+            }
+
+    def make_image(self, number):
+        """Сохраняет картинку с градиентом и возвращает её имя."""
+        image = Image.linear_gradient('L').resize(IMAGE_SIZE).convert('RGB')
+        draw = ImageDraw.Draw(image)
+        for _ in range(8):
+            x, y = (self.random.randrange(side) for side in IMAGE_SIZE)
+            radius = self.random.randint(50, 300)
+            draw.ellipse(
+                (x - radius, y - radius, x + radius, y + radius),
+                fill=tuple(self.random.randrange(256) for _ in range(3)),
+            )
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        field = Post._meta.get_field('image')
+        return field.storage.save(
+            field.generate_filename(None, f'{self.prefix}-{number}.jpg'),
+            ContentFile(buffer.getvalue()),
+        )
+
+    def posts(self):
+        return Post.objects.filter(
+            author__username__startswith=f'{self.prefix}_user_',
+        )
+
+    def describe_images(self):
+        """Размеры и уменьшенные копии созданных картинок."""
+        post_ids = list(self.posts().exclude(image='').filter(
+            image_width__isnull=True,
+        ).values_list('pk', flat=True))
+        for post_id in post_ids:
+            thumbnails.generate_by_id(post_id)
+        return len(post_ids)
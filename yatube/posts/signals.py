@@ -0,0 +1,122 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from posts import cards, counters, feed, page_scopes
+from posts.models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    page_scopes.bump_post(instance)
+    if created:
+        feed.fan_out(instance)
+        counters.change_user_counter(instance.author_id, 'posts_count', 1)
+        counters.change_post_totals([instance.group_id], 1)
+    elif (
+        hasattr(instance, 'loaded_group_id')
+        and instance.loaded_group_id != instance.group_id
+    ):
+        counters.move_post_total(instance.loaded_group_id, instance.group_id)
+        # Повторное сохранение того же объекта уже ничего не переносит.
+        instance.loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'posts_count', -1)
+    counters.change_post_totals([instance.group_id], -1)
+    cards.forget(instance)
+    page_scopes.bump_post(instance)
+
+
+def remember_previous(instance, field, update_fields):
+    """
+    Запоминает прежнее значение поля из адреса страницы: после
+    переименования сбрасывается кэш и старого адреса.
+    """
+    if instance._state.adding or (
+        update_fields is not None and field not in update_fields
+    ):
+        return
+    previous = type(instance).objects.filter(pk=instance.pk).values_list(
+        field, flat=True,
+    ).first()
+    setattr(instance, f'previous_{field}', previous)
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        remember_previous(instance, 'slug', update_fields)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        page_scopes.bump_groups()
+    else:
+        cards.bump_versions(Post.objects.filter(group=instance))
+        page_scopes.bump_group(instance)
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # Записи останутся без группы, их карточки нужно перерисовать.
+    cards.bump_versions(Post.objects.filter(group=instance))
+    page_scopes.bump_group(instance)
+    counters.forget_post_totals([instance.pk])
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        remember_previous(instance, 'username', update_fields)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if created or raw:
+        return
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        # Вход пользователя не меняет его карточки.
+        return
+    cards.bump_versions(Post.objects.filter(author=instance))
+    page_scopes.bump_author(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+    page_scopes.bump_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+    page_scopes.bump_comment(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feed.backfill(instance.user_id, instance.author_id)
+        counters.change_user_counter(instance.author_id, 'followers_count', 1)
+        counters.change_user_counter(instance.user_id, 'following_count', 1)
+        page_scopes.bump_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    feed.purge(instance.user_id, instance.author_id)
+    counters.change_user_counter(instance.author_id, 'followers_count', -1)
+    counters.change_user_counter(instance.user_id, 'following_count', -1)
+    page_scopes.bump_follow(instance)
@@ -0,0 +1,19 @@
+from django import template
+
+from posts.thumbnails import cached_thumbnail, schedule_once
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, preset):
+    """
+    Готовая миниатюра картинки записи или None.
+
+    Миниатюра здесь не создаётся: если её нет, запись ставится в очередь,
+    а шаблон показывает заглушку.
+    """
+    thumbnail = cached_thumbnail(post.image, preset)
+    if thumbnail is None:
+        schedule_once(post)
+    return thumbnail
@@ -0,0 +1,246 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.counters import get_stats
+from posts.models import Comment, FeedItem, Follow, Group, Post
+
+User = get_user_model()
+
+
+class BulkCommandsTests(TestCase):
+    """Выгрузка и загрузка записей, комментариев и подписок."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='bulk_author')
+        cls.reader = User.objects.create(username='bulk_reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='bulk_group',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(5):
+            post = Post.objects.create(
+                author=cls.author,
+                group=cls.group if number % 2 else None,
+                text=f'Текст, "с кавычками"\nи переносом {number}',
+            )
+            Comment.objects.create(
+                post=post, author=cls.reader, text=f'Комментарий {number}',
+            )
+        old = timezone.now() - timedelta(days=30)
+        Post.objects.update(pub_date=old)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def export(self, model, extension='jsonl'):
+        path = os.path.join(self.directory, f'{model}.{extension}')
+        call_command(
+            'export_posts', model=model, output=path, stdout=StringIO(),
+        )
+        return path
+
+    def load(self, path, model, *args):
+        out = StringIO()
+        call_command('import_posts', path, model=model, *args, stdout=out)
+        return out.getvalue()
+
+    def snapshot(self):
+        return (
+            list(Post.objects.values_list(
+                'id', 'text', 'pub_date', 'author__username', 'group__slug',
+            )),
+            list(Comment.objects.values_list('id', 'post', 'text')),
+        )
+
+    def test_round_trip(self):
+        """Выгруженное загружается обратно вместе с производными данными"""
+        expected = self.snapshot()
+        paths = {
+            model: self.export(model)
+            for model in ('follows', 'posts', 'comments')
+        }
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        for model in ('posts', 'comments', 'follows'):
+            output = self.load(paths[model], model)
+            self.assertIn('Готово: загружено', output)
+        self.assertEqual(self.snapshot(), expected)
+        self.assertEqual(get_stats(self.author).posts_count, 5)
+        self.assertEqual(get_stats(self.author).followers_count, 1)
+        self.assertEqual(FeedItem.objects.filter(user=self.reader).count(), 5)
+        self.assertEqual(
+            set(Post.objects.values_list('comments_count', flat=True)), {1},
+        )
+
+    def test_csv_and_repeat(self):
+        """CSV загружается, а повторная загрузка не создаёт дублей"""
+        expected = self.snapshot()
+        path = self.export('posts', 'csv')
+        Post.objects.all().delete()
+        self.load(path, 'posts')
+        output = self.load(path, 'posts')
+        self.assertIn('загружено 0, пропущено 5', output)
+        self.assertEqual(self.snapshot()[0], expected[0])
+        self.assertEqual(get_stats(self.author).posts_count, 5)
+
+    def test_repeat_follows(self):
+        """Повторные подписки не считаются загруженными и не растят счётчики"""
+        path = self.export('follows')
+        self.assertIn('загружено 0, пропущено 1', self.load(path, 'follows'))
+        self.assertEqual(get_stats(self.author).followers_count, 1)
+        self.assertEqual(get_stats(self.reader).following_count, 1)
+
+    def test_missing_references(self):
+        """Строки с неизвестным автором пропускаются или создают его"""
+        path = os.path.join(self.directory, 'new.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('{"text": "Чужая запись", "author": "stranger"}\n')
+        self.assertIn('пропущено 1', self.load(path, 'posts'))
+        self.assertIn(
+            'пропущено 0', self.load(path, 'posts', '--create-missing'),
+        )
+        post = Post.objects.get(text='Чужая запись')
+        self.assertEqual(post.author.username, 'stranger')
+        self.assertFalse(post.author.has_usable_password())
+
+    def write(self, name, *lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(''.join(line + '\n' for line in lines))
+        return path
+
+    def test_invalid_posts(self):
+        """Строки с ошибками считаются, а остальные загружаются"""
+        path = self.write(
+            'posts.jsonl',
+            '{"text": "Плохая дата", "author": "bulk_author", '
+            '"pub_date": "not-a-date"}',
+            '{"text": "Без автора"}',
+            '{"id": "x", "text": "Плохой id", "author": "bulk_author"}',
+            '{"text": "Оборванная строка',
+            '{"text": "Хорошая", "author": "bulk_author", '
+            '"pub_date": "2020-01-02T03:04:05+00:00"}',
+        )
+        output = self.load(path, 'posts')
+        self.assertIn('загружено 1, пропущено 0, с ошибками 4', output)
+        post = Post.objects.get(text='Хорошая')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertFalse(
+            Post.objects.filter(text__in=('Плохая дата', 'Без автора'))
+            .exists()
+        )
+        self.assertEqual(get_stats(self.author).posts_count, 6)
+
+    def test_invalid_comments(self):
+        """Комментарий без записи или с нечисловой записью не ломает пачку"""
+        post = Post.objects.first()
+        path = self.write(
+            'comments.jsonl',
+            '{"post": null, "author": "bulk_reader", "text": "Пусто"}',
+            '{"post": "x", "author": "bulk_reader", "text": "Буква"}',
+            f'{{"post": {post.pk}, "author": "bulk_reader", '
+            f'"created": "вчера", "text": "Дата"}}',
+            f'{{"post": "{post.pk}", "author": "bulk_reader", '
+            f'"text": "Хороший"}}',
+        )
+        output = self.load(path, 'comments')
+        self.assertIn('загружено 1, пропущено 0, с ошибками 3', output)
+        self.assertTrue(post.comments.filter(text='Хороший').exists())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+
+    def test_invalid_follows(self):
+        """Подписка без пользователя считается ошибкой"""
+        path = self.write(
+            'follows.jsonl', '{"author": "bulk_author"}', '5',
+        )
+        output = self.load(path, 'follows')
+        self.assertIn('загружено 0, пропущено 0, с ошибками 2', output)
+
+    def test_dates_do_not_touch_model(self):
+        """Даты из файла сохраняются без правки описания поля"""
+        field = Post._meta.get_field('pub_date')
+        state = field.__dict__.copy()
+        path = self.write(
+            'posts.jsonl',
+            '{"text": "Старая", "author": "bulk_author", '
+            '"pub_date": "2001-01-01T00:00:00+00:00"}',
+        )
+        self.load(path, 'posts')
+        self.assertEqual(Post.objects.get(text='Старая').pub_date.year, 2001)
+        self.assertEqual(field.__dict__, state)
+        post = Post.objects.create(author=self.author, text='Новая')
+        self.assertEqual(post.pub_date.date(), timezone.now().date())
+
+
+class SeedCommandTests(TestCase):
+    """Заполнение базы синтетическими данными"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=directory)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def seed(self, **options):
+        call_command(
+            'seed_yatube', users=30, groups=3, posts=60, comments=40,
+            follows=200, images=2, seed=1, stdout=StringIO(), **options,
+        )
+
+    def test_seed(self):
+        """Создаются связанные данные с согласованными счётчиками"""
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertFalse(
+            Follow.objects.filter(user=F('author')).exists()
+        )
+        first, last = (
+            User.objects.get(username=f'seed_user_{number}')
+            for number in (0, 29)
+        )
+        self.assertGreater(
+            get_stats(first).followers_count, get_stats(last).followers_count,
+        )
+        self.assertEqual(
+            get_stats(first).posts_count, first.posts.count(),
+        )
+        self.assertEqual(
+            FeedItem.objects.filter(user=first).count(),
+            Post.objects.filter(author__following__user=first).count(),
+        )
+        images = Post.objects.exclude(image='')
+        self.assertEqual(images.count(), 2)
+        self.assertFalse(images.filter(image_width__isnull=True).exists())
+
+    def test_reproducible(self):
+        """Одинаковое зерно даёт одинаковые данные"""
+        def snapshot():
+            return list(Post.objects.order_by('pk').values_list(
+                'text', 'author__username', 'group__slug',
+            ))
+
+        self.seed()
+        expected = snapshot()
+        Post.objects.all().delete()
+        self.seed()
+        self.assertEqual(snapshot(), expected)
@@ -1,12 +1,15 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from posts import images
 from posts.models import Comment, Group, Post
 
 User = get_user_model()
@@ -95,6 +98,80 @@ class PostsFromTest(TestCase):
         self.assertEqual(post_count, Post.objects.count())
 
 
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_IMAGE_MASTER_SIDE=64,
+    POST_IMAGE_WIDTHS=(16, 32),
+)
+class ImageIngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.auth_client = Client()
+        self.auth_client.force_login(ImageIngestTests.user)
+
+    def photo(self, size=(200, 100), orientation=None):
+        """JPEG, как с телефона: повёрнутый тегом EXIF Orientation."""
+        exif = Image.Exif()
+        if orientation:
+            exif[images.ORIENTATION_TAG] = orientation
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile(
+            name='photo.jpeg',
+            content=buffer.getvalue(),
+            content_type='image/jpeg',
+        )
+
+    def create(self, image):
+        return self.auth_client.post(reverse('posts:create_post'), data={
+            'text': 'Фото',
+            'image': image,
+        })
+
+    def test_large_photo_is_normalized(self):
+        """Большой снимок поворачивается и уменьшается до мастер-копии"""
+        self.create(self.photo(orientation=6))
+        post = Post.objects.get(text='Фото')
+        self.assertEqual((post.image_width, post.image_height), (32, 64))
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as master:
+            self.assertEqual(master.size, (32, 64))
+
+    def test_renditions_are_stored(self):
+        """Копии записываются для ширин меньше мастер-копии"""
+        self.create(self.photo())
+        post = Post.objects.get(text='Фото')
+        self.assertEqual(
+            [(r['width'], r['type']) for r in post.image_renditions],
+            [(16, 'image/webp'), (16, 'image/jpeg'), (32, 'image/webp'),
+             (32, 'image/jpeg')],
+        )
+        for rendition in post.image_renditions:
+            with Image.open(post.image.storage.path(rendition['name'])) as im:
+                self.assertEqual(im.width, rendition['width'])
+
+    def test_limits(self):
+        """Слишком тяжёлые и слишком большие картинки не принимаются"""
+        limits = (
+            {'POST_IMAGE_MAX_BYTES': 100},
+            {'POST_IMAGE_MAX_PIXELS': 100},
+        )
+        for limit in limits:
+            with self.subTest(limit=limit), self.settings(**limit):
+                response = self.create(self.photo())
+                self.assertTrue(response.context['form'].errors['image'])
+                self.assertFalse(Post.objects.filter(text='Фото').exists())
+
+
 class CommentFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -1,7 +1,11 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from posts.models import Comment, Follow, Group, Post
+from posts.counters import get_stats
+from posts.models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -201,3 +205,51 @@ class FollowModelTest(TestCase):
             (f'{FollowModelTest.user.username} подписался '
              f'на {FollowModelTest.author.username}'),
         )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='counter_author')
+        cls.reader = User.objects.create(username='counter_reader')
+
+    def test_posts_count(self):
+        """Счётчик записей меняется при создании и удалении записи"""
+        post = Post.objects.create(author=self.author, text='Первый')
+        Post.objects.create(author=self.author, text='Второй')
+        self.assertEqual(get_stats(self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(get_stats(self.author).posts_count, 1)
+
+    def test_follow_counts(self):
+        """Подписка и отписка меняют счётчики обеих сторон"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(get_stats(self.author).followers_count, 1)
+        self.assertEqual(get_stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(get_stats(self.author).followers_count, 0)
+        self.assertEqual(get_stats(self.reader).following_count, 0)
+
+    def test_comments_count(self):
+        """Счётчик комментариев хранится в записи"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий',
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет разошедшиеся счётчики"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        UserStats.objects.filter(user=self.author).update(posts_count=10)
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+        call_command('recount', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(get_stats(self.author).posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
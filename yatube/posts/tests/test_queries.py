@@ -0,0 +1,119 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryBudgetTests(TestCase):
+    """Число запросов на страницу не зависит от количества записей."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create(username=f'budget_user_{number}')
+            for number in range(3)
+        ]
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {number}',
+                slug=f'budget_group_{number}',
+                description='Тестовое описание',
+            )
+            for number in range(3)
+        ]
+        for number in range(15):
+            cls.post = Post.objects.create(
+                author=cls.users[number % 3],
+                group=cls.groups[number % 3],
+                text=f'Текст поста {number}',
+            )
+            Comment.objects.create(
+                post=cls.post,
+                author=cls.users[(number + 1) % 3],
+                text=f'Комментарий {number}',
+            )
+        Follow.objects.create(user=cls.users[0], author=cls.users[1])
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.auth_client = Client()
+        self.auth_client.force_login(QueryBudgetTests.users[0])
+        cache.clear()
+
+    def pages(self):
+        # У страницы записи первый запрос — валидатор условного GET.
+        # Число записей автора берётся из его счётчиков, без COUNT(*).
+        return {
+            reverse('posts:index'): 2,
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': QueryBudgetTests.groups[1].slug},
+            ): 3,
+            reverse(
+                'posts:profile',
+                kwargs={'username': QueryBudgetTests.users[1].username},
+            ): 2,
+            reverse(
+                'posts:post_detail',
+                kwargs={'post_id': QueryBudgetTests.post.id},
+            ): 3,
+        }
+
+    def test_guest_query_budget(self):
+        """Гость: запросы только за страницей, без N+1"""
+        for url, budget in self.pages().items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(budget):
+                    self.guest_client.get(url)
+
+    def test_auth_user_query_budget(self):
+        """
+        Пользователь: к бюджету гостя добавляются сессия и пользователь,
+        на профиле ещё проверка подписки
+        """
+        profile_url = reverse(
+            'posts:profile',
+            kwargs={'username': QueryBudgetTests.users[1].username},
+        )
+        for url, budget in self.pages().items():
+            budget += 2
+            if url == profile_url:
+                budget += 1
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(budget):
+                    self.auth_client.get(url)
+
+    def test_counts_are_cached(self):
+        """Число записей на главной и в группе считается один раз"""
+        urls = (
+            reverse('posts:index'),
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': QueryBudgetTests.groups[1].slug},
+            ),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                author=QueryBudgetTests.users[2],
+                group=QueryBudgetTests.groups[1],
+                text='Новая запись',
+            )
+        for url, budget in zip(urls, (1, 2)):
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    response = self.guest_client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, 6)
+
+    def test_follow_index_query_budget(self):
+        """Лента подписок: сессия, пользователь, подсчёт и страница"""
+        with self.assertNumQueries(4):
+            self.auth_client.get(reverse('posts:follow_index'))
@@ -0,0 +1,92 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'\bSCAN posts_\w+$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть в SQLite')
+class QueryPlanTests(TestCase):
+    """Запросы страниц идут по индексам, без полного чтения и сортировки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='plan_author')
+        cls.reader = User.objects.create(username='plan_reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='plan_group',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(15):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text=f'Текст поста {number}',
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='Комментарий',
+            )
+
+    def setUp(self):
+        self.auth_client = Client()
+        self.auth_client.force_login(QueryPlanTests.reader)
+        cache.clear()
+
+    def explain(self, query):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.auth_client.get(url)
+        for query in queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            for step in self.explain(query):
+                with self.subTest(url=url, sql=query['sql'], step=step):
+                    self.assertNotRegex(step, FULL_SCAN)
+                    self.assertNotIn(TEMP_SORT, step)
+
+    def test_list_pages_use_indexes(self):
+        """Ленты записей читаются диапазоном индекса"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug},
+            ),
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username},
+            ),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            self.assert_indexed(url)
+
+    def test_cursor_pages_use_indexes(self):
+        """Курсорные страницы тоже не сортируют во временном дереве"""
+        url = reverse('posts:index')
+        page = self.auth_client.get(url).context['page_obj']
+        self.assert_indexed(f'{url}?after={page.next_cursor}')
+        self.assert_indexed(f'{url}?before={page.next_cursor}')
+
+    def test_post_detail_uses_indexes(self):
+        """Страница записи и её комментарии читаются по индексам"""
+        self.assert_indexed(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
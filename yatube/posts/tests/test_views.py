@@ -1,14 +1,22 @@
 import shutil
 import tempfile
+import time
+from http import HTTPStatus
+from io import StringIO
+from unittest.mock import patch
 
+from asgiref.sync import iscoroutinefunction
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.test import AsyncClient, Client, TestCase, override_settings
 from django.urls import reverse
 
-from posts.models import Comment, Follow, Group, Post
+from core import page_cache
+from posts import cards, page_scopes, thumbnails, views
+from posts.models import Comment, FeedItem, Follow, Group, Post
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -151,6 +159,104 @@ class PaginatorTests(TestCase):
         )
         self.assertEqual(len(response.context['page_obj']), posts)
 
+    def test_cursor_pages_match_numbered_pages(self):
+        """Курсорные страницы совпадают со страницами по номеру"""
+        url = reverse('posts:index')
+        first_page = self.auth_client.get(url).context['page_obj']
+        second_page = self.auth_client.get(url + '?page=2').context[
+            'page_obj'
+        ]
+        response = self.auth_client.get(
+            url, {'after': first_page.next_cursor}
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), list(second_page),
+        )
+        self.assertFalse(response.context['page_obj'].has_next())
+        response = self.auth_client.get(
+            url, {'before': response.context['page_obj'].previous_cursor}
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), list(first_page),
+        )
+
+    def test_cursor_pagination_for_follow_index(self):
+        """Курсор работает на странице подписок"""
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=PaginatorTests.user)
+        self.auth_client.force_login(reader)
+        url = reverse('posts:follow_index')
+        first_page = self.auth_client.get(url).context['page_obj']
+        response = self.auth_client.get(
+            url, {'after': first_page.next_cursor}
+        )
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+    def test_invalid_cursor_opens_first_page(self):
+        """Некорректный курсор открывает первую страницу"""
+        response = self.auth_client.get(
+            reverse('posts:index'), {'after': 'broken'}
+        )
+        self.assertEqual(
+            len(response.context['page_obj']),
+            settings.POSTS_ON_PAGE,
+        )
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_page_range_is_elided(self):
+        """Номера страниц — окно вокруг текущей с многоточиями"""
+        Post.objects.bulk_create(
+            Post(author=PaginatorTests.user, text=f'Ещё пост {i}')
+            for i in range(settings.POSTS_ON_PAGE * 10)
+        )
+        response = self.auth_client.get(reverse('posts:index'), {'page': 6})
+        page_obj = response.context['page_obj']
+        ellipsis = page_obj.paginator.ELLIPSIS
+        self.assertEqual(
+            list(page_obj.page_range),
+            [1, ellipsis, 4, 5, 6, 7, 8, ellipsis, 12],
+        )
+        self.assertContains(response, 'page=12">')
+        self.assertNotContains(response, 'page=10"')
+
+    @override_settings(PAGINATOR_COUNT_LIMIT=10)
+    def test_approximate_count(self):
+        """В большой выдаче число записей приблизительное, конца не видно"""
+        response = self.auth_client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.paginator.approximate)
+        self.assertTrue(page_obj.has_next())
+        self.assertEqual(
+            list(page_obj.page_range), [1, page_obj.paginator.ELLIPSIS],
+        )
+        self.assertContains(response, 'Следующая')
+        self.assertNotContains(response, 'Последняя')
+
+    def test_group_count_follows_post_move(self):
+        """Перенос записи меняет числа записей обеих групп"""
+        other = Group.objects.create(title='Другая', slug='other')
+        urls = {
+            group: reverse('posts:group_list', kwargs={'slug': group.slug})
+            for group in (PaginatorTests.group, other)
+        }
+        for url in urls.values():
+            self.auth_client.get(url)
+        post = Post.objects.filter(group=PaginatorTests.group).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            post.group = other
+            post.save()
+            post.save()
+        counts = {
+            group: self.auth_client.get(url).context[
+                'page_obj'
+            ].paginator.count
+            for group, url in urls.items()
+        }
+        self.assertEqual(
+            counts,
+            {PaginatorTests.group: settings.POSTS_ON_PAGE + 4, other: 1},
+        )
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class ContextTests(TestCase):
@@ -319,25 +425,645 @@ class ContextTests(TestCase):
         self.assertEqual(len(post_on_page), 1)
 
 
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='feed_author')
+        cls.reader = User.objects.create(username='feed_reader')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(FeedTests.reader)
+
+    def feed_posts(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_feed(self):
+        """Подписка добавляет в ленту уже опубликованные записи"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed_posts(), [self.old_post])
+
+    def test_new_post_fans_out(self):
+        """Новая запись попадает в ленты подписчиков первой"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(self.feed_posts(), [new_post, self.old_post])
+
+    def test_unfollow_purges_feed(self):
+        """Отписка убирает записи автора из ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader_client.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': self.author.username},
+            )
+        )
+        self.assertEqual(self.feed_posts(), [])
+        self.assertFalse(FeedItem.objects.filter(user=self.reader).exists())
+
+    def test_rebuild_feeds_command(self):
+        """Команда rebuild_feeds восстанавливает ленты по подпискам"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        FeedItem.objects.all().delete()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(self.feed_posts(), [self.old_post])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='search_author')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Сегодня варили <b>малиновое</b> варенье',
+        )
+        Post.objects.create(author=cls.user, text='Совсем другая запись')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, **params):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params},
+        )
+        return response.context['page_obj']
+
+    def test_search_finds_post(self):
+        """Поиск находит запись по слову и подсвечивает совпадение"""
+        page = self.search('варенье')
+        self.assertEqual(list(page), [self.post])
+        self.assertIn('<mark>варенье</mark>', page[0].snippet)
+        self.assertIn('&lt;b&gt;', page[0].snippet)
+
+    def test_search_ignores_fts_syntax(self):
+        """Операторы FTS5 в запросе не ломают поиск"""
+        self.assertEqual(list(self.search('варенье* "(')), [self.post])
+
+    def test_search_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении записи"""
+        post = Post.objects.create(author=self.user, text='Старый текст')
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(list(self.search('старый')), [])
+        self.assertEqual(list(self.search('новый')), [post])
+        post.delete()
+        self.assertEqual(list(self.search('новый')), [])
+
+    def test_search_pagination(self):
+        """Результаты поиска листаются курсором"""
+        for number in range(settings.POSTS_ON_PAGE + 2):
+            Post.objects.create(author=self.user, text=f'Пирог {number}')
+        first_page = self.search('пирог')
+        self.assertEqual(len(first_page), settings.POSTS_ON_PAGE)
+        second_page = self.search('пирог', after=first_page.next_cursor)
+        self.assertEqual(len(second_page), 2)
+        self.assertFalse(set(first_page) & set(second_page))
+        previous_page = self.search(
+            'пирог', before=second_page.previous_cursor,
+        )
+        self.assertEqual(list(previous_page), list(first_page))
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке использует полнотекстовый индекс"""
+        admin = User.objects.create_superuser(username='search_admin')
+        self.guest_client.force_login(admin)
+        response = self.guest_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'малиновое'},
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.post],
+        )
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='card_author')
+        cls.group = Group.objects.create(
+            title='Старое название',
+            slug='card_group',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.post = Post.objects.create(
+            author=PostCardCacheTests.user,
+            group=PostCardCacheTests.group,
+            text='Исходный текст',
+        )
+        cache.clear()
+
+    def group_page(self):
+        return self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        ).content.decode()
+
+    def test_card_is_cached(self):
+        """Карточка берётся из кэша, пока версия записи не изменилась"""
+        self.group_page()
+        Post.objects.filter(pk=self.post.pk).update(text='Тайком')
+        self.assertIn('Исходный текст', self.group_page())
+
+    def test_post_edit_invalidates_card(self):
+        """Изменение записи перерисовывает карточку"""
+        self.group_page()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.text = 'Исправленный текст'
+            self.post.save()
+        self.assertIn('Исправленный текст', self.group_page())
+
+    def test_stale_edit_invalidates_card(self):
+        """Правка из устаревшей копии записи не попадает на старую версию"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.title = 'Новое название'
+            self.group.save()
+        self.group_page()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.text = 'Исправленный текст'
+            self.post.save()
+        self.assertEqual(
+            self.post.card_version,
+            Post.objects.get(pk=self.post.pk).card_version,
+        )
+        self.assertIn('Исправленный текст', self.group_page())
+
+    def test_group_edit_invalidates_card(self):
+        """Переименование группы перерисовывает карточки её записей"""
+        self.group_page()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.title = 'Новое название'
+            self.group.save()
+        self.assertNotIn('Группа: Старое название', self.group_page())
+
+    def test_author_edit_invalidates_card(self):
+        """Изменение имени автора перерисовывает его карточки"""
+        self.group_page()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Иван'
+            self.user.save()
+        self.assertIn('Автор: Иван', self.group_page())
+
+    def test_login_keeps_cards(self):
+        """Вход автора на сайт не сбрасывает его карточки"""
+        self.post.refresh_from_db()
+        version = self.post.card_version
+        self.guest_client.force_login(self.user)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.card_version, version)
+
+
 class CacheTests(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
         cls.user = User.objects.create(username='test_user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='cache_group',
+            description='Тестовое описание',
+        )
 
     def setUp(self):
         self.guest_client = Client()
         self.post = Post.objects.create(
             author=CacheTests.user,
+            group=CacheTests.group,
             text='Тестовый пост',
         )
+        cache.clear()
+
+    def pages(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': self.user.username},
+            ),
+        )
+
+    def test_pages_are_cached(self):
+        """Без записей через модели страницы отдаются из кэша"""
+        for url in self.pages():
+            with self.subTest(url=url):
+                first_response = self.guest_client.get(url)
+                Post.objects.filter(pk=self.post.pk).update(text='Тайком')
+                response = self.guest_client.get(url)
+                self.assertEqual(first_response.content, response.content)
+
+    def test_rename_invalidates_old_address(self):
+        """После смены slug и имени старые адреса отвечают 404"""
+        old_urls = self.pages()[1:]
+        for url in old_urls:
+            self.assertEqual(self.guest_client.get(url).status_code, 200)
+        etag = self.guest_client.get(old_urls[0])['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            group = Group.objects.get(pk=self.group.pk)
+            group.slug = 'renamed_group'
+            group.save()
+            user = User.objects.get(pk=self.user.pk)
+            user.username = 'renamed_user'
+            user.save()
+        for url in old_urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        response = self.guest_client.get(
+            old_urls[0], headers={'If-None-Match': etag},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        for url in (
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse('posts:profile', kwargs={'username': user.username}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.guest_client.get(url).status_code, 200)
+
+    def test_delete_invalidates_pages(self):
+        """Удаление записи сразу видно на всех её страницах"""
+        first_responses = {
+            url: self.guest_client.get(url) for url in self.pages()
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.delete()
+        for url, first_response in first_responses.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertNotEqual(first_response.content, response.content)
+
+    def test_new_post_invalidates_pages(self):
+        """Новая запись видна без ожидания истечения кэша"""
+        for url in self.pages():
+            self.guest_client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                author=self.user, group=self.group, text='Свежая запись',
+            )
+        for url in self.pages():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Свежая запись')
 
-    def test_index_page_cache(self):
-        """Тестирование работы кэширования на главной странице"""
-        first_response = self.guest_client.get(reverse('posts:index'))
-        self.post.delete()
-        response = self.guest_client.get(reverse('posts:index'))
+    def test_generation_changes_after_commit(self):
+        """Поколение меняется только после фиксации транзакции записи"""
+        scopes = [page_scopes.INDEX_SCOPE]
+        before = page_cache.get_generations(scopes)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(author=self.user, text='Ещё не видна')
+            self.assertEqual(page_cache.get_generations(scopes), before)
+        self.assertNotEqual(page_cache.get_generations(scopes), before)
+
+    def test_other_scopes_stay_cached(self):
+        """Запись в другой группе не сбрасывает кэш этой группы"""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        first_response = self.guest_client.get(url)
+        other_group = Group.objects.create(
+            title='Другая', slug='other_cache_group', description='-',
+        )
+        Post.objects.create(author=self.user, group=other_group, text='Чужая')
+        Post.objects.filter(pk=self.post.pk).update(text='Тайком')
+        response = self.guest_client.get(url)
         self.assertEqual(first_response.content, response.content)
+
+    def test_busy_lock_does_not_block_forever(self):
+        """Если страницу рисует другой процесс, ожидание ограничено"""
+        url = reverse('posts:index')
+        with self.settings(PAGE_CACHE_LOCK_WAIT=0):
+            with patch('core.page_cache.cache.add', return_value=False):
+                response = self.guest_client.get(url)
+        self.assertContains(response, self.post.text)
+
+    def test_released_lock_stops_waiting(self):
+        """Когда блокировку сняли, запрос не ждёт свой вариант страницы"""
+        url = reverse('posts:index')
+        with self.settings(PAGE_CACHE_LOCK_WAIT=5):
+            with patch('core.page_cache.cache.add', return_value=False):
+                started = time.monotonic()
+                response = self.guest_client.get(url)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertContains(response, self.post.text)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='thumb_author')
+        cls.image = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.auth_client = Client()
+        self.auth_client.force_login(ThumbnailTests.user)
         cache.clear()
-        response = self.guest_client.get(reverse('posts:index'))
-        self.assertNotEqual(first_response.content, response.content)
+
+    def uploaded(self, name):
+        return SimpleUploadedFile(
+            name=name, content=ThumbnailTests.image, content_type='image/gif',
+        )
+
+    def test_upload_skips_sorl_thumbnails(self):
+        """Загруженной картинке не создаётся миниатюра, которую не покажут"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.auth_client.post(reverse('posts:create_post'), data={
+                'text': 'Запись с картинкой',
+                'image': self.uploaded('upload.gif'),
+            })
+        post = Post.objects.get(text='Запись с картинкой')
+        self.assertIsNotNone(post.image_width)
+        self.assertIsNone(thumbnails.cached_thumbnail(post.image, 'card'))
+
+    def test_page_does_not_generate_thumbnails(self):
+        """Старая запись без размеров и миниатюры рисуется с заглушкой"""
+        post = Post.objects.create(
+            author=self.user, text='Без миниатюры',
+            image=self.uploaded('missing.gif'),
+        )
+        Post.objects.filter(pk=post.pk).update(image_width=None)
+        response = self.auth_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertContains(response, 'bg-light')
+        self.assertIsNone(thumbnails.cached_thumbnail(post.image, 'card'))
+
+    def test_command_backfills_thumbnails(self):
+        """Команда дописывает размеры картинкам старых записей"""
+        post = Post.objects.create(
+            author=self.user, text='Старая запись',
+            image=self.uploaded('old.gif'),
+        )
+        Post.objects.filter(pk=post.pk).update(image_width=None)
+        Post.objects.create(
+            author=self.user, text='Новая запись',
+            image=self.uploaded('new.gif'),
+        )
+        Post.objects.create(author=self.user, text='Без картинки')
+        out = StringIO()
+        call_command('generate_thumbnails', '--workers=1', stdout=out)
+        self.assertIn('для 1 записей из 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertIsNotNone(post.image_width)
+        self.assertIsNone(thumbnails.cached_thumbnail(post.image, 'card'))
+
+    def test_generate_outdates_stale_card(self):
+        """Карточка, нарисованная до подготовки картинки, не остаётся"""
+        post = Post.objects.create(
+            author=self.user, text='Гонка с картинкой',
+            image=self.uploaded('race.gif'),
+        )
+        Post.objects.filter(pk=post.pk).update(image_width=None)
+        stale = Post.objects.get(pk=post.pk)
+        self.assertTrue(thumbnails.generate_by_id(post.pk))
+        self.assertIn('bg-light', cards.render_cards([stale])[0])
+        card = cards.render_cards([Post.objects.get(pk=post.pk)])[0]
+        self.assertNotIn('bg-light', card)
+
+    def test_warmup_command(self):
+        """Прогрев создаёт миниатюры и кладёт страницы в кэш"""
+        post = Post.objects.create(
+            author=self.user, text='Запись для прогрева',
+            image=self.uploaded('warm.gif'),
+        )
+        Post.objects.filter(pk=post.pk).update(image_width=None)
+        out = StringIO()
+        call_command(
+            'warmup', '--workers=1', '--base-url=http://testserver',
+            stdout=out,
+        )
+        self.assertIn('Подготовлено картинок: 1', out.getvalue())
+        self.assertIn('Страницы: 2, ошибок 0, пропущено 0', out.getvalue())
+        post.refresh_from_db()
+        self.assertIsNotNone(post.image_width)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Запись для прогрева')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='etag_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='etag_group',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост',
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def pages(self):
+        return {
+            reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.id},
+            ): 1,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 0,
+            reverse(
+                'posts:profile', kwargs={'username': self.user.username},
+            ): 0,
+        }
+
+    def test_repeat_request_is_not_modified(self):
+        """Повторный запрос с ETag получает 304 почти без запросов"""
+        for url, queries in self.pages().items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertNumQueries(queries):
+                    repeat = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'],
+                    )
+                self.assertEqual(repeat.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_if_modified_since(self):
+        """Last-Modified тоже работает как валидатор"""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        response = self.guest_client.get(url)
+        repeat = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(repeat.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_changes_reset_validators(self):
+        """Комментарий, новая запись и правка группы меняют ETag"""
+        etags = {
+            url: self.guest_client.get(url)['ETag'] for url in self.pages()
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=self.user, text='Да')
+            Post.objects.create(author=self.user, group=self.group, text='Ещё')
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_viewer_changes_etag(self):
+        """Гость и вошедший пользователь получают разные ETag"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.guest_client.get(url)['ETag']
+        self.guest_client.force_login(self.user)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_missing_post(self):
+        """Для несуществующей записи валидаторов нет, ответ 404"""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 0}),
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertFalse(response.has_header('ETag'))
+
+
+@override_settings(COMMENTS_ON_PAGE=4)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='comments_author')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        for number in range(6):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {number}',
+            )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_first_page(self):
+        """На странице записи только первая страница комментариев"""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            self.texts(comments), [f'Комментарий {n}' for n in range(4)],
+        )
+        self.assertContains(response, 'Комментариев: 6')
+        self.assertContains(
+            response,
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+            + f'?after={comments.next_cursor}',
+        )
+
+    def test_fragment(self):
+        """Следующая страница приходит отдельным куском без шаблона base"""
+        first = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ).context['comments']
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(
+                url, {'after': first.next_cursor},
+            )
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(
+            self.texts(response.context['comments']),
+            ['Комментарий 4', 'Комментарий 5'],
+        )
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_fragment_missing_post(self):
+        """Для несуществующей записи кусок отдаёт 404"""
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}),
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='async_author')
+        cls.reader = User.objects.create(username='async_reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='async_group',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Асинхронный пост',
+        )
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Да')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = AsyncClient()
+        self.reader_client.force_login(self.reader)
+
+    def pages(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        )
+
+    def test_views_are_async(self):
+        """Страницы для чтения — корутины"""
+        for view in (
+            views.index, views.group_posts, views.profile,
+            views.post_detail, views.follow_index,
+        ):
+            with self.subTest(view=view.__name__):
+                self.assertTrue(iscoroutinefunction(view))
+
+    async def test_async_handler(self):
+        """Под ASGI страницы не обращаются к базе из цикла событий"""
+        for client in (self.async_client, self.reader_client):
+            for url in self.pages():
+                with self.subTest(url=url):
+                    response = await client.get(url)
+                    if client is self.async_client and 'follow' in url:
+                        self.assertEqual(
+                            response.status_code, HTTPStatus.FOUND,
+                        )
+                        continue
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+                    self.assertContains(response, 'Асинхронный пост')
+
+    async def test_async_conditional_get(self):
+        """Условный GET работает и у асинхронных представлений"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = await self.async_client.get(url)
+        repeat = await self.async_client.get(
+            url, headers={'If-None-Match': response['ETag']},
+        )
+        self.assertEqual(repeat.status_code, HTTPStatus.NOT_MODIFIED)
+        missing = await self.async_client.get(
+            reverse('posts:group_list', kwargs={'slug': 'missing'}),
+        )
+        self.assertEqual(missing.status_code, HTTPStatus.NOT_FOUND)
@@ -0,0 +1,145 @@
+"""
+Подготовка картинок старых записей в фоне.
+
+Новая картинка описывается при сохранении записи (posts.images): её
+размеры и уменьшенные копии сразу попадают в запись, и шаблон рисует
+её через responsive_image. У записей, загруженных раньше, размеров нет:
+шаблон показывает готовую миниатюру sorl, если она осталась с прежних
+времён, или заглушку, и ставит запись в очередь. Пул потоков процесса
+дописывает ей размеры и копии, после чего страницы рисуются заново уже
+с responsive_image. Новые миниатюры sorl не создаются: их никто не
+показал бы.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import F
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts import images, page_scopes
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+# Размеры миниатюр sorl, которые ищет шаблон для старых записей.
+PRESETS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+QUEUED_KEY = 'thumbnail_queued:{}'
+QUEUED_TIMEOUT = 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class LookupBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет искать миниатюру, не создавая её."""
+
+    def lookup(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = LookupBackend()
+
+
+def cached_thumbnail(image, preset):
+    """Готовая миниатюра картинки или None, если её ещё нет."""
+    if not image:
+        return None
+    geometry, options = PRESETS[preset]
+    return backend.lookup(image, geometry, **options)
+
+
+def generate(post):
+    """
+    Дописывает записи размеры картинки и уменьшенные копии.
+
+    Если что-то было сделано, карточка и страницы с записью рисуются
+    заново, чтобы вместо заглушки появилась картинка. Версия карточки
+    растёт тем же запросом, а не удалением ключа: запрос, прочитавший
+    запись раньше, положил бы заглушку обратно под прежний ключ.
+    """
+    if not post.image or post.image_width is not None:
+        return False
+    (
+        post.image_width, post.image_height, post.image_renditions,
+    ) = images.describe(post.image)
+    Post.objects.filter(pk=post.pk).update(
+        image_width=post.image_width,
+        image_height=post.image_height,
+        image_renditions=post.image_renditions,
+        card_version=F('card_version') + 1,
+    )
+    page_scopes.bump_post(post)
+    return True
+
+
+def generate_by_id(post_id):
+    post = Post.objects.select_related('author').filter(pk=post_id).first()
+    return post is not None and generate(post)
+
+
+def run_task(post_id):
+    """Задача для потока пула: ошибки пишутся в лог, соединения закрываются."""
+    try:
+        return generate_by_id(post_id)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры записи %s', post_id)
+        return False
+    finally:
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POST_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def enqueue(post_id):
+    """Отдаёт запись пулу; без пула она готовится сразу."""
+    if settings.POST_THUMBNAIL_WORKERS:
+        get_executor().submit(run_task, post_id)
+    else:
+        generate_by_id(post_id)
+
+
+def schedule(post):
+    """Ставит запись в очередь после фиксации транзакции."""
+    if post.image:
+        post_id = post.pk
+        transaction.on_commit(lambda: enqueue(post_id))
+
+
+def schedule_once(post):
+    """
+    Ставит запись в очередь, если этого недавно не делал никто.
+
+    Нужна шаблонам: запись без размеров картинки могла быть загружена
+    до их появления или потеряться в очереди при перезапуске процесса.
+    """
+    if post.image and cache.add(QUEUED_KEY.format(post.pk), 1, QUEUED_TIMEOUT):
+        schedule(post)
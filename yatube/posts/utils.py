@@ -0,0 +1,85 @@
+from django.conf import settings
+
+from core.paginator import (CountedPaginator, CursorPaginator,
+                            abounded_count, ascope_count, attach_cursors,
+                            bounded_count, scope_count)
+from posts.models import Comment
+
+
+def paginate(request, queryset, per_page=settings.POSTS_ON_PAGE,
+             count=None, count_scope=None):
+    """
+    Возвращает страницу выдачи для шаблона posts/includes/paginator.html.
+
+    Параметры ?after= и ?before= включают курсорную пагинацию, которая
+    не зависит от глубины страницы; ?page= по-прежнему открывает страницу
+    по номеру. Число записей для номеров страниц — готовый счётчик count,
+    запомненное в кэше число области count_scope или, если нет ни того,
+    ни другого, bounded_count.
+    """
+    cursor_paginator = CursorPaginator(queryset, per_page)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        return cursor_paginator.get_page(after=after, before=before)
+
+    approximate = False
+    if count_scope is not None:
+        count, approximate = scope_count(count_scope, queryset)
+    elif count is None:
+        count, approximate = bounded_count(queryset)
+    paginator = CountedPaginator(
+        queryset.order_by(*cursor_paginator.ordering), per_page,
+        count, approximate,
+    )
+    page = paginator.get_page(request.GET.get('page'))
+    return attach_cursors(page, cursor_paginator)
+
+
+async def apaginate(request, queryset, per_page=settings.POSTS_ON_PAGE,
+                    count=None, count_scope=None):
+    """paginate для асинхронных представлений."""
+    cursor_paginator = CursorPaginator(queryset, per_page)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        return await cursor_paginator.aget_page(after=after, before=before)
+
+    approximate = False
+    if count_scope is not None:
+        count, approximate = await ascope_count(count_scope, queryset)
+    elif count is None:
+        count, approximate = await abounded_count(queryset)
+    paginator = CountedPaginator(
+        queryset.order_by(*cursor_paginator.ordering), per_page,
+        count, approximate,
+    )
+    page = paginator.get_page(request.GET.get('page'))
+    page.object_list = [post async for post in page.object_list]
+    return attach_cursors(page, cursor_paginator)
+
+
+def _comments_paginator(post_id, per_page):
+    return CursorPaginator(
+        Comment.objects.filter(post_id=post_id).for_listing(),
+        per_page or settings.COMMENTS_ON_PAGE,
+    )
+
+
+def comments_page(request, post_id, per_page=None):
+    """
+    Страница комментариев записи после курсора ?after=.
+
+    Выборка идёт по индексу (post, created, id) и не зависит от того,
+    сколько всего комментариев у записи: их число берётся из счётчика
+    Post.comments_count.
+    """
+    return _comments_paginator(post_id, per_page).get_page(
+        after=request.GET.get('after'),
+    )
+
+
+async def acomments_page(request, post_id, per_page=None):
+    return await _comments_paginator(post_id, per_page).aget_page(
+        after=request.GET.get('after'),
+    )
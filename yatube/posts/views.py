@@ -1,70 +1,85 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-
+from django.utils.http import urlencode
+
+from core.page_cache import cache_page_by_generation, condition_by_generation
+from core.shortcuts import (aget_object_or_404, aget_user, alogin_required,
+                            arender)
+from posts import page_scopes
+from posts.counters import INDEX_TOTAL, afeed_total, aget_stats, group_total
+from posts.feed import feed_for
 from posts.forms import CommentForm, PostForm
 from posts.models import Follow, Group, Post, User
+from posts.search import search_page
+from posts.utils import acomments_page, apaginate, comments_page
 
 
-@cache_page(settings.CACHES_TIME)
-def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+@cache_page_by_generation(page_scopes.index_scopes)
+async def index(request):
+    post_list = Post.objects.for_listing()
+    page_obj = await apaginate(request, post_list, count_scope=INDEX_TOTAL)
     context = {
         'page_obj': page_obj,
     }
 
-    return render(request, 'posts/index.html', context)
+    return await arender(request, 'posts/index.html', context)
 
 
-def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, settings.POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+@condition_by_generation(page_scopes.group_scopes)
+@cache_page_by_generation(page_scopes.group_scopes)
+async def group_posts(request, slug):
+    group = await aget_object_or_404(Group.objects.all(), slug=slug)
+    post_list = group.posts.for_listing()
+    page_obj = await apaginate(
+        request, post_list, count_scope=group_total(group.pk),
+    )
 
     context = {
         'group': group,
         'page_obj': page_obj,
     }
 
-    return render(request, 'posts/group_list.html', context)
-
+    return await arender(request, 'posts/group_list.html', context)
 
-def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, settings.POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
 
-    post_count = post_list.count()
+@condition_by_generation(page_scopes.profile_scopes)
+@cache_page_by_generation(page_scopes.profile_scopes)
+async def profile(request, username):
+    author = await aget_object_or_404(
+        User.objects.select_related('stats'), username=username,
+    )
+    stats = await aget_stats(author)
+    post_list = author.posts.for_listing()
+    page_obj = await apaginate(
+        request, post_list, count=stats.posts_count,
+    )
 
     context = {
         'page_obj': page_obj,
-        'posts_count': post_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'author': author,
         'following': False,
     }
 
-    if request.user.is_authenticated:
-        following = author.following.filter(
-            author=author, user=request.user
-        ).exists()
+    user = await aget_user(request)
+    if user.is_authenticated:
+        following = await author.following.filter(
+            author=author, user=user
+        ).aexists()
         context['following'] = following
 
-    return render(request, 'posts/profile.html', context)
+    return await arender(request, 'posts/profile.html', context)
 
 
-def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    post_count = post.author.posts.count()
-    comments = post.comments.all()
+@condition_by_generation(page_scopes.apost_scopes)
+async def post_detail(request, post_id):
+    post = await aget_object_or_404(Post.objects.for_detail(), id=post_id)
+    post_count = (await aget_stats(post.author)).posts_count
+    comments = await acomments_page(request, post.pk)
     form = CommentForm()
     context = {
         'posts_count': post_count,
@@ -73,7 +88,38 @@ def post_detail(request, post_id):
         'form': form,
     }
 
-    return render(request, 'posts/post_detail.html', context)
+    return await arender(request, 'posts/post_detail.html', context)
+
+
+@condition_by_generation(page_scopes.post_scopes)
+def post_comments(request, post_id):
+    """Следующая страница комментариев: кусок HTML для post_detail."""
+    comments = comments_page(request, post_id)
+    if not comments and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return render(request, 'posts/includes/comment_list.html', {
+        'post_id': post_id,
+        'comments': comments,
+    })
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = search_page(
+            query,
+            settings.POSTS_ON_PAGE,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
@@ -91,7 +137,8 @@ def post_create(request):
     )
     if form.is_valid():
         form.instance.author = request.user
-        form.save()
+        with transaction.atomic():
+            form.save()
         return redirect('posts:profile', request.user)
 
     return render(request, 'posts/create_post.html', {
@@ -120,7 +167,8 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        with transaction.atomic():
+            form.save()
         return redirect('posts:post_detail', post_id)
 
     return render(request, 'posts/create_post.html', {
@@ -137,34 +185,33 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
-@login_required
-def follow_index(request):
-    followed_post = Post.objects.filter(
-        author__following__user=request.user,
-    ).all()
-
-    paginator = Paginator(followed_post, settings.POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+@alogin_required
+async def follow_index(request):
+    user = await aget_user(request)
+    page_obj = await apaginate(
+        request, feed_for(user), count=await afeed_total(user),
+    )
 
     context = {
         'page_obj': page_obj,
     }
-    return render(request, 'posts/follow.html', context)
+    return await arender(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=author,
-        )
+        with transaction.atomic():
+            Follow.objects.get_or_create(
+                user=request.user,
+                author=author,
+            )
     return redirect('posts:profile', username=username)
 
 
@@ -175,6 +222,6 @@ def profile_unfollow(request, username):
         author=author,
         user=request.user,
     )
-    if follow.exists():
+    with transaction.atomic():
         follow.delete()
     return redirect('posts:profile', username=username)
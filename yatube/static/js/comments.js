@@ -0,0 +1,17 @@
+// Подгружает следующую страницу комментариев вместо ссылки «Показать ещё».
+// Без JavaScript ссылка просто открывает запись со следующей страницей.
+document.addEventListener('click', (event) => {
+  const link = event.target.closest('a[data-fragment]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.dataset.fragment, {credentials: 'same-origin'})
+    .then((response) => (response.ok ? response.text() : Promise.reject()))
+    .then((html) => {
+      link.outerHTML = html;
+    })
+    .catch(() => {
+      window.location.href = link.href;
+    });
+});
@@ -44,11 +44,16 @@ INSTALLED_APPS = [
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.staticfiles.StaticFilesMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.replication.PinPrimaryMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -80,6 +85,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+ASGI_APPLICATION = 'yatube.asgi.application'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -91,6 +98,22 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения, например ['replica']. Локально это копии
+# db.sqlite3, которые обновляет команда replicate_sqlite.
+DATABASE_REPLICAS = []
+
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db-{alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.replication.PrimaryReplicaRouter']
+
+# Сколько секунд после записи клиент читает только из основной базы.
+DATABASE_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -131,8 +154,39 @@ USE_TZ = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Копии картинок с этими путями не перезаписываются: кэш на год.
+MEDIA_IMMUTABLE_PATHS = (r'^cache/', r'^posts/.+-\d+w\.(?:webp|jpg)$')
+MEDIA_MAX_AGE = 60 * 60
+
+# None — файлы читает Django; 'x-accel-redirect' — nginx (внутренний
+# location MEDIA_SENDFILE_PREFIX), 'x-sendfile' — Apache и lighttpd.
+MEDIA_SENDFILE = None
+MEDIA_SENDFILE_PREFIX = '/protected-media/'
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.staticfiles.CompressedManifestStorage',
+    },
+}
+
+# Какие CSS чистить при collectstatic и где искать используемые классы.
+STATIC_PURGE_CSS = ('css/bootstrap.min.css',)
+STATIC_PURGE_CONTENT = (
+    os.path.join(BASE_DIR, 'templates'),
+    os.path.join(BASE_DIR, 'static', 'js'),
+)
+# Классы, которые появляются в разметке не из шаблонов.
+STATIC_PURGE_SAFELIST = ()
+
+# Cache-Control для файлов без хэша в имени.
+STATIC_MAX_AGE = 60
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -142,12 +196,66 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_ON_PAGE = 10
 
+COMMENTS_ON_PAGE = 20
+
+# Сколько записей пагинатор считает точно; в выдаче больше этого номера
+# последних страниц не показываются.
+PAGINATOR_COUNT_LIMIT = 10000
+
+PAGINATOR_COUNT_TIMEOUT = 60 * 60
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'yatube.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'MAX_BYTES': 256 * 1024 * 1024,
+        },
     }
 }
 
-CACHES_TIME = 20
+CACHES_TIME = 60 * 60 * 6
+
+# Тесты работают с кэшем во временном каталоге, а не в cache/.
+TEST_RUNNER = 'core.test_runner.ScratchStorageRunner'
+
+PAGE_CACHE_LOCK_TIMEOUT = 10
+
+PAGE_CACHE_LOCK_WAIT = 2
+
+# Кодировки сжатия ответов по убыванию предпочтения; br и zstd работают,
+# если установлены brotli и zstandard.
+COMPRESSION_ENCODINGS = ('br', 'zstd', 'gzip')
+
+FEED_BATCH_SIZE = 1000
+
+POST_CARD_CACHE_TIME = 60 * 60 * 24
+
+POST_THUMBNAIL_WORKERS = 2
+
+API_MAX_PAGE_SIZE = 100
+
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
+
+POST_IMAGE_MASTER_SIDE = 2048
+
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+
+METRICS_PATH = os.path.join(BASE_DIR, 'cache', 'metrics.sqlite3')
+
+METRICS_FLUSH_INTERVAL = 5
+
+# /metrics открыт адресам METRICS_ALLOWED_IPS, а если задан
+# METRICS_TOKEN, то только запросам с Authorization: Bearer <токен>.
+# За прокси адрес клиента берётся из заголовка, который ставит прокси,
+# например 'HTTP_X_REAL_IP'; без него запросы через прокси не пускаются.
+METRICS_ALLOWED_IPS = ('127.0.0.1',)
+
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+
+METRICS_CLIENT_IP_HEADER = None
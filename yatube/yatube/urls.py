@@ -14,10 +14,13 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from core.views import export_metrics, serve_media
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
@@ -25,6 +28,8 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/v1/', include('api.urls', namespace='api')),
+    path('metrics', export_metrics, name='metrics'),
     path('group/<slug:slug>/', include('posts.urls', namespace='posts')),
 ]
 
@@ -32,7 +37,9 @@ handler403 = 'core.views.permission_denied'
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
 
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT,
-    )
+if not settings.MEDIA_URL.startswith(('http://', 'https://', '//')):
+    urlpatterns.append(re_path(
+        rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<path>.*)$',
+        serve_media,
+        name='media',
+    ))